@@ -4,27 +4,46 @@
 __author__ = "Wang Hewen"
 
 import itertools
-ScipyDependencyFlag = False #Check if dependencies are satisfied. If not, some advanced functions will not be defined.
-TorchDependencyFlag = False
-
-try:
-    import scipy.sparse
-    import numpy as np
-    ScipyDependencyFlag = True
-except Exception:
-    ScipyDependencyFlag = False
-
-try:
-    import scipy.sparse
-    import torch
-    import numpy as np
-    TorchDependencyFlag = True
-except Exception:
-    TorchDependencyFlag = False
-
-def FlattenList(List):
+from .Utilities import IsModuleAvailable, LazyModule
+
+#Dependencies are imported on first use. If they are not installed, some advanced functions will not be defined.
+ScipyDependencyFlag = IsModuleAvailable("scipy", "numpy")
+TorchDependencyFlag = IsModuleAvailable("scipy", "torch", "numpy")
+scipy = LazyModule("scipy", globals(), Submodules = ["sparse"])
+np = LazyModule("numpy", globals(), "np")
+torch = LazyModule("torch", globals())
+
+def IterFlatten(Iterable, Types = (list,), MaxDepth = None):
+    '''
+    Flatten nested containers lazily in a single pass, using a stack of iterators instead of recursion, so deep nesting costs neither extra passes nor recursion depth.
+    Strings and bytes are never flattened.
+
+    Example::
+        >>> list(IterFlatten([['foo', ['baz']], 'gg', 1]))
+        ['foo', 'baz', 'gg', 1]
+        >>> list(IterFlatten([(1, 2), [3, (4, [5])]], Types = (list, tuple), MaxDepth = 2))
+        [1, 2, 3, 4, [5]]
+
+    :param Iterable Iterable: The nested containers you want to flatten.
+    :param Tuple[type] Types: Types of containers to be flattened, e.g. (list, tuple, numpy.ndarray, types.GeneratorType).
+    :param int MaxDepth: Maximum number of nesting levels to flatten. Use None to flatten all levels.
+    :return: Generator: Generator of the elements which are not flattened
+    :rtype: Generator
+    '''
+    Types = tuple(Types)
+    Stack = [iter(Iterable)]
+    while Stack:
+        for Element in Stack[-1]:
+            if isinstance(Element, Types) and not isinstance(Element, (str, bytes)) and (MaxDepth is None or len(Stack) <= MaxDepth):
+                Stack.append(iter(Element))
+                break
+            yield Element
+        else:
+            Stack.pop()
+
+def FlattenList(List, Types = (list,), MaxDepth = None):
     '''
-    Flatten a list using itertools no matter how many nest it has.
+    Flatten a list no matter how many nest it has. See IterFlatten for the options.
 
     Example::
         >>> FlattenList([['foo', 'baz'], ['gg']])
@@ -33,20 +52,32 @@ def FlattenList(List):
         ['foo', 'baz', 'gg']
 
     :param List[Variant]: The list you want to flatten
+    :param Tuple[type] Types: Types of containers to be flattened.
+    :param int MaxDepth: Maximum number of nesting levels to flatten. Use None to flatten all levels.
     :return: List: Flattened list
     :rtype: List[Variant]
     '''
-    for Element in List:
-        if type(Element)==list:
-            List = list(itertools.chain(*List))
-            return FlattenList(List)
-    return list(List)
+    Types = tuple(Types)
+    List = list(List)
+    Depth = 0
+    while MaxDepth is None or Depth < MaxDepth:
+        #Flatten a whole level with itertools while all elements are containers, which is faster than IterFlatten
+        ElementTypes = set(map(type, List))
+        Containers = [Type for Type in ElementTypes if issubclass(Type, Types) and not issubclass(Type, (str, bytes))]
+        if not Containers:
+            return List
+        if len(Containers) < len(ElementTypes):
+            return list(IterFlatten(List, Types, None if MaxDepth is None else MaxDepth - Depth))
+        List = list(itertools.chain.from_iterable(List))
+        Depth += 1
+    return List
 
 if ScipyDependencyFlag:
     def CombineMatricesRowWise(MainMatrix, AddedMatrix, RemoveFirstZerosRow = True, Sparse = False):
         '''
         Stack twoe matrices vertically (row wise).
         You must make sure MainMatrix and AddedMatrix have appropriate dimensions, i.e. have same number of columns.
+        Each call copies the whole matrix. Use MatrixRowAccumulator to stack many rows one by one.
     
         :param SparseMatrix MainMatrix: The main matrix that you want to add the AddedMatrix.
         :param SparseMatrix AddedMatrix: The matrix added followed by the main matrix.
@@ -91,9 +122,122 @@ if ScipyDependencyFlag:
         '''
         return CombineMatricesRowWise(MainMatrix, AddedMatrix, RemoveFirstZerosRow, Sparse = True)
 
+    class MatrixRowAccumulator(object):
+        '''
+        Stack rows into a matrix incrementally. Unlike calling CombineMatricesRowWise once per row, which copies the whole matrix every time, rows are appended into buffers which grow geometrically, so building an N-row matrix costs O(N) in total.
+        Dense rows are kept in a 2-D numpy buffer, and sparse rows in append-only CSR indptr/indices/data buffers.
+
+        Example::
+
+            >>> Accumulator = MatrixRowAccumulator(Sparse = True)
+            >>> for Sample in Samples:
+            ...     Accumulator.Append(ExtractFeatures(Sample))
+            >>> Features = Accumulator.Finalize()
+
+        :param Int Columns: Number of columns. Use None to take it from the first appended rows.
+        :param Boolean Sparse: If True, Finalize returns a scipy.sparse.csr_matrix, otherwise a numpy array.
+        :param data-type DataType: Data type of the result. Use None to follow the appended rows.
+        :param Int InitialCapacity: Number of rows (or nonzero elements for sparse) reserved at first.
+        '''
+        def __init__(self, Columns = None, Sparse = False, DataType = None, InitialCapacity = 1024):
+            self.Columns = Columns
+            self.Sparse = Sparse
+            self.DataType = None if DataType is None else np.dtype(DataType)
+            self.FixedDataType = DataType is not None
+            self.InitialCapacity = max(1, InitialCapacity)
+            self.Rows = 0
+            self.Buffer = None #Dense rows
+            self.Indptr = np.zeros(self.InitialCapacity + 1, dtype = np.int64) if Sparse else None
+            self.Indices = None
+            self.Data = None
+
+        def __len__(self):
+            return self.Rows
+
+        def Append(self, Rows):
+            '''
+            Append one row (1-D array-like) or several rows (2-D numpy array or scipy sparse matrix).
+
+            :param Array/SparseMatrix Rows: The rows to be appended. They must have the same number of columns as the previous rows.
+            '''
+            if scipy.sparse.issparse(Rows):
+                Rows = Rows.tocsr() #No copy for CSR input
+            else:
+                Rows = np.asarray(Rows)
+                if Rows.ndim == 1:
+                    Rows = Rows.reshape(1, -1)
+                elif Rows.ndim != 2:
+                    raise ValueError(Rows.shape, "Rows must be 1-D or 2-D!")
+            if self.Columns is None:
+                self.Columns = Rows.shape[1]
+            elif Rows.shape[1] != self.Columns:
+                raise ValueError(Rows.shape, "Number of columns is not " + str(self.Columns) + "!")
+            if self.DataType is None:
+                self.DataType = Rows.dtype
+            elif Rows.dtype != self.DataType and not self.FixedDataType and not np.can_cast(Rows.dtype, self.DataType):
+                self.DataType = np.result_type(self.DataType, Rows.dtype)
+            if self.Sparse:
+                self._AppendSparse(Rows)
+            else:
+                self._AppendDense(Rows)
+            self.Rows += Rows.shape[0]
+
+        def _AppendDense(self, Rows):
+            if scipy.sparse.issparse(Rows):
+                Rows = Rows.toarray()
+            Required = self.Rows + Rows.shape[0]
+            if self.Buffer is None or Required > self.Buffer.shape[0] or self.Buffer.dtype != self.DataType:
+                Buffer = np.empty((max(Required, 2 * self.Rows, self.InitialCapacity), self.Columns), dtype = self.DataType)
+                if self.Buffer is not None:
+                    Buffer[:self.Rows] = self.Buffer[:self.Rows]
+                self.Buffer = Buffer
+            self.Buffer[self.Rows:Required] = Rows
+
+        def _AppendSparse(self, Rows):
+            if not scipy.sparse.issparse(Rows):
+                Rows = scipy.sparse.csr_matrix(Rows)
+            Start = self.Indptr[self.Rows]
+            Required = Start + Rows.nnz
+            if self.Data is None or Required > len(self.Data) or self.Data.dtype != self.DataType:
+                Capacity = max(Required, 2 * Start, self.InitialCapacity)
+                self.Indices = _GrowArray(self.Indices, Capacity, Start, np.int64)
+                self.Data = _GrowArray(self.Data, Capacity, Start, self.DataType)
+            self.Indices[Start:Required] = Rows.indices
+            self.Data[Start:Required] = Rows.data
+            if self.Rows + Rows.shape[0] + 1 > len(self.Indptr):
+                self.Indptr = _GrowArray(self.Indptr, max(self.Rows + Rows.shape[0], 2 * self.Rows) + 1, self.Rows + 1, np.int64)
+            self.Indptr[self.Rows + 1:self.Rows + Rows.shape[0] + 1] = Rows.indptr[1:] + Start
+
+        def Finalize(self):
+            '''
+            Get the stacked matrix. The buffers are trimmed in a single copy, and more rows can still be appended afterwards.
+
+            :return: Result: The stacked rows.
+            :rtype: NumpyArray/SparseMatrix
+            '''
+            Columns = 0 if self.Columns is None else self.Columns
+            DataType = float if self.DataType is None else self.DataType
+            if not self.Sparse:
+                if self.Buffer is None:
+                    return np.zeros((0, Columns), dtype = DataType)
+                return self.Buffer[:self.Rows].copy()
+            Nnz = self.Indptr[self.Rows]
+            if self.Data is None:
+                return scipy.sparse.csr_matrix((self.Rows, Columns), dtype = DataType)
+            return scipy.sparse.csr_matrix((self.Data[:Nnz].copy(), self.Indices[:Nnz].copy(), self.Indptr[:self.Rows + 1].copy()), shape = (self.Rows, Columns))
+
+    def _GrowArray(Array, Capacity, Length, DataType):
+        '''
+        Get a new 1-D array of Capacity elements with the first Length elements of Array.
+        '''
+        Result = np.empty(Capacity, dtype = DataType)
+        if Array is not None:
+            Result[:Length] = Array[:Length]
+        return Result
+
     def DeleteLilMatrixRow(mat, i):
         '''
-        Delete a row in a scipy.sparse.lil_matrix.
+        Delete a row in a scipy.sparse.lil_matrix. Use DeleteLilMatrixRows to delete several rows at once.
 
         :param scipy.sparse.lil_matrix mat: The scipy.sparse.lil_matrix you want to operate on.
         :param Int i: The row number that you want to delete
@@ -112,7 +256,7 @@ if ScipyDependencyFlag:
 
     def DeleteCsrMatrixRow(mat, i):
         '''
-        Delete a row in a scipy.sparse.csr_matrix.
+        Delete a row in a scipy.sparse.csr_matrix. Use DeleteCsrMatrixRows to delete several rows at once.
 
         :param scipy.sparse.csr_matrix mat: The scipy.sparse.csr_matrix you want to operate on.
         :param Int i: The row number that you want to delete
@@ -139,44 +283,270 @@ if ScipyDependencyFlag:
 
         return mat
 
-    def IfTwoSparseMatrixEqual(SparseMatrix1, SparseMatrix2):
+    def DeleteCsrMatrixRows(SparseMatrix, Rows, InPlace = False):
+        '''
+        Delete rows in a scipy.sparse.csr_matrix in a single vectorized pass.
+
+        Example::
+
+            >>> DeleteCsrMatrixRows(SparseMatrix, [0, 5, -1])
+            >>> DeleteCsrMatrixRows(SparseMatrix, SparseMatrix.getnnz(axis = 1) == 0) #Delete empty rows
+
+        :param scipy.sparse.csr_matrix SparseMatrix: The matrix you want to operate on.
+        :param Array Rows: Indices of the rows to be deleted, or a boolean mask which is True for them.
+        :param Boolean InPlace: If True, modify SparseMatrix by moving the remaining elements forward in its own arrays instead of creating a new matrix.
+        :return: Result: The matrix without the rows.
+        :rtype: scipy.sparse.csr_matrix
+        '''
+        _CheckSparseFormat(SparseMatrix, "csr")
+        return _DeleteCompressedMatrixVectors(SparseMatrix, _KeptMask(Rows, SparseMatrix.shape[0]), True, InPlace)
+
+    def DeleteCsrMatrixColumns(SparseMatrix, Columns, InPlace = False):
+        '''
+        Delete columns in a scipy.sparse.csr_matrix in a single vectorized pass.
+
+        :param scipy.sparse.csr_matrix SparseMatrix: The matrix you want to operate on.
+        :param Array Columns: Indices of the columns to be deleted, or a boolean mask which is True for them.
+        :param Boolean InPlace: If True, modify SparseMatrix by moving the remaining elements forward in its own arrays instead of creating a new matrix.
+        :return: Result: The matrix without the columns.
+        :rtype: scipy.sparse.csr_matrix
+        '''
+        _CheckSparseFormat(SparseMatrix, "csr")
+        return _DeleteCompressedMatrixVectors(SparseMatrix, _KeptMask(Columns, SparseMatrix.shape[1]), False, InPlace)
+
+    def DeleteCscMatrixColumns(SparseMatrix, Columns, InPlace = False):
+        '''
+        Delete columns in a scipy.sparse.csc_matrix in a single vectorized pass.
+
+        :param scipy.sparse.csc_matrix SparseMatrix: The matrix you want to operate on.
+        :param Array Columns: Indices of the columns to be deleted, or a boolean mask which is True for them.
+        :param Boolean InPlace: If True, modify SparseMatrix by moving the remaining elements forward in its own arrays instead of creating a new matrix.
+        :return: Result: The matrix without the columns.
+        :rtype: scipy.sparse.csc_matrix
+        '''
+        _CheckSparseFormat(SparseMatrix, "csc")
+        return _DeleteCompressedMatrixVectors(SparseMatrix, _KeptMask(Columns, SparseMatrix.shape[1]), True, InPlace)
+
+    def DeleteLilMatrixRows(SparseMatrix, Rows, InPlace = False):
         '''
-        Check if two scipy sparse matrix is exactly the same.
+        Delete rows in a scipy.sparse.lil_matrix.
+
+        :param scipy.sparse.lil_matrix SparseMatrix: The matrix you want to operate on.
+        :param Array Rows: Indices of the rows to be deleted, or a boolean mask which is True for them.
+        :param Boolean InPlace: If True, modify SparseMatrix instead of creating a new matrix.
+        :return: Result: The matrix without the rows.
+        :rtype: scipy.sparse.lil_matrix
+        '''
+        _CheckSparseFormat(SparseMatrix, "lil")
+        Keep = _KeptMask(Rows, SparseMatrix.shape[0])
+        if not InPlace:
+            return SparseMatrix[np.flatnonzero(Keep)]
+        SparseMatrix.rows = SparseMatrix.rows[Keep]
+        SparseMatrix.data = SparseMatrix.data[Keep]
+        SparseMatrix._shape = (int(Keep.sum()), SparseMatrix.shape[1])
+        return SparseMatrix
+
+    def _CheckSparseFormat(SparseMatrix, Format):
+        '''
+        Raise ValueError if SparseMatrix is not a scipy sparse matrix in Format.
+        '''
+        if not scipy.sparse.issparse(SparseMatrix) or SparseMatrix.format != Format:
+            raise ValueError(type(SparseMatrix), "works only for " + Format.upper() + " format -- use .to" + Format + "() first")
+
+    def _KeptMask(Deleted, Length):
+        '''
+        Convert indices or a boolean mask of deleted rows/columns to a boolean mask of the kept ones.
+        '''
+        Deleted = np.asarray(Deleted)
+        if Deleted.dtype == bool:
+            if Deleted.shape != (Length,):
+                raise ValueError(Deleted.shape, "Length of the boolean mask is not " + str(Length) + "!")
+            return ~Deleted
+        Keep = np.ones(Length, dtype = bool)
+        Keep[Deleted.astype(np.intp, copy = False)] = False #Raise IndexError for indices out of range
+        return Keep
+
+    def _DeleteCompressedMatrixVectors(SparseMatrix, Keep, Major, InPlace, ChunkSize = 2 ** 20):
+        '''
+        Keep the rows (Major = True) or columns (Major = False) of a CSR matrix (or columns and rows of a CSC matrix) in the boolean mask Keep.
+        Stored elements are processed ChunkSize at a time, so that temporary arrays stay small. When InPlace is True, the kept elements are moved forward in the arrays of SparseMatrix, which never overwrites elements not processed yet.
+        '''
+        Indptr, Indices, Data = SparseMatrix.indptr, SparseMatrix.indices, SparseMatrix.data
+        Nnz = Indptr[-1]
+        if Major:
+            Counts = np.diff(Indptr)
+            Kept = int(Counts[Keep].sum())
+        else:
+            NewIndices = (np.cumsum(Keep) - 1).astype(Indices.dtype) #New index of each kept minor index
+            Kept = sum(int(np.count_nonzero(Keep[Indices[Start:Start + ChunkSize]])) for Start in range(0, Nnz, ChunkSize))
+        if InPlace:
+            ResultIndices, ResultData = Indices, Data
+        else:
+            ResultIndices, ResultData = np.empty(Kept, dtype = Indices.dtype), np.empty(Kept, dtype = Data.dtype)
+        ResultIndptr = np.empty_like(Indptr)
+        Written = 0
+        for Start in range(0, Nnz, ChunkSize):
+            End = min(Start + ChunkSize, Nnz)
+            if Major: #Repeat the mask of the vectors overlapping this chunk by their lengths in it
+                First, Last = np.searchsorted(Indptr, Start, "right") - 1, np.searchsorted(Indptr, End)
+                Mask = np.repeat(Keep[First:Last], np.minimum(Indptr[First + 1:Last + 1], End) - np.maximum(Indptr[First:Last], Start))
+            else:
+                Mask = Keep[Indices[Start:End]]
+            #Number of kept elements before each pointer in this chunk
+            Low, High = np.searchsorted(Indptr, [Start, End])
+            Cumulative = np.concatenate([[0], np.cumsum(Mask)])
+            ResultIndptr[Low:High] = Written + Cumulative[Indptr[Low:High] - Start]
+            ChunkIndices = Indices[Start:End][Mask]
+            ChunkData = Data[Start:End][Mask]
+            ResultIndices[Written:Written + len(ChunkIndices)] = ChunkIndices if Major else NewIndices[ChunkIndices]
+            ResultData[Written:Written + len(ChunkData)] = ChunkData
+            Written += len(ChunkData)
+        ResultIndptr[np.searchsorted(Indptr, Nnz):] = Written
+        if Major:
+            ResultIndptr = ResultIndptr[np.concatenate([[True], Keep])]
+        Shape = list(SparseMatrix.shape)
+        Shape[(0 if Major else 1) if SparseMatrix.format == "csr" else (1 if Major else 0)] = int(Keep.sum())
+        Shape = tuple(Shape)
+        if not InPlace:
+            return SparseMatrix.__class__((ResultData, ResultIndices, ResultIndptr), shape = Shape)
+        SparseMatrix.indptr = ResultIndptr
+        SparseMatrix.indices = ResultIndices[:Written]
+        SparseMatrix.data = ResultData[:Written]
+        SparseMatrix._shape = Shape
+        return SparseMatrix
+
+    def IfTwoSparseMatrixEqual(SparseMatrix1, SparseMatrix2, Tolerance = 0, RelativeTolerance = 0, ChunkSize = 2 ** 20):
+        '''
+        Check if two scipy sparse matrix is exactly the same, i.e. they have the same shape, data type, stored elements and values.
+        Shapes and data types are checked first, then numbers of stored elements and the canonical (sorted and deduplicated) CSR arrays are compared ChunkSize elements at a time, returning at the first difference, so that no matrix of the size of the inputs is allocated unless an input is not canonical CSR/CSC already.
+        Explicit zeros count as stored elements in exact comparison.
+
+        Example::
+
+            >>> IfTwoSparseMatrixEqual(SparseMatrix, SparseMatrix.copy())
+            True
+            >>> IfTwoSparseMatrixEqual(SparseMatrix, SparseMatrix * (1 + 1e-12), Tolerance = 1e-8, RelativeTolerance = 1e-8)
+            True
     
         :param SparseMatrix SparseMatrix1: The first scipy sparse matrix.
         :param SparseMatrix SparseMatrix2: The second scipy sparse matrix.
+        :param Number Tolerance: Absolute tolerance of the difference between elements. If Tolerance or RelativeTolerance is not 0, values are compared as np.isclose does, and data types or stored elements may differ.
+        :param Number RelativeTolerance: Relative tolerance of the difference between elements, relative to the elements of SparseMatrix2.
+        :param Int ChunkSize: Number of stored elements compared at a time.
         :return: Equal: True if they are equal, otherwise will be false.
         :rtype: Boolean
         '''
-        if (SparseMatrix1 - SparseMatrix2).nnz == 0:
-            return True
-        else:
+        Approximate = Tolerance != 0 or RelativeTolerance != 0
+        if SparseMatrix1.shape != SparseMatrix2.shape:
             return False
+        if not Approximate and SparseMatrix1.dtype != SparseMatrix2.dtype:
+            return False
+        SparseMatrix1, SparseMatrix2 = _CanonicalCompressedMatrices(SparseMatrix1, SparseMatrix2)
+        if SparseMatrix1.nnz == SparseMatrix2.nnz and _ArraysEqual(SparseMatrix1.indptr, SparseMatrix2.indptr, ChunkSize) and _ArraysEqual(SparseMatrix1.indices, SparseMatrix2.indices, ChunkSize):
+            if not Approximate:
+                return _ArraysEqual(SparseMatrix1.data, SparseMatrix2.data, ChunkSize)
+            return all(np.allclose(SparseMatrix1.data[Start:Start + ChunkSize], SparseMatrix2.data[Start:Start + ChunkSize], rtol = RelativeTolerance, atol = Tolerance)
+                       for Start in range(0, SparseMatrix1.nnz, ChunkSize))
+        if not Approximate:
+            return False
+        #Different stored elements can still be close, e.g. tiny values stored only in one matrix
+        Difference = abs(SparseMatrix1 - SparseMatrix2) - RelativeTolerance * abs(SparseMatrix2)
+        return Difference.nnz == 0 or Difference.max() <= Tolerance
+
+    def _CanonicalCompressedMatrices(SparseMatrix1, SparseMatrix2):
+        '''
+        Get two matrices in the same compressed format (CSR, or CSC if both are CSC) with sorted and deduplicated indices. Matrices already in this form are not copied.
+        '''
+        Format = "csc" if getattr(SparseMatrix1, "format", None) == getattr(SparseMatrix2, "format", None) == "csc" else "csr"
+        Results = []
+        for SparseMatrix in [SparseMatrix1, SparseMatrix2]:
+            if not scipy.sparse.issparse(SparseMatrix) or SparseMatrix.format != Format:
+                SparseMatrix = scipy.sparse.csr_matrix(SparseMatrix) if Format == "csr" else scipy.sparse.csc_matrix(SparseMatrix)
+            elif not SparseMatrix.has_canonical_format:
+                SparseMatrix = SparseMatrix.copy()
+            if not SparseMatrix.has_canonical_format:
+                SparseMatrix.sum_duplicates()
+            Results.append(SparseMatrix)
+        return Results
+
+    def _ArraysEqual(Array1, Array2, ChunkSize):
+        '''
+        Compare two 1-D arrays of the same length ChunkSize elements at a time, returning at the first difference.
+        '''
+        return all(np.array_equal(Array1[Start:Start + ChunkSize], Array2[Start:Start + ChunkSize]) for Start in range(0, len(Array1), ChunkSize))
 
 if TorchDependencyFlag:
-    def ConvertSparseMatrixToSparseTensor(SparseMatrix, TensorType = torch.sparse.FloatTensor):
+    def ConvertSparseMatrixToSparseTensor(SparseMatrix, TensorType = None, Layout = "coo"):
         '''
-        Convert scipy sparse matrix to PyTorch sparse tensor
+        Convert scipy sparse matrix to PyTorch sparse tensor, keeping the data type of the matrix (e.g. float64, float32 or int).
+        For a CSR matrix with sorted indices and no duplicates, the values, and for CSR layout also the indices, are shared with the matrix through torch.from_numpy instead of being copied. COO layout needs int64 indices, which are built in a single array.
+        Other matrices are converted to such a CSR matrix first, so the result is always coalesced.
 
         Refer to https://discuss.pytorch.org/t/creating-a-sparse-tensor-from-csr-matrix/13658/5
 
-        :param SparseMatrix: scipy sparse matrix to be converted
-        :param TensorType: Target PyTorch sparse tensor type.
-        :return: SparseTensor
-        '''
-        CooMatrix = scipy.sparse.coo_matrix(SparseMatrix, copy = False)
-
-        values = CooMatrix.data
-        indices = np.vstack((CooMatrix.row, CooMatrix.col))
+        Example::
 
-        i = torch.LongTensor(indices)
-        v = torch.FloatTensor(values)
-        shape = CooMatrix.shape
+            >>> Adjacency = ConvertSparseMatrixToSparseTensor(CsrMatrix, Layout = "csr")
+            >>> Adjacency.layout
+            torch.sparse_csr
 
-        SparseTensor = TensorType(i, v, torch.Size(shape))
-        return SparseTensor
+        :param SparseMatrix: scipy sparse matrix (or anything scipy.sparse.csr_matrix accepts, e.g. a dense array) to be converted
+        :param TensorType: Legacy target PyTorch sparse tensor type, e.g. torch.sparse.FloatTensor, for COO layout. The values are converted to float32 as before. Use None to keep the data type of the matrix.
+        :param String Layout: "coo" for a torch.sparse_coo tensor, or "csr" for a torch.sparse_csr tensor.
+        :return: SparseTensor
+        '''
+        if Layout not in ["coo", "csr"]:
+            raise ValueError(Layout, 'Layout is not "coo" or "csr"!')
+        if Layout == "coo" and TensorType is not None:
+            CooMatrix = scipy.sparse.coo_matrix(SparseMatrix, copy = False)
+            Indices = np.empty((2, CooMatrix.nnz), dtype = np.int64)
+            Indices[0] = CooMatrix.row
+            Indices[1] = CooMatrix.col
+            return TensorType(torch.from_numpy(Indices), torch.FloatTensor(CooMatrix.data), torch.Size(CooMatrix.shape))
+        CsrMatrix = scipy.sparse.csr_matrix(SparseMatrix, copy = False) #No copy for CSR input
+        if not CsrMatrix.has_canonical_format: #Unsorted indices or duplicates
+            CsrMatrix = CsrMatrix.copy()
+            CsrMatrix.sum_duplicates()
+        if Layout == "csr":
+            IndexType = np.promote_types(CsrMatrix.indptr.dtype, CsrMatrix.indices.dtype) #torch needs both index arrays in the same type
+            Indptr = torch.from_numpy(CsrMatrix.indptr.astype(IndexType, copy = False))
+            Indices = torch.from_numpy(CsrMatrix.indices.astype(IndexType, copy = False))
+            return torch.sparse_csr_tensor(Indptr, Indices, torch.from_numpy(CsrMatrix.data), size = CsrMatrix.shape, check_invariants = False)
+        Indices = np.empty((2, CsrMatrix.nnz), dtype = np.int64)
+        Indices[0] = np.repeat(np.arange(CsrMatrix.shape[0], dtype = np.int64), np.diff(CsrMatrix.indptr))
+        Indices[1] = CsrMatrix.indices
+        #Rows and then columns are sorted without duplicates, so the tensor is coalesced as it is
+        return torch.sparse_coo_tensor(torch.from_numpy(Indices), torch.from_numpy(CsrMatrix.data), size = CsrMatrix.shape, is_coalesced = True, check_invariants = False)
+
+    def ConvertSparseTensorToSparseMatrix(SparseTensor):
+        '''
+        Convert a 2-D PyTorch sparse tensor to scipy sparse matrix, keeping the data type. The arrays of the matrix share memory with the tensor when it is on CPU.
+        scipy does not support float16 and bfloat16, so such values are converted to float32.
 
-    def SparseDenseElementwiseMultiply(SparseTensor, DenseTensor, TensorType = torch.sparse.FloatTensor):
+        :param SparseTensor: PyTorch sparse tensor in COO, CSR or CSC layout
+        :return: SparseMatrix: scipy coo_matrix, csr_matrix or csc_matrix for COO, CSR or CSC layout respectively
+        :rtype: SparseMatrix
+        '''
+        if SparseTensor.dim() != 2:
+            raise ValueError(SparseTensor.shape, "Only 2-D sparse tensors can be converted!")
+        Shape = tuple(SparseTensor.shape)
+        SparseTensor = SparseTensor.detach().cpu()
+        if SparseTensor.layout not in [torch.sparse_coo, torch.sparse_csr, torch.sparse_csc]:
+            raise ValueError(SparseTensor.layout, "Layout is not COO, CSR or CSC!")
+        if SparseTensor.layout == torch.sparse_coo:
+            SparseTensor = SparseTensor.coalesce() #No copy for coalesced tensors
+        Values = SparseTensor.values()
+        if Values.dtype in [torch.float16, torch.bfloat16]:
+            Values = Values.float()
+        Values = Values.numpy()
+        if SparseTensor.layout == torch.sparse_coo:
+            Indices = SparseTensor.indices().numpy()
+            return scipy.sparse.coo_matrix((Values, (Indices[0], Indices[1])), shape = Shape)
+        if SparseTensor.layout == torch.sparse_csr:
+            return scipy.sparse.csr_matrix((Values, SparseTensor.col_indices().numpy(), SparseTensor.crow_indices().numpy()), shape = Shape)
+        return scipy.sparse.csc_matrix((Values, SparseTensor.row_indices().numpy(), SparseTensor.ccol_indices().numpy()), shape = Shape)
+
+    def SparseDenseElementwiseMultiply(SparseTensor, DenseTensor, TensorType = None):
         '''
         Used for PyTorch elementwise sparse tensor and dense tensor multiplication.
 
@@ -184,9 +554,10 @@ if TorchDependencyFlag:
 
         :param SparseTensor: A PyTorch sparse tensor
         :param DenseTensor: A PyTorch dense tensor
-        :param TensorType: Target PyTorch sparse tensor type.
+        :param TensorType: Target PyTorch sparse tensor type. Use None for torch.sparse.FloatTensor.
         :return: SparseTensor
         '''
+        TensorType = torch.sparse.FloatTensor if TensorType is None else TensorType
         i = SparseTensor._indices()
         v = SparseTensor._values()
         dv = DenseTensor[i[0, :], i[1, :]]  # get values from relevant entries of dense matrix
@@ -212,10 +583,6 @@ if TorchDependencyFlag:
             raise ValueError("RowIndexRange out of range")
         if max(ColumnIndexRange) >= SparseTensor.size()[1]:
             raise ValueError("ColumnIndexRange out of range")
-        CoalesceTensor = SparseTensor.coalesce()
-        TensorIndices = CoalesceTensor.indices().numpy()
-        TensorValues = CoalesceTensor.values().numpy()
-        coo_matrix = scipy.sparse.coo_matrix((TensorValues, (TensorIndices[0], TensorIndices[1])))
-        csr_matrix = coo_matrix.tocsr()
+        csr_matrix = ConvertSparseTensorToSparseMatrix(SparseTensor).tocsr()
         csr_matrix = csr_matrix[RowIndexRange, :][:, ColumnIndexRange]
         return ConvertSparseMatrixToSparseTensor(csr_matrix)
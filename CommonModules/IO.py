@@ -9,20 +9,51 @@ import shutil
 import json
 import pickle
 import zipfile
-import urllib
-import wget
+import zlib
+import tempfile
+import collections
+import tarfile
+import gzip
+import bz2
+import lzma
+import contextlib
 import pathlib
 import hashlib
+import heapq
+import concurrent.futures
+import itertools
+import fnmatch
+import re
+import time
+import mmap
+import threading
+import struct
+import inspect
+import functools
+import warnings
+import io
 
-DependencyFlag = False #Check if dependencies are satisfied. If not, some advanced functions will not be defined.
-try:
-    import networkx as nx
-    from networkx.readwrite import json_graph
-    import numpy as np
-    import scipy.io
-    DependencyFlag = True
-except Exception:
-    DependencyFlag = False
+from .Utilities import IsModuleAvailable, LazyModule
+
+#Modules below are imported on first use, so that importing this module stays fast when they are not needed
+urllib = LazyModule("urllib", globals(), Submodules = ["request"])
+wget = LazyModule("wget", globals())
+
+Lz4DependencyFlag = IsModuleAvailable("lz4") #Optional compressors used for .lz4 and .zst files
+lz4 = LazyModule("lz4", globals(), Submodules = ["frame"])
+ZstdDependencyFlag = IsModuleAvailable("zstandard")
+zstandard = LazyModule("zstandard", globals())
+
+OrjsonDependencyFlag = IsModuleAvailable("orjson") #Optional faster json engines
+orjson = LazyModule("orjson", globals())
+UjsonDependencyFlag = IsModuleAvailable("ujson")
+ujson = LazyModule("ujson", globals())
+
+DependencyFlag = IsModuleAvailable("networkx", "numpy", "scipy") #Check if dependencies are satisfied. If not, some advanced functions will not be defined.
+nx = LazyModule("networkx", globals(), "nx")
+json_graph = LazyModule("networkx.readwrite.json_graph", globals())
+np = LazyModule("numpy", globals(), "np")
+scipy = LazyModule("scipy", globals(), Submodules = ["io", "sparse"])
 
 def ListApkFiles(ApkDirectory):
     '''
@@ -46,64 +77,191 @@ Get the Apk file names for an ApkDirectory in a sorted order. Rerurn an empty li
                 ListOfApkFiles.append(Path)
     return sorted(ListOfApkFiles)
 
-def ListFiles(Directory, Extension, All = False):
+def ListFiles(Directory, Extension, All = False, Workers = 1, Filter = None):
     '''
     Given an extension, get the file names for a Directory in a sorted order. Rerurn an empty list if Directory == "".
 
+    Example::
+
+        >>> ListFiles("./data", [".json", ".pkl", "part-*.npz"], All = True, Filter = lambda Entry: Entry.stat().st_size >= 1024)
+
     :param String/List Directory: Path/Paths of a file directory
-    :param String Extension: Extension of the files you want. Better include "." in the Extension. Use "." to list all files. Use ""(empty string) to list all folders.
+    :param String/List Extension: Extension/Extensions of the files you want. Better include "." in the Extension. Glob patterns of file names such as "*_train.pkl" are also accepted. Use "." to list all files. Use ""(empty string) to list all folders.
     :param Boolean All: Whether to include all files in sub-directories
+    :param Function Filter: A function taking an os.DirEntry and returning whether to include it, e.g. to check its size or modification time. It's only called for the entries matching Extension.
+    :param Int Workers: Number of threads used to list directories. Use more than 1 on network filesystems (e.g. NFS) where each directory listing has a high latency.
     :return: ListOfFiles: The list of Paths of the files you want under Directory
     :rtype: List[String]
     '''
-    ListOfFiles=[]
+    return list(IterFiles(Directory, Extension, All = All, Sort = True, Workers = Workers, Filter = Filter))
+
+def IterFiles(Directory, Extension, All = False, Sort = False, Workers = 1, Filter = None):
+    '''
+    Given an extension, lazily yield the file names for a Directory. Yield nothing if Directory == "".
+    Use os.scandir so the file type cached by each directory entry is reused instead of calling stat again for every path.
+
+    Example::
+
+        >>> for Path in IterFiles("./data", ".pkl", All = True):
+        ...     Process(Path)
+
+    :param String/List Directory: Path/Paths of a file directory
+    :param String/List Extension: Extension/Extensions of the files you want. Better include "." in the Extension. Glob patterns of file names such as "*_train.pkl" are also accepted. Use "." to list all files. Use ""(empty string) to list all folders.
+    :param Boolean All: Whether to include all files in sub-directories
+    :param Function Filter: A function taking an os.DirEntry and returning whether to include it, e.g. to check its size or modification time. It's only called for the entries matching Extension.
+    :param Boolean Sort: Whether to yield paths in the same sorted order as ListFiles. Only one directory listing is held in memory at a time either way.
+    :param Int Workers: Number of threads used to list directories. When it is more than 1, sub-directories are listed ahead on a thread pool and the output is the same as using a single thread.
+    :return: Iterator of Paths of the files you want under Directory
+    :rtype: Iterator[String]
+    '''
     if(Directory == "" or Directory == []):
-        return []
-    if(type(Directory) != list and os.path.isdir(Directory) == False):
-        raise ValueError(Directory, 'Directory is not a directory!')
-    if(type(Extension)!=str):
-        raise ValueError(Extension, 'Extension is not a string!')
-    if(Extension):
-        if(Extension[0] != "."):
-            Extension = "." + Extension
+        return iter([])
     if type(Directory) == list:
         Directories = Directory
-        if All:
-            for Directory in Directories:
-                ListOfFiles.extend(_ListAllFiles(Directory, Extension))
-        else:
-            for Directory in Directories:
-                    filenames = os.listdir(Directory)
-                    for filename in filenames:
-                        #list filenames 
-                        #get the Path for the files
-                        Path=os.path.abspath(os.path.join(Directory, filename))
-                        #get the Path for the files
-                        if Extension == "": #Need to get all folders instead of files
-                            if os.path.isdir(Path):
-                                ListOfFiles.append(Path)
-                        else:
-                            if os.path.splitext(filename)[1]==Extension or Extension == ".":
-                                if os.path.isfile(Path):
-                                    ListOfFiles.append(Path)
     else:
-        if All:
-            ListOfFiles = _ListAllFiles(Directory, Extension)
+        Directories = [Directory]
+    for Directory in Directories:
+        if(os.path.isdir(Directory) == False):
+            raise ValueError(Directory, 'Directory is not a directory!')
+    Match = _CompileExtension(Extension)
+    if Workers > 1:
+        return _IterDirectoriesParallel(Directories, Match, Filter, All, Sort, Workers)
+    Iterators = [_IterDirectory(Directory, Match, Filter, All, Sort) for Directory in Directories]
+    if Sort:
+        return heapq.merge(*Iterators)
+    else:
+        return itertools.chain(*Iterators)
+
+def _CompileExtension(Extension):
+    '''
+    Check extension(s) and compile them into one function matching file names, so that any number of extensions and glob patterns are checked in a single pass.
+
+    :param String/List Extension: Extension/Extensions/glob patterns of the files you want. Use "." to list all files. Use ""(empty string) to list all folders.
+    :return: Match: None if folders are wanted, otherwise a function taking a file name and returning whether it matches
+    :rtype: Function
+    '''
+    if type(Extension) == str:
+        Extensions = [Extension]
+    elif isinstance(Extension, (list, tuple, set, frozenset)) and len(Extension) > 0:
+        Extensions = list(Extension)
+    else:
+        raise ValueError(Extension, 'Extension is not a string!')
+    if Extensions == [""]: #Need to get all folders instead of files
+        return None
+    Suffixes = set()
+    Patterns = []
+    for Extension in Extensions:
+        if(type(Extension)!=str or Extension == ""):
+            raise ValueError(Extension, 'Extension is not a string or is ""(empty string) together with other extensions!')
+        if Extension == ".":
+            return lambda Name: True
+        if any(Character in Extension for Character in "*?["):
+            Patterns.append(fnmatch.translate(Extension))
+        elif(Extension[0] != "."):
+            Suffixes.add("." + Extension)
         else:
-            filenames = os.listdir(Directory)
-            for filename in filenames:
-                #list filenames 
-                #get the Path for the files
-                Path=os.path.abspath(os.path.join(Directory, filename))
-                #get the Path for the files
-                if Extension == "": #Need to get all folders instead of files
-                    if os.path.isdir(Path):
-                        ListOfFiles.append(Path)
-                else:
-                    if os.path.splitext(filename)[1]==Extension or Extension == ".":
-                        if os.path.isfile(Path):
-                            ListOfFiles.append(Path)
-    return sorted(ListOfFiles)
+            Suffixes.add(Extension)
+    if not Patterns:
+        return lambda Name: os.path.splitext(Name)[1] in Suffixes
+    PatternMatch = re.compile("|".join(Patterns)).match
+    return lambda Name: os.path.splitext(Name)[1] in Suffixes or PatternMatch(Name) is not None
+
+def _IterDirectory(Directory, Match, Filter, All, Sort):
+    '''
+    Walk a single Directory depth first with an explicit stack and yield the matched paths.
+    When Sort is True, sub-directories are expanded at the position where their contents fall in the sorted list of full paths, so the output is sorted without collecting it first.
+    '''
+    Root = os.path.abspath(Directory)
+    Stack = [iter(_ScanDirectory(Root, Match, Filter, All, Sort, IgnoreErrors = False))]
+    while Stack:
+        for Expand, Entry in Stack[-1]:
+            if Expand:
+                Stack.append(iter(_ScanDirectory(Entry.path, Match, Filter, All, Sort, IgnoreErrors = True)))
+                break
+            yield Entry.path
+        else:
+            Stack.pop()
+
+def _IterDirectoriesParallel(Directories, Match, Filter, All, Sort, Workers, Lookahead = 4):
+    '''
+    Same as chaining/merging _IterDirectory for each of the Directories, but the directories the walk is going to enter next are listed ahead on a thread pool.
+    At most Workers * Lookahead listings are submitted and not consumed yet, so memory stays bounded and the output is still produced lazily.
+    The walk itself still happens in the calling thread in the same order, so it only waits for listings that are not finished yet.
+    '''
+    Executor = concurrent.futures.ThreadPoolExecutor(max_workers = Workers)
+    Pending = {} #Path -> Future of the listings submitted but not consumed yet
+    Queue = collections.OrderedDict() #Path -> IgnoreErrors of the directories found but not submitted yet, in the order they will be walked
+
+    def Submit():
+        while Queue and len(Pending) < Workers * Lookahead:
+            Directory, IgnoreErrors = Queue.popitem(last = False)
+            Pending[Directory] = Executor.submit(_ScanDirectory, Directory, Match, Filter, All, Sort, IgnoreErrors)
+
+    def Scan(Directory, IgnoreErrors):
+        Future = Pending.pop(Directory, None)
+        if Future is not None:
+            Items = Future.result()
+        else:
+            Queue.pop(Directory, None)
+            Items = _ScanDirectory(Directory, Match, Filter, All, Sort, IgnoreErrors)
+        for Expand, Entry in reversed(Items): #Sub-directories are walked next, so they go to the front
+            if Expand and Entry.path not in Pending:
+                Queue[Entry.path] = True
+                Queue.move_to_end(Entry.path, last = False)
+        Submit()
+        return iter(Items)
+
+    def Walk(Directory):
+        Stack = [Scan(Directory, False)]
+        while Stack:
+            for Expand, Entry in Stack[-1]:
+                if Expand:
+                    Stack.append(Scan(Entry.path, True))
+                    break
+                yield Entry.path
+            else:
+                Stack.pop()
+
+    try:
+        Directories = [os.path.abspath(Directory) for Directory in Directories]
+        for Directory in Directories:
+            Queue[Directory] = False
+        Submit()
+        Iterators = [Walk(Directory) for Directory in Directories]
+        if Sort:
+            yield from heapq.merge(*Iterators)
+        else:
+            yield from itertools.chain(*Iterators)
+    finally:
+        for Future in Pending.values():
+            Future.cancel()
+        Executor.shutdown(wait = False)
+
+def _ScanDirectory(Directory, Match, Filter, All, Sort, IgnoreErrors):
+    '''
+    List one directory with os.scandir and return (Expand, DirEntry) pairs, where Expand tells whether the entry is a sub-directory to walk into.
+    Symbolic links to directories are not walked into, the same as os.walk.
+    '''
+    Items = []
+    try:
+        with os.scandir(Directory) as Entries:
+            for Entry in Entries:
+                if All and Entry.is_dir(follow_symlinks = False):
+                    Items.append((Entry.name + os.sep, True, Entry))
+                    if Match is None and (Filter is None or Filter(Entry)): #Need to get all folders instead of files
+                        Items.append((Entry.name, False, Entry))
+                elif Match is None:
+                    if not All and Entry.is_dir() and (Filter is None or Filter(Entry)):
+                        Items.append((Entry.name, False, Entry))
+                elif Match(Entry.name) and Entry.is_file():
+                    if Filter is None or Filter(Entry):
+                        Items.append((Entry.name, False, Entry))
+    except OSError:
+        if not IgnoreErrors:
+            raise
+    if Sort:
+        Items.sort(key = lambda Item: Item[0])
+    return [(Expand, Entry) for Key, Expand, Entry in Items]
 
 def _ListAllFiles(Directory, Extension):
     '''
@@ -114,31 +272,124 @@ def _ListAllFiles(Directory, Extension):
     :return: ListOfFiles: The list of Paths of the files you want under Directory
     :rtype: List[String]
     '''
-    ListOfFiles=[]
     if(Directory == ""):
         raise ValueError(Directory, 'Directory is empty!')
-    if(os.path.isdir(Directory) == False):
-        raise ValueError(Directory, 'Directory is not a directory!')
-    if(type(Extension)!=str):
-        raise ValueError(Extension, 'Extension is not a string!')
-    if(Extension):
-        if(Extension[0] != "."):
-            Extension = "." + Extension
-    for root, dirs, files in os.walk(Directory):
-        if Extension == "":#Need to get all folders instead of files
-            ListOfFiles.append(os.path.abspath(root))
-        else:
-            for filename in files:
-                #list filenames 
-                #get the Path for the files
-                Path = os.path.abspath(os.path.join(root, filename))
-                #get the Path for the files
-                if os.path.splitext(filename)[1] == Extension or Extension == ".":
-                    if os.path.isfile(Path):
-                        ListOfFiles.append(Path)
-    if Extension == "":
-        ListOfFiles = ListOfFiles[1:] #Remove Directory in the list since the list contains the path of Directory itself
-    return sorted(ListOfFiles)
+    return list(IterFiles(Directory, Extension, All = True, Sort = True))
+
+class DirectoryIndex(object):
+    '''
+    A persistent index of all files and folders under a Directory. When refreshed, only the folders whose modification time changed are listed again, so repeated queries on a large directory do not need to walk it every time.
+    Note that modifying a file in place does not change the modification time of its folder, so the size of such a file is only updated after its folder changes.
+
+    Example::
+
+        >>> Index = DirectoryIndex("./data")
+        >>> Index.ListFiles(".pkl") #Same as ListFiles("./data", ".pkl", All = True)
+        >>> Index.ListFiles(".pkl", Prefix = "train", MinSize = 1024)
+        >>> Index.Refresh() #Pick up the changes made afterwards
+
+    :param String Directory: Path of the directory to be indexed
+    :param String IndexPath: Path of the pickle file to store the index. By default it's stored under ~/.cache/CommonModules/DirectoryIndex.
+    :param Boolean Refresh: Whether to refresh the index after loading it from IndexPath
+    '''
+    RecentNanoseconds = 2 * 10 ** 9 #Folders modified within this time before a scan will be scanned again next time, since changes made in the same timestamp tick cannot be detected
+
+    def __init__(self, Directory, IndexPath = None, Refresh = True):
+        if(os.path.isdir(Directory) == False):
+            raise ValueError(Directory, 'Directory is not a directory!')
+        self.Directory = os.path.abspath(Directory)
+        if IndexPath is None:
+            IndexPath = os.path.join(os.path.expanduser("~"), ".cache", "CommonModules", "DirectoryIndex", hashlib.md5(self.Directory.encode("utf-8")).hexdigest() + ".pkl")
+        self.IndexPath = IndexPath
+        self.Folders = {} #Path of folder -> (Modification time, Names of sub-folders, {Name of file: (Size, Modification time)})
+        if os.path.isfile(IndexPath):
+            Content = ImportFromPkl(IndexPath)
+            if Content["Directory"] == self.Directory:
+                self.Folders = Content["Folders"]
+        if Refresh:
+            self.Refresh()
+
+    def Refresh(self):
+        '''
+        Scan the folders changed since last refresh and store the index into IndexPath.
+
+        :return: Rescanned: Number of folders scanned again
+        :rtype: Int
+        '''
+        Folders = {}
+        Rescanned = 0
+        Stack = [self.Directory]
+        while Stack:
+            Folder = Stack.pop()
+            try:
+                ModifiedTime = os.stat(Folder).st_mtime_ns
+            except OSError:
+                continue
+            Record = self.Folders.get(Folder)
+            if Record is None or Record[0] != ModifiedTime:
+                Record = self._ScanFolder(Folder, ModifiedTime)
+                Rescanned += 1
+            Folders[Folder] = Record
+            Stack.extend(os.path.join(Folder, Name) for Name in Record[1])
+        self.Folders = Folders
+        self.Save()
+        return Rescanned
+
+    def _ScanFolder(self, Folder, ModifiedTime):
+        SubFolders = []
+        Files = {}
+        ScanTime = time.time_ns()
+        try:
+            with os.scandir(Folder) as Entries:
+                for Entry in Entries:
+                    try:
+                        if Entry.is_dir(follow_symlinks = False):
+                            SubFolders.append(Entry.name)
+                        elif Entry.is_file():
+                            StatInfo = Entry.stat()
+                            Files[Entry.name] = (StatInfo.st_size, StatInfo.st_mtime_ns)
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+        if ScanTime - ModifiedTime < self.RecentNanoseconds:
+            ModifiedTime = None
+        return (ModifiedTime, SubFolders, Files)
+
+    def Save(self):
+        '''
+        Store the index into IndexPath. The file is replaced atomically so other processes never read a partial index.
+        '''
+        _ExportToPklAtomically(self.IndexPath, {"Directory": self.Directory, "Folders": self.Folders})
+
+    def ListFiles(self, Extension = ".", Prefix = None, MinSize = None, MaxSize = None):
+        '''
+        Get the file names in the index in a sorted order, the same as ListFiles(Directory, Extension, All = True) at the time of last refresh.
+
+        :param String/List Extension: Extension/Extensions of the files you want. Better include "." in the Extension. Glob patterns of file names such as "*_train.pkl" are also accepted. Use "." to list all files. Use ""(empty string) to list all folders.
+        :param String Prefix: Only include paths starting with Prefix. A relative Prefix is relative to Directory.
+        :param Int MinSize: Only include files at least MinSize bytes
+        :param Int MaxSize: Only include files at most MaxSize bytes
+        :return: ListOfFiles: The list of Paths of the files you want
+        :rtype: List[String]
+        '''
+        Match = _CompileExtension(Extension)
+        if Prefix is not None:
+            Prefix = os.path.join(self.Directory, Prefix)
+        ListOfFiles = []
+        for Folder, (ModifiedTime, SubFolders, Files) in self.Folders.items():
+            if Prefix is not None and not (Folder.startswith(Prefix) or Prefix.startswith(Folder)):
+                continue
+            if Match is None: #Need to get all folders instead of files
+                Paths = [os.path.join(Folder, Name) for Name in SubFolders]
+            else:
+                Paths = [os.path.join(Folder, Name) for Name, (Size, FileModifiedTime) in Files.items()
+                         if Match(Name)
+                         and (MinSize is None or Size >= MinSize) and (MaxSize is None or Size <= MaxSize)]
+            if Prefix is not None:
+                Paths = [Path for Path in Paths if Path.startswith(Prefix)]
+            ListOfFiles.extend(Paths)
+        return sorted(ListOfFiles)
 
 def GetParentFolders(FilePath, All = False):
     '''
@@ -202,117 +453,768 @@ def RemoveDirectory(Folder):
     else:
         shutil.rmtree(Folder)
 
-def ExportToJson(Path, Content):
+def ExportToJson(Path, Content, CompressLevel = None, Compact = False, Engine = None):
     '''
     Export something to json file. 
-    Will automatic convert Set content into List.
+    Will automatic convert Set content into List, and numpy arrays/numbers into lists/numbers.
+    The file is compressed as a stream if Path ends with .gz, .bz2, .xz, .lz4 or .zst (see OpenFile).
 
     :param String Path: Path to store the json file
     :param Variant Content: something you want to export
+    :param Int CompressLevel: Compression level when the file is compressed. Use None for the default level of the compressor.
+    :param Boolean Compact: Whether to write without indentation and spaces. Otherwise it's indented by 4 spaces (2 spaces for orjson).
+    :param String Engine: "json" (default), or the faster "orjson" or "ujson" if installed. orjson writes NaN and Infinity as null; integers out of its 64-bit range are written with json instead.
     '''
     if(isinstance(Content,set)):
         Content = list(Content)
     #if(isinstance(Content, collections.defaultdict)):
     #    Content = dict(Content)
-    with open(Path, "w", encoding = "utf8") as f:
-        json.dump(Content, f, indent=4)
+    Engine = _GetJsonEngine(Engine)
+    if Engine == "orjson":
+        Option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | (0 if Compact else orjson.OPT_INDENT_2)
+        try:
+            Data = orjson.dumps(Content, default = _JsonDefault, option = Option)
+        except TypeError: #e.g. integers out of 64-bit range
+            Engine = "json"
+        else:
+            with OpenFile(Path, "wb", CompressLevel) as f:
+                f.write(Data)
+            return
+    if Engine == "ujson":
+        with OpenFile(Path, "w", CompressLevel, encoding = "utf8") as f:
+            ujson.dump(Content, f, indent = 0 if Compact else 4, default = _JsonDefault)
+    else:
+        with OpenFile(Path, "w", CompressLevel, encoding = "utf8") as f:
+            json.dump(Content, f, indent = None if Compact else 4, separators = (",", ":") if Compact else None, default = _JsonDefault)
+
+def _GetJsonEngine(Engine):
+    '''
+    Check a json engine name. None means the standard json module, so that NaN, Infinity and big integers are kept as before.
+    '''
+    if Engine is None:
+        return "json"
+    if Engine not in ["orjson", "ujson", "json"]:
+        raise ValueError(Engine, 'Engine is not "orjson", "ujson" or "json"!')
+    if (Engine == "orjson" and not OrjsonDependencyFlag) or (Engine == "ujson" and not UjsonDependencyFlag):
+        raise ImportError(Engine + " is not installed")
+    return Engine
+
+def _JsonDefault(Object):
+    '''
+    Convert objects not supported by json engines, i.e. sets and numpy arrays/numbers.
+    '''
+    if isinstance(Object, (set, frozenset)):
+        return list(Object)
+    if DependencyFlag:
+        if isinstance(Object, np.ndarray):
+            return Object.tolist()
+        if isinstance(Object, np.generic):
+            return Object.item()
+    raise TypeError("Object of type %s is not JSON serializable" % type(Object).__name__)
+
+def _GetJsonLineFunctions(Engine):
+    '''
+    Get the functions encoding one record into a single line and decoding it back with a json engine.
+
+    :return: (Dumps, Loads)
+    :rtype: Tuple[Function, Function]
+    '''
+    Engine = _GetJsonEngine(Engine)
+    if Engine == "orjson":
+        Option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        return (lambda Content: orjson.dumps(Content, default = _JsonDefault, option = Option).decode("utf8")), orjson.loads
+    elif Engine == "ujson":
+        return (lambda Content: ujson.dumps(Content, ensure_ascii = False, default = _JsonDefault)), ujson.loads
+    else:
+        return json.JSONEncoder(ensure_ascii = False, separators = (",", ":"), default = _JsonDefault).encode, json.loads
+
+def ExportToJsonLines(Path, Contents, BatchSize = 1000, CompressLevel = None, Append = False, Engine = None):
+    '''
+    Export records to a JSON Lines file, i.e. one json per line. Records are consumed one batch at a time, so an iterator/generator can be streamed into the file with constant memory.
+    The file is compressed as a stream if Path ends with .gz, .bz2, .xz, .lz4 or .zst (see OpenFile).
+
+    Example::
+
+        >>> ExportToJsonLines("./records.jsonl.gz", ({"id": i} for i in range(10 ** 7)))
+
+    :param String Path: Path to store the JSON Lines file
+    :param Iterable Contents: The records you want to export
+    :param Int BatchSize: Number of records encoded and written together
+    :param Int CompressLevel: Compression level when the file is compressed. Use None for the default level of the compressor.
+    :param Boolean Append: Whether to append to an existing file instead of overwriting it
+    :param String Engine: "json" (default), or the faster "orjson" or "ujson" if installed (see ExportToJson).
+    :return: Count: Number of records written
+    :rtype: Int
+    '''
+    Count = 0
+    Dumps = _GetJsonLineFunctions(Engine)[0]
+    Iterator = iter(Contents)
+    with OpenFile(Path, "a" if Append else "w", CompressLevel, encoding = "utf8") as f:
+        while True:
+            Batch = list(itertools.islice(Iterator, BatchSize))
+            if not Batch:
+                break
+            f.write("".join(Dumps(Content) + "\n" for Content in Batch))
+            Count += len(Batch)
+    return Count
+
+def IterJsonLines(Path, BatchSize = None, Engine = None):
+    '''
+    Lazily import records from a JSON Lines file, i.e. one json per line. Empty lines are skipped.
+    The file is decompressed as a stream if Path ends with .gz, .bz2, .xz, .lz4 or .zst (see OpenFile).
+
+    Example::
 
+        >>> for Record in IterJsonLines("./records.jsonl.gz"):
+        ...     Process(Record)
 
-def ExportToPkl(Path,Content):
+    :param String Path: Path of the JSON Lines file
+    :param Int BatchSize: If given, yield lists of BatchSize records (the last one can be shorter) instead of single records
+    :param String Engine: "json" (default), or the faster "orjson" or "ujson" if installed. orjson and ujson cannot read NaN and Infinity.
+    :return: Iterator of the records or lists of records
+    :rtype: Iterator[Variant]
+    '''
+    Loads = _GetJsonLineFunctions(Engine)[1]
+    with OpenFile(Path, "r", encoding = "utf8") as f:
+        Records = (Loads(Line) for Line in f if not Line.isspace())
+        if BatchSize is None:
+            yield from Records
+        else:
+            while True:
+                Batch = list(itertools.islice(Records, BatchSize))
+                if not Batch:
+                    break
+                yield Batch
+
+_CompressedExtensions = [".gz", ".bz2", ".xz", ".lz4", ".zst"]
+
+def OpenFile(Path, Mode = "r", CompressLevel = None, **kwargs):
+    '''
+    Open a file like open(), but compress/decompress it as a stream according to its extension: .gz, .bz2, .xz, or .lz4 and .zst if lz4 and zstandard are installed.
+
+    Example::
+
+        >>> with OpenFile("./result.json.gz", "w", encoding = "utf8") as f:
+        ...     f.write("[]")
+
+    :param String Path: Path of the file
+    :param String Mode: Mode of the file as in open(), e.g. "r", "wb". Text mode is used unless "b" is in Mode.
+    :param Int CompressLevel: Compression level when writing a compressed file. Use None for the default level of the compressor.
+    :param kwargs: Other arguments of open() for text mode, e.g. encoding.
+    :return: File: The file object
+    :rtype: File
+    '''
+    Extension = os.path.splitext(Path)[1].lower()
+    if Extension in _CompressedExtensions and "b" not in Mode and "t" not in Mode:
+        Mode += "t" #Compressed files are opened in binary mode by default
+    if Extension == ".gz":
+        return gzip.open(Path, Mode, compresslevel = 9 if CompressLevel is None else CompressLevel, **kwargs)
+    elif Extension == ".bz2":
+        return bz2.open(Path, Mode, compresslevel = 9 if CompressLevel is None else CompressLevel, **kwargs)
+    elif Extension == ".xz":
+        return lzma.open(Path, Mode, preset = CompressLevel if "w" in Mode or "a" in Mode or "x" in Mode else None, **kwargs)
+    elif Extension == ".lz4" and Lz4DependencyFlag:
+        return lz4.frame.open(Path, Mode, compression_level = 0 if CompressLevel is None else CompressLevel, **kwargs)
+    elif Extension == ".zst" and ZstdDependencyFlag:
+        Compressor = zstandard.ZstdCompressor(level = 3 if CompressLevel is None else CompressLevel)
+        return zstandard.open(Path, Mode, cctx = Compressor, **kwargs)
+    elif Extension in [".lz4", ".zst"]:
+        raise ImportError("lz4/zstandard is required to open " + Path)
+    else:
+        return open(Path, Mode, **kwargs)
+
+
+def ExportToPkl(Path,Content, OutOfBand = False, MinBufferSize = 2 ** 16, CompressLevel = None):
     '''
     Export something to pickle file. 
     Will automatic convert Set content into List.
+    If OutOfBand is True, pickle protocol 5 is used and large buffers (e.g. of numpy arrays or scipy sparse matrices) are written into Path + ".buffers" aligned to memory pages instead of being copied into the pickle stream. ImportFromPkl then memory-maps them without any copy.
+    Both files are written into temporary files first, which then replace Path + ".buffers" and Path, so an interrupted export leaves the previous files intact.
+    A random token is written into both files, so ImportFromPkl raises ValueError instead of reading a pickle with the buffers of another export, e.g. if the process died between replacing the two files.
 
     :param String Path: Path to store the json file
     :param Variant Content: something you want to export
+    :param Boolean OutOfBand: Whether to write large buffers out-of-band into Path + ".buffers"
+    :param Int MinBufferSize: Buffers smaller than this number of bytes are still written into the pickle stream
+    :param Int CompressLevel: Compression level when Path ends with .gz, .bz2, .xz, .lz4 or .zst (see OpenFile). Use None for the default level of the compressor.
     '''
     if(isinstance(Content, set)):
         Content = list(Content)
     #if(isinstance(Content, collections.defaultdict)):
     #    Content = dict(Content)
+    if OutOfBand:
+        Buffers = []
+        def BufferCallback(Buffer):
+            try:
+                if Buffer.raw().nbytes < MinBufferSize:
+                    return True
+            except BufferError: #Not contiguous
+                return True
+            Buffers.append(Buffer)
+            return False
+        TempPath = _GetTemporaryPath(Path) #Both files are replaced only after they are completely written, the sidecar first
+        Token = os.urandom(16).hex()
+        try:
+            with OpenFile(TempPath, "wb", CompressLevel) as fd:
+                pickle.dump((_PklBuffersMagic, Token), fd, protocol=5)
+                pickle.dump(Content, fd, protocol=5, buffer_callback=BufferCallback)
+            _ExportBuffers(TempPath + ".buffers", Buffers, Token)
+            os.replace(TempPath + ".buffers", Path + ".buffers")
+            os.replace(TempPath, Path)
+        finally:
+            for FilePath in [TempPath, TempPath + ".buffers"]:
+                if os.path.exists(FilePath):
+                    os.remove(FilePath)
+    else:
+        with OpenFile(Path, "wb", CompressLevel) as fd:
+            pickle.dump(Content, fd, protocol=4)
+        if os.path.exists(Path + ".buffers"): #Left by an earlier out-of-band export
+            os.remove(Path + ".buffers")
+
+_PklBuffersMagic = b"\x93CMPKLBUF\x01" #Magic string and format version of the token in front of a pickle with out-of-band buffers
+
+def _ExportBuffers(Path, Buffers, Token, Alignment = 4096):
+    '''
+    Write pickle buffers into a file, each starting at a multiple of Alignment, followed by the pickled (Token, list of (Offset, Size) of the buffers) and the size of that pickle in 8 bytes.
+    '''
+    Index = []
     with open(Path, "wb") as fd:
-        pickle.dump(Content, fd, protocol=4)
+        for Buffer in Buffers:
+            fd.write(b"\0" * (-fd.tell() % Alignment))
+            Raw = Buffer.raw()
+            Index.append((fd.tell(), Raw.nbytes))
+            fd.write(Raw)
+        IndexBytes = pickle.dumps((Token, Index), protocol=4)
+        fd.write(IndexBytes)
+        fd.write(struct.pack("<Q", len(IndexBytes)))
+
+def _ImportBuffers(Path, Mmap = True):
+    '''
+    Read the buffers written by _ExportBuffers. With Mmap, they are copy-on-write views of the memory-mapped file, so only the pages actually read are loaded and writing to them does not change the file.
+
+    :return: (Token, Buffers)
+    '''
+    with open(Path, "rb") as fd:
+        if Mmap:
+            Data = memoryview(mmap.mmap(fd.fileno(), 0, access = mmap.ACCESS_COPY))
+        else:
+            Data = memoryview(bytearray(fd.read()))
+    IndexSize = struct.unpack("<Q", Data[-8:])[0]
+    Token, Index = pickle.loads(Data[-8 - IndexSize:-8])
+    return Token, [Data[Offset:Offset + Size] for Offset, Size in Index]
 
-def ImportFromPkl(Path):
+def _GetTemporaryPath(Path):
+    '''
+    Get a path in the same folder as Path to write into before replacing Path. It ends with ".tmp", followed by the extension of a compressed file so OpenFile compresses it in the same way.
+    '''
+    Root, Extension = os.path.splitext(Path)
+    if Extension.lower() not in _CompressedExtensions:
+        Root, Extension = Path, ""
+    return "%s.%d.%d.tmp%s" % (Root, os.getpid(), threading.get_ident(), Extension)
+
+def _ExportToPklAtomically(Path, Content):
+    '''
+    Export something to pickle file through a temporary file which then replaces Path, so other processes never read a partially written file.
+    The parent folder of Path will be created if it does not exist.
+
+    :param String Path: Path to store the pickle file
+    :param Variant Content: something you want to export
+    '''
+    os.makedirs(os.path.dirname(os.path.abspath(Path)), exist_ok = True)
+    TempPath = _GetTemporaryPath(Path)
+    try:
+        ExportToPkl(TempPath, Content)
+        os.replace(TempPath, Path)
+    finally:
+        if os.path.exists(TempPath):
+            os.remove(TempPath)
+
+def ImportFromPkl(Path, Mmap = True):
     '''
     Import something from pickle file. 
+    The file is decompressed as a stream if Path ends with .gz, .bz2, .xz, .lz4 or .zst (see OpenFile).
+    If Path + ".buffers" exists (see ExportToPkl with OutOfBand = True), the out-of-band buffers are read from it.
 
     :param String Path: Path of the pickle file
+    :param Boolean Mmap: Whether to memory-map the out-of-band buffers instead of reading them into memory. Arrays are copy-on-write views of the file in this case.
     :return: Content: Content in the pickle file
     :rtype: Variant
     '''    
-    with open(Path,"rb") as fd:
-        Content = pickle.load(fd)
+    Token = Buffers = None
+    if os.path.exists(Path + ".buffers"):
+        Token, Buffers = _ImportBuffers(Path + ".buffers", Mmap)
+    with OpenFile(Path,"rb") as fd:
+        Content = pickle.load(fd, buffers=Buffers)
+        if isinstance(Content, tuple) and len(Content) == 2 and Content[0] == _PklBuffersMagic: #Written with OutOfBand, the content follows
+            if Content[1] != Token:
+                raise ValueError(Path, "Pickle file does not match its .buffers file or the .buffers file is missing!")
+            Content = pickle.load(fd, buffers=Buffers)
     return Content
 
 
-def ImportFromJson(Path):
+def ImportFromJson(Path, Engine = None):
     '''
     Import something from json file. 
+    The file is decompressed as a stream if Path ends with .gz, .bz2, .xz, .lz4 or .zst (see OpenFile).
 
     :param String Path: Path of the json file
+    :param String Engine: "json" (default), or the faster "orjson" or "ujson" if installed. Files with NaN or Infinity, which orjson cannot read, are read with json instead; orjson reads integers out of 64-bit range as floats.
     :return: Content: Content in the json file
     :rtype: Variant
     '''    
-    with open(Path,"r") as File:
-        Content=json.load(File, encoding = "utf-8")
+    Engine = _GetJsonEngine(Engine)
+    if Engine == "orjson":
+        with OpenFile(Path,"rb") as File:
+            Data = File.read()
+        try:
+            return orjson.loads(Data)
+        except orjson.JSONDecodeError:
+            return json.loads(Data)
+    with OpenFile(Path,"r", encoding = "utf-8") as File:
+        if Engine == "ujson":
+            Content=ujson.load(File)
+        else:
+            Content=json.load(File)
         return Content
 
 
-def CompressFiles(Paths, CompressedFilePath, Format = "zip"):
+class _CanonicalTag(object):
+    '''
+    Marks the sorted form of a set or dict made by _GetCanonicalForm, so it cannot be mistaken for a list or tuple in the arguments.
+    '''
+
+def _GetCanonicalForm(Content):
+    '''
+    Convert sets and dicts, also inside lists, tuples, sets and dicts, into lists sorted by the pickles of their items.
+    Their iteration order depends on PYTHONHASHSEED or on the insertion order, so the pickle of Content differs between processes otherwise.
+    '''
+    if type(Content) in [list, tuple]:
+        return type(Content)(_GetCanonicalForm(Item) for Item in Content)
+    if isinstance(Content, (set, frozenset)):
+        Items = [_GetCanonicalForm(Item) for Item in Content]
+        return (_CanonicalTag, type(Content), sorted(Items, key = lambda Item: pickle.dumps(Item, protocol=4)))
+    if isinstance(Content, dict):
+        Items = [(_GetCanonicalForm(Key), _GetCanonicalForm(Value)) for Key, Value in Content.items()]
+        return (_CanonicalTag, type(Content), sorted(Items, key = lambda Item: pickle.dumps(Item[0], protocol=4)))
+    return Content
+
+def _DumpCanonically(Content):
+    '''
+    Pickle Content into the same bytes in every process, see _GetCanonicalForm.
+    '''
+    return pickle.dumps(_GetCanonicalForm(Content), protocol=4)
+
+def _GetCodeFingerprint(Code):
+    '''
+    Get what identifies the compiled code of a function when its source is not available: the bytecode, the names it uses and the constants, including those of nested functions.
+    '''
+    Constants = tuple(_GetCodeFingerprint(Constant) if inspect.iscode(Constant) else Constant for Constant in Code.co_consts)
+    return (Code.co_code, Code.co_names, Constants)
+
+class DiskCache(object):
+    '''
+    Memoize results of functions into pickle files in a Directory, so they persist across runs and processes.
+    Results are keyed by the name and source code of the function, Version and the arguments, so the arguments must be picklable. Sets and dicts in the arguments (also inside lists, tuples, sets and dicts) are sorted first, so the keys are the same in every process. When the total size exceeds MaxBytes, least recently used results are removed.
+    Results are written atomically, so several processes can share the same Directory.
+
+    Example::
+
+        >>> Cache = DiskCache("./cache", MaxBytes = 10 * 2 ** 30)
+        >>> @Cache
+        ... def ExtractFeatures(Path, Dimension = 128):
+        ...     ...
+        >>> Features = ExtractFeatures("./data/1.txt") #Computed at the first time and loaded afterwards
+
+    :param String Directory: Path of the folder to store the results
+    :param Int MaxBytes: Maximum total size of the results in bytes. Use None for no limit.
+    :param Variant Version: Change it to invalidate the results of all functions, e.g. when a function called by them is changed.
+    '''
+    def __init__(self, Directory, MaxBytes = None, Version = None):
+        self.Directory = Directory
+        self.MaxBytes = MaxBytes
+        self.Version = Version
+        os.makedirs(Directory, exist_ok = True)
+
+    def __call__(self, Function):
+        try:
+            Code = inspect.getsource(Function)
+        except (OSError, TypeError): #Source is not available, e.g. in an interactive session
+            Code = _GetCodeFingerprint(Function.__code__)
+        FunctionKey = (Function.__module__, Function.__qualname__, Code, self.Version)
+
+        @functools.wraps(Function)
+        def Wrapper(*args, **kwargs):
+            Key = hashlib.sha256(_DumpCanonically((FunctionKey, args, kwargs))).hexdigest()
+            Path = os.path.join(self.Directory, Key + ".pkl")
+            try:
+                Content = ImportFromPkl(Path)
+                os.utime(Path) #Modification time is used as the last used time
+                return Content
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError): #Not computed yet, or removed by another process
+                pass
+            Content = Function(*args, **kwargs)
+            _ExportToPklAtomically(Path, Content)
+            if self.MaxBytes is not None:
+                self.Evict()
+            return Content
+        return Wrapper
+
+    def Evict(self):
+        '''
+        Remove least recently used results until the total size is within MaxBytes.
+        '''
+        Entries = []
+        with os.scandir(self.Directory) as Iterator:
+            for Entry in Iterator:
+                if Entry.name.endswith(".pkl"):
+                    try:
+                        StatInfo = Entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    Entries.append((StatInfo.st_mtime_ns, StatInfo.st_size, Entry.path))
+        TotalBytes = sum(Size for ModifiedTime, Size, Path in Entries)
+        for ModifiedTime, Size, Path in sorted(Entries):
+            if TotalBytes <= self.MaxBytes:
+                break
+            try:
+                os.remove(Path)
+            except FileNotFoundError: #Removed by another process
+                pass
+            TotalBytes -= Size
+
+    def Clear(self):
+        '''
+        Remove all results.
+        '''
+        for Path in ListFiles(self.Directory, ".pkl"):
+            try:
+                os.remove(Path)
+            except FileNotFoundError:
+                pass
+
+def CompressFiles(Paths, CompressedFilePath, Format = "zip", CompressLevel = None, Workers = 1, StoreIncompressible = True):
     '''
-    Compress files into a (zip) file.
+    Compress files into a (zip/tar) file.
+    Tar files are written as a stream, so they can be larger than the memory or the disk cache, and CompressedFilePath can also be a file object such as a pipe.
     
     :param List Paths: Paths of the files you want to compress. These paths will be under the root of the compressed file.(You may want to use ListFiles to pass in all paths)
-    :param String CompressedFilePath: Path of the compressed file you want to store.
-    :param String Format: The format of the compressed file.
+    :param String/File CompressedFilePath: Path of the compressed file you want to store. A file object opened in binary mode is also accepted for tar formats.
+    :param String Format: The format of the compressed file, which can be "zip", "tar", "tar.gz", "tar.bz2" or "tar.xz".
+    :param Int CompressLevel: Compression level from 0 to 9. Use None for the default level of the compressor.
+    :param Int Workers: Number of threads used to compress files. When it is more than 1, different files are compressed concurrently and written in order. Only used for zip format.
+    :param Boolean StoreIncompressible: Whether to store files without compression if they are already compressed (e.g. .gz, .npz, .jpg) or a sample of them does not shrink. Only used for zip format.
     '''
     if Format == "zip":        
-        CompressedFile = zipfile.ZipFile(CompressedFilePath, "w", compression = zipfile.ZIP_DEFLATED)
-        for Path in Paths:
-            parent_folder = os.path.dirname(Path)
-            if os.path.isdir(Path):
-                for root, folders, files in os.walk(Path):
-                    # Include all subfolders, including empty ones.
-                    for folder_name in folders:
-                        absolute_path = os.path.join(root, folder_name)
-                        relative_path = absolute_path.replace(parent_folder, '')
-                        CompressedFile.write(absolute_path, relative_path)
-                    for file_name in files:
-                        absolute_path = os.path.join(root, file_name)
-                        relative_path = absolute_path.replace(parent_folder, '')
-                        CompressedFile.write(absolute_path, relative_path)
+        Members = _ListCompressedMembers(Paths)
+        if Workers > 1:
+            _WriteZipParallel(CompressedFilePath, Members, CompressLevel, Workers, StoreIncompressible)
+            return
+        with zipfile.ZipFile(CompressedFilePath, "w", compression = zipfile.ZIP_DEFLATED, compresslevel = CompressLevel) as CompressedFile:
+            for absolute_path, relative_path in Members:
+                if StoreIncompressible and os.path.isfile(absolute_path) and _IsIncompressible(absolute_path):
+                    CompressedFile.write(absolute_path, relative_path, compress_type = zipfile.ZIP_STORED)
+                else:
+                    CompressedFile.write(absolute_path, relative_path)
+    elif Format in _TarCompressions:
+        with contextlib.ExitStack() as Stack:
+            if hasattr(CompressedFilePath, "write"):
+                File = CompressedFilePath
             else:
-                relative_path = os.path.split(Path)[-1]
-                CompressedFile.write(Path, relative_path)
-        CompressedFile.close()
+                File = Stack.enter_context(open(CompressedFilePath, "wb"))
+            File = Stack.enter_context(_OpenCompressor(File, _TarCompressions[Format], CompressLevel))
+            CompressedFile = Stack.enter_context(tarfile.open(fileobj = File, mode = "w|"))
+            for absolute_path, relative_path in _ListCompressedMembers(Paths):
+                CompressedFile.add(absolute_path, relative_path, recursive = False)
+    else:
+        raise NotImplementedError
+
+_TarCompressions = {"tar": None, "tar.gz": "gz", "tar.bz2": "bz2", "tar.xz": "xz"}
+
+def _OpenCompressor(File, Compression, CompressLevel = None):
+    '''
+    Wrap a binary file object to compress everything written into it as a stream. File itself is not closed when the returned file object is closed.
+
+    :param File File: A file object opened in binary write mode.
+    :param String Compression: "gz", "bz2", "xz" or None for no compression.
+    :param Int CompressLevel: Compression level from 0 to 9. Use None for the default level of the compressor.
+    :return: CompressedFile: The file object to write into
+    :rtype: File
+    '''
+    if Compression is None:
+        return contextlib.nullcontext(File)
+    elif Compression == "gz":
+        return gzip.GzipFile(fileobj = File, mode = "wb", compresslevel = 9 if CompressLevel is None else CompressLevel)
+    elif Compression == "bz2":
+        return bz2.BZ2File(File, "wb", compresslevel = 9 if CompressLevel is None else CompressLevel)
+    elif Compression == "xz":
+        return lzma.LZMAFile(File, "wb", preset = CompressLevel)
     else:
         raise NotImplementedError
 
+def _ListCompressedMembers(Paths):
+    '''
+    Get the (Path, Path in the compressed file) pairs of all files and folders to be compressed by CompressFiles.
+    '''
+    Members = []
+    for Path in Paths:
+        parent_folder = os.path.dirname(Path)
+        if os.path.isdir(Path):
+            for root, folders, files in os.walk(Path):
+                # Include all subfolders, including empty ones.
+                for folder_name in folders:
+                    absolute_path = os.path.join(root, folder_name)
+                    relative_path = absolute_path.replace(parent_folder, '')
+                    Members.append((absolute_path, relative_path))
+                for file_name in files:
+                    absolute_path = os.path.join(root, file_name)
+                    relative_path = absolute_path.replace(parent_folder, '')
+                    Members.append((absolute_path, relative_path))
+        else:
+            relative_path = os.path.split(Path)[-1]
+            Members.append((Path, relative_path))
+    return Members
+
+_IncompressibleExtensions = {".zip", ".gz", ".tgz", ".bz2", ".xz", ".lz4", ".zst", ".7z", ".rar", ".npz",
+                             ".jpg", ".jpeg", ".png", ".gif", ".webp", ".mp3", ".mp4", ".mkv", ".avi", ".mov"}
+
+def _IsIncompressible(Path, SampleSize = 2 ** 16):
+    '''
+    Check whether a file is already compressed by its extension, or by whether the first SampleSize bytes shrink with the fastest zlib level.
+    '''
+    if os.path.splitext(Path)[1].lower() in _IncompressibleExtensions:
+        return True
+    with open(Path, "rb") as f:
+        Sample = f.read(SampleSize)
+    return len(Sample) >= 1024 and len(zlib.compress(Sample, 1)) > 0.95 * len(Sample)
+
+def _WriteZipParallel(CompressedFilePath, Members, CompressLevel, Workers, StoreIncompressible):
+    '''
+    Write a zip file whose files are compressed concurrently on a thread pool (zlib releases the GIL while compressing) and written in order. At most 2 * Workers compressed files wait to be written at any time.
+    zipfile can not add data compressed elsewhere, so the headers are written here following the zip file format specification (APPNOTE.TXT), with ZIP64 extensions when sizes or offsets exceed zipfile.ZIP64_LIMIT.
+    '''
+    CentralDirectory = []
+    def WriteMember(absolute_path, relative_path, Future):
+        Info = zipfile.ZipInfo.from_file(absolute_path, relative_path)
+        if Future is None: #Folder
+            Method, CRC, Size, CompressedMember = zipfile.ZIP_STORED, 0, 0, None
+        else:
+            Method, CRC, Size, CompressedMember = Future.result()
+        with CompressedMember if CompressedMember is not None else contextlib.nullcontext():
+            CompressedSize = CompressedMember.tell() if CompressedMember is not None else 0
+            LocalHeader, CentralHeader = _ZipMemberHeaders(Info, Method, CRC, Size, CompressedSize, File.tell())
+            File.write(LocalHeader)
+            if CompressedMember is not None:
+                CompressedMember.seek(0)
+                shutil.copyfileobj(CompressedMember, File, 2 ** 20)
+        CentralDirectory.append(CentralHeader)
+    with open(CompressedFilePath, "wb") as File, concurrent.futures.ThreadPoolExecutor(max_workers = Workers) as Executor:
+        Pending = collections.deque()
+        for absolute_path, relative_path in Members:
+            if os.path.isfile(absolute_path):
+                Pending.append((absolute_path, relative_path, Executor.submit(_CompressZipMember, absolute_path, CompressLevel, StoreIncompressible)))
+            else:
+                Pending.append((absolute_path, relative_path, None))
+            while len(Pending) > 2 * Workers or (Pending and Pending[0][2] is None):
+                WriteMember(*Pending.popleft())
+        while Pending:
+            WriteMember(*Pending.popleft())
+        Start = File.tell()
+        for CentralHeader in CentralDirectory:
+            File.write(CentralHeader)
+        File.write(_ZipEndRecords(len(CentralDirectory), Start, File.tell()))
+
+def _CompressZipMember(Path, CompressLevel, StoreIncompressible, ChunkSize = 2 ** 20):
+    '''
+    Compress a file with raw deflate as zip files store it, or copy it as it is if it should be stored without compression, into a temporary file.
+
+    :return: (Method, CRC, Size, CompressedMember), where CompressedMember is the temporary file positioned at its end
+    '''
+    Stored = StoreIncompressible and _IsIncompressible(Path)
+    Compressor = None if Stored else zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if CompressLevel is None else CompressLevel, zlib.DEFLATED, -15)
+    CompressedMember = tempfile.SpooledTemporaryFile(max_size = 2 ** 24)
+    CRC = Size = 0
+    try:
+        with open(Path, "rb") as f:
+            for Chunk in iter(lambda: f.read(ChunkSize), b""):
+                CRC = zlib.crc32(Chunk, CRC)
+                Size += len(Chunk)
+                CompressedMember.write(Chunk if Stored else Compressor.compress(Chunk))
+        if not Stored:
+            CompressedMember.write(Compressor.flush())
+    except BaseException:
+        CompressedMember.close()
+        raise
+    return (zipfile.ZIP_STORED if Stored else zipfile.ZIP_DEFLATED), CRC, Size, CompressedMember
+
+def _ZipMemberHeaders(Info, Method, CRC, Size, CompressedSize, Offset):
+    '''
+    Build the local file header and the central directory header of a zip member.
+
+    :param ZipInfo Info: Name, date and attributes of the member.
+    :param Int Offset: Position of the local file header in the zip file.
+    :return: (LocalHeader, CentralHeader)
+    '''
+    Name = Info.filename.encode("utf-8")
+    Flags = 0 if Info.filename.isascii() else 0x800 #Bit 11: UTF-8 name
+    Year, Month, Day, Hour, Minute, Second = Info.date_time
+    DosTime = Hour << 11 | Minute << 5 | Second // 2
+    DosDate = (Year - 1980) << 9 | Month << 5 | Day
+    Zip64Sizes = Size > zipfile.ZIP64_LIMIT or CompressedSize > zipfile.ZIP64_LIMIT
+    Zip64Offset = Offset > zipfile.ZIP64_LIMIT
+    Version = 45 if Zip64Sizes or Zip64Offset else 20
+    Sizes = (0xFFFFFFFF, 0xFFFFFFFF) if Zip64Sizes else (CompressedSize, Size)
+    LocalExtra = struct.pack("<HHQQ", 1, 16, Size, CompressedSize) if Zip64Sizes else b""
+    LocalHeader = struct.pack("<IHHHHHIIIHH", 0x04034b50, Version, Flags, Method, DosTime, DosDate, CRC, *Sizes, len(Name), len(LocalExtra)) + Name + LocalExtra
+    Zip64Fields = ([Size, CompressedSize] if Zip64Sizes else []) + ([Offset] if Zip64Offset else [])
+    CentralExtra = struct.pack("<HH%dQ" % len(Zip64Fields), 1, 8 * len(Zip64Fields), *Zip64Fields) if Zip64Fields else b""
+    CentralHeader = struct.pack("<IHHHHHHIIIHHHHHII", 0x02014b50, 3 << 8 | Version, Version, Flags, Method, DosTime, DosDate, CRC, *Sizes, len(Name), len(CentralExtra), 0, 0, 0,
+                                Info.external_attr, 0xFFFFFFFF if Zip64Offset else Offset) + Name + CentralExtra
+    return LocalHeader, CentralHeader
 
-def DecompressFiles(Paths, TargetFolder, Format = "zip"):
+def _ZipEndRecords(Count, Start, End):
     '''
-    Decompress files from a (zip) file/files.
+    Build the end of central directory record of a zip file, preceded by the ZIP64 ones if needed.
+
+    :param Int Count: Number of members.
+    :param Int Start: Position of the central directory.
+    :param Int End: Position right after the central directory.
+    '''
+    Size = End - Start
+    Records = b""
+    if Count > 0xFFFF or Start > zipfile.ZIP64_LIMIT or Size > zipfile.ZIP64_LIMIT:
+        Records += struct.pack("<IQHHIIQQQQ", 0x06064b50, 44, 45, 45, 0, 0, Count, Count, Size, Start)
+        Records += struct.pack("<IIQI", 0x07064b50, 0, End, 1)
+        Count, Size, Start = min(Count, 0xFFFF), min(Size, 0xFFFFFFFF), 0xFFFFFFFF
+    return Records + struct.pack("<IHHHHIIH", 0x06054b50, 0, 0, Count, Count, Size, Start, 0)
+
+def DecompressFiles(Paths, TargetFolder, Format = "zip", Members = None, Workers = 1):
+    '''
+    Decompress files from a (zip/tar) file/files.
+    Tar files are read as a stream with the compression detected automatically, so they can be larger than the memory or the disk cache.
     
-    :param List Paths: Paths of the files you want to decompress. 
+    :param List Paths: Paths of the files you want to decompress. File objects opened in binary mode, such as pipes, are also accepted for tar formats.
     :param String TargetFolder: Path of the decompressed files you want to store.
-    :param String Format: The format of the compressed file.
+    :param String Format: The format of the compressed file, which can be "zip", "tar", "tar.gz", "tar.bz2" or "tar.xz".
+    :param String/List Members: Glob pattern/patterns of the names of the files to be decompressed, e.g. "*.pkl". Use None to decompress all files.
+    :param Int Workers: Number of threads. When it is more than 1, different compressed files (and the files inside one zip file) are decompressed concurrently.
     '''
     if Format == "zip":        
+        Match = _CompileMemberPatterns(Members)
+        Tasks = []
         for Path in Paths:
-            CompressedFile = zipfile.ZipFile(Path, "r")
-            CompressedFile.extractall(TargetFolder)
-            CompressedFile.close()
+            with zipfile.ZipFile(Path, "r") as CompressedFile:
+                Infos = [Info for Info in CompressedFile.infolist() if Match(Info.filename)]
+            Infos.sort(key = lambda Info: Info.file_size, reverse = True) #Split large files evenly among threads
+            NumChunks = max(1, min(Workers, len(Infos)))
+            Tasks.extend((Path, [Info.filename for Info in Infos[i::NumChunks]]) for i in range(NumChunks))
+        if Workers > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers = Workers) as Executor:
+                for Future in [Executor.submit(_ExtractZipMembers, Path, Names, TargetFolder) for Path, Names in Tasks]:
+                    Future.result()
+        else:
+            for Path, Names in Tasks:
+                _ExtractZipMembers(Path, Names, TargetFolder)
+    elif Format in _TarCompressions:
+        Match = _CompileMemberPatterns(Members)
+        if Workers > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers = Workers) as Executor:
+                for Future in [Executor.submit(_ExtractTarMembers, Path, Match, TargetFolder) for Path in Paths]:
+                    Future.result()
+        else:
+            for Path in Paths:
+                _ExtractTarMembers(Path, Match, TargetFolder)
+    else:
+        raise NotImplementedError
+
+def _CompileMemberPatterns(Members):
+    '''
+    Compile glob pattern/patterns of member names into a function checking whether a member name matches any of them.
+    '''
+    if Members is None:
+        return lambda Name: True
+    if type(Members) == str:
+        Members = [Members]
+    return re.compile("|".join(fnmatch.translate(Pattern) for Pattern in Members)).match
+
+def _ExtractZipMembers(Path, Names, TargetFolder):
+    with zipfile.ZipFile(Path, "r") as CompressedFile:
+        for Name in Names:
+            try:
+                CompressedFile.extract(Name, TargetFolder)
+            except FileExistsError: #Its folder was created by another thread at the same time
+                CompressedFile.extract(Name, TargetFolder)
+
+def _OpenTarStream(Path):
+    '''
+    Open a (compressed) tar file or file object for reading as a stream.
+    '''
+    if hasattr(Path, "read"):
+        return tarfile.open(fileobj = Path, mode = "r|*")
+    else:
+        return tarfile.open(Path, mode = "r|*")
+
+def _ExtractTarMembers(Path, Match, TargetFolder):
+    FilterArguments = {"filter": "data"} if hasattr(tarfile, "data_filter") else {} #Refuse absolute paths and links outside TargetFolder when supported
+    with _OpenTarStream(Path) as CompressedFile:
+        for Info in CompressedFile:
+            if Match(Info.name):
+                CompressedFile.extract(Info, TargetFolder, **FilterArguments)
+
+def IterCompressedFiles(Path, Members = None, Format = "zip"):
+    '''
+    Read the files inside a (zip) file one by one without decompressing them to the disk. Each file object is closed when the next one is read.
+
+    Example::
+
+        >>> for Name, File in IterCompressedFiles("./results.zip", "*.pkl"):
+        ...     Content = pickle.load(File)
+
+    :param String/File Path: Path of the compressed file. A file object opened in binary mode is also accepted for tar formats.
+    :param String/List Members: Glob pattern/patterns of the names of the files to be read, e.g. "*.pkl". Use None to read all files.
+    :param String Format: The format of the compressed file, which can be "zip", "tar", "tar.gz", "tar.bz2" or "tar.xz".
+    :return: Iterator of (Name, File object) of the files inside the compressed file
+    :rtype: Iterator[Tuple[String, File]]
+    '''
+    if Format == "zip":
+        Match = _CompileMemberPatterns(Members)
+        with zipfile.ZipFile(Path, "r") as CompressedFile:
+            for Info in CompressedFile.infolist():
+                if Info.is_dir() or not Match(Info.filename):
+                    continue
+                with CompressedFile.open(Info) as File:
+                    yield Info.filename, File
+    elif Format in _TarCompressions:
+        Match = _CompileMemberPatterns(Members)
+        with _OpenTarStream(Path) as CompressedFile:
+            for Info in CompressedFile:
+                if Info.isfile() and Match(Info.name):
+                    with CompressedFile.extractfile(Info) as File:
+                        yield Info.name, File
     else:
         raise NotImplementedError
 
-def DownloadFile(URL, Destination = "./download", ExpectedBytes = None, IsDestinationFolder = None):
+def DownloadFile(URL, Destination = "./download", ExpectedBytes = None, IsDestinationFolder = None, Checksum = None, HashFactory = hashlib.md5, Connections = 1, Resume = True, BlockSize = 2 ** 23, ProgressCallback = None):
     """
-    Download a file if not present, and make sure it's the right size.
+    Download a file if not present, and make sure it's the right size (and checksum).
+    The file is downloaded into a ".part" file first. If the server supports HTTP range requests, an interrupted download is resumed from the ".part" file, and the file can be downloaded by several connections at the same time.
+    A HEAD request gives the file name, the size and whether ranges are supported.
+
+    Example::
+
+        >>> DownloadFile(URL, "./download", ProgressCallback = lambda Downloaded, Total: print(Downloaded, "/", Total, end = "\r"))
 
     :param String URL: URL of the file you want to download.
     :param String Destination: Path of the file you want to store, it can be a.
-    :param String Format: The format of the compressed file.
+    :param Int ExpectedBytes: Expected size of the file. Use None to skip the size check.
+    :param Boolean IsDestinationFolder: Whether Destination is a folder. Use None to indicate it from whether Destination has an extension.
+    :param String Checksum: Expected hex representation of file hash, which is calculated while the file is being written. Use None to skip the checksum check.
+    :param HashFactory: Algorithm of hash calculation for Checksum. By default, it's MD5.
+    :param Int Connections: Number of connections to download different ranges of the file at the same time. A ".part" file left by a single connection is resumed with a single connection.
+    :param Boolean Resume: Whether to resume from an existing ".part" file.
+    :param Int BlockSize: Size of each range in bytes when downloading with more than one connection. Progress is recorded per range, so at most Connections ranges are downloaded again after an interruption.
+    :param Function ProgressCallback: A function called with (DownloadedBytes, TotalBytes) whenever data is written, e.g. to show a progress bar. TotalBytes is None if the server does not tell the size.
+    :return: FileName: Path of the downloaded file
+    :rtype: String
     """
     if IsDestinationFolder is None: #Try to indicate from Destination
         if os.path.basename(Destination).find(".") >= 0:
@@ -325,26 +1227,160 @@ def DownloadFile(URL, Destination = "./download", ExpectedBytes = None, IsDestin
         else:
             os.makedirs(Destination)
 
+    FileHash = None
     Request = urllib.request.Request(URL, method = "HEAD")
-    Headers = dict(urllib.request.urlopen(Request).info().items())
+    with urllib.request.urlopen(Request) as Response:
+        Headers = Response.info()
     if IsDestinationFolder:
-        FilePath = os.path.join(Destination, wget.detect_filename(URL, '', Headers))
+        FilePath = os.path.join(Destination, wget.detect_filename(URL, '', dict(Headers.items())))
     else:
-        FilePath = wget.detect_filename(URL, Destination, Headers)
-
+        FilePath = wget.detect_filename(URL, Destination, dict(Headers.items()))
     if not os.path.exists(FilePath):
-        FileName = wget.download(URL, Destination)
-    else:
-        FileName = FilePath
+        FileHash = _DownloadToFile(URL, FilePath, Headers, HashFactory if Checksum is not None else None, Connections, Resume, BlockSize, ProgressCallback)
+    FileName = FilePath
     StatInfo = os.stat(FileName)
     if ExpectedBytes is None or StatInfo.st_size == ExpectedBytes:
-        print('Found and verified', FileName)
+        pass
     else:
         print(StatInfo.st_size)
         raise FileExistsError(
             'Failed to verify ' + FileName + '. File exists or corrupted. Can you get to it with a browser?')
+    if Checksum is not None:
+        if FileHash is None:
+            FileHash = GetFileHash(FileName, HashFactory)
+        if FileHash.lower() != Checksum.lower():
+            print(FileHash)
+            raise FileExistsError(
+                'Failed to verify checksum of ' + FileName + '. File exists or corrupted. Can you get to it with a browser?')
+    print('Found and verified', FileName)
     return FileName
 
+def _GetDownloadSize(Headers):
+    '''
+    Get the size of the file from the headers of a HEAD request, and whether the server supports range requests.
+
+    :return: (TotalBytes, AcceptRanges), where TotalBytes is None if the size is unknown
+    :rtype: Tuple[Int, Boolean]
+    '''
+    TotalBytes = Headers.get("Content-Length", "").strip()
+    TotalBytes = int(TotalBytes) if TotalBytes.isdigit() else None
+    return TotalBytes, TotalBytes is not None and Headers.get("Accept-Ranges", "").strip().lower() == "bytes"
+
+def _DownloadToFile(URL, FilePath, Headers, HashFactory, Connections, Resume, BlockSize, ProgressCallback):
+    '''
+    Download URL into FilePath + ".part" and rename it to FilePath when finished. Headers are the headers of a HEAD request of URL.
+
+    :return: FileHash: Hex representation of file hash, or None if HashFactory is None
+    :rtype: String
+    '''
+    TotalBytes, AcceptRanges = _GetDownloadSize(Headers)
+    PartPath = FilePath + ".part"
+    ProgressPath = PartPath + ".json"
+    if not Resume or not AcceptRanges:
+        for Path in [PartPath, ProgressPath]:
+            if os.path.exists(Path):
+                os.remove(Path)
+    #A download by ranges can only be resumed by ranges, and a ".part" file without progress of ranges can only be resumed as a stream
+    if AcceptRanges and (os.path.exists(ProgressPath) or (Connections > 1 and not os.path.exists(PartPath))):
+        FileHash = _DownloadBlocks(URL, PartPath, ProgressPath, TotalBytes, HashFactory, Connections, BlockSize, ProgressCallback)
+    else:
+        FileHash = _DownloadStream(URL, PartPath, TotalBytes, HashFactory, ProgressCallback)
+    os.replace(PartPath, FilePath)
+    return FileHash
+
+def _DownloadStream(URL, PartPath, TotalBytes, HashFactory, ProgressCallback):
+    '''
+    Download URL with a single connection, appending to an existing PartPath with a range request if it exists.
+    '''
+    h = HashFactory() if HashFactory is not None else None
+    Offset = os.path.getsize(PartPath) if os.path.exists(PartPath) else 0
+    if TotalBytes is not None and Offset > TotalBytes:
+        Offset = 0
+    if Offset > 0 and h is not None: #Hash the part downloaded before
+        with open(PartPath, "rb") as f:
+            for Chunk in iter(lambda: f.read(2 ** 20), b""):
+                h.update(Chunk)
+    with open(PartPath, "r+b" if Offset > 0 else "wb") as f:
+        if TotalBytes is None or Offset < TotalBytes:
+            Request = urllib.request.Request(URL, headers = {"Range": "bytes=%d-" % Offset} if Offset > 0 else {})
+            with urllib.request.urlopen(Request) as Response:
+                if Offset > 0 and Response.status != 206: #Server ignored the range, so start over
+                    Offset = 0
+                    h = HashFactory() if HashFactory is not None else None
+                f.seek(Offset)
+                f.truncate()
+                for Chunk in iter(lambda: Response.read(2 ** 20), b""):
+                    f.write(Chunk)
+                    if h is not None:
+                        h.update(Chunk)
+                    Offset += len(Chunk)
+                    if ProgressCallback is not None:
+                        ProgressCallback(Offset, TotalBytes)
+    return h.hexdigest() if h is not None else None
+
+def _DownloadBlocks(URL, PartPath, ProgressPath, TotalBytes, HashFactory, Connections, BlockSize, ProgressCallback):
+    '''
+    Download URL by ranges of BlockSize bytes on Connections threads. Ranges are written and hashed in order in the calling thread, and the finished ranges are recorded in ProgressPath for resuming.
+    '''
+    NumBlocks = (TotalBytes + BlockSize - 1) // BlockSize
+    Finished = set()
+    if os.path.exists(PartPath) and os.path.exists(ProgressPath):
+        with open(ProgressPath, "r", encoding = "utf8") as f:
+            Progress = json.load(f)
+        if Progress["TotalBytes"] == TotalBytes and Progress["BlockSize"] == BlockSize:
+            Finished = set(Progress["Finished"])
+    h = HashFactory() if HashFactory is not None else None
+
+    def Fetch(Index):
+        Start = Index * BlockSize
+        End = min(Start + BlockSize, TotalBytes) - 1
+        Request = urllib.request.Request(URL, headers = {"Range": "bytes=%d-%d" % (Start, End)})
+        with urllib.request.urlopen(Request) as Response:
+            Data = Response.read()
+        if Response.status != 206:
+            raise IOError("Range request of " + URL + " failed.")
+        if len(Data) != End - Start + 1:
+            raise IOError("Range request of " + URL + " failed.")
+        return Data
+
+    Downloaded = sum(min(BlockSize, TotalBytes - Index * BlockSize) for Index in Finished)
+    with open(PartPath, "r+b" if Finished else "wb") as f, concurrent.futures.ThreadPoolExecutor(max_workers = Connections) as Executor:
+        f.truncate(TotalBytes)
+
+        def Write(Index, Future):
+            nonlocal Downloaded
+            f.seek(Index * BlockSize)
+            if Future is None: #Finished before, only need to hash it
+                if h is not None:
+                    h.update(f.read(min(BlockSize, TotalBytes - Index * BlockSize)))
+                return
+            Data = Future.result()
+            f.write(Data)
+            if h is not None:
+                h.update(Data)
+            f.flush()
+            Finished.add(Index)
+            with open(ProgressPath, "w", encoding = "utf8") as Progress:
+                json.dump({"TotalBytes": TotalBytes, "BlockSize": BlockSize, "Finished": sorted(Finished)}, Progress)
+            Downloaded += len(Data)
+            if ProgressCallback is not None:
+                ProgressCallback(Downloaded, TotalBytes)
+
+        Pending = collections.deque()
+        try:
+            for Index in range(NumBlocks):
+                Pending.append((Index, None if Index in Finished else Executor.submit(Fetch, Index)))
+                while len(Pending) > 2 * Connections or (Pending and Pending[0][1] is None):
+                    Write(*Pending.popleft())
+            while Pending:
+                Write(*Pending.popleft())
+        finally:
+            for Index, Future in Pending:
+                if Future is not None:
+                    Future.cancel()
+    if os.path.exists(ProgressPath):
+        os.remove(ProgressPath)
+    return h.hexdigest() if h is not None else None
 
 def GetFileHash(FilePath, HashFactory=hashlib.md5, ChunkNumBlocks=128):
     '''
@@ -361,6 +1397,138 @@ def GetFileHash(FilePath, HashFactory=hashlib.md5, ChunkNumBlocks=128):
             h.update(chunk)
     return h.hexdigest()
 
+def GetFilesHashes(FilePaths, HashFactory = hashlib.md5, Workers = None, CachePath = None, MmapThreshold = 2 ** 20):
+    '''
+    Calculate file hashes of many files on a thread pool. Files larger than MmapThreshold are hashed through mmap, others are read at once.
+    If CachePath is given, hashes are memoized in that pickle file by (path, size, modification time, inode), so files not changed since last run are never read again.
+
+    Example::
+
+        >>> Hashes = GetFilesHashes(ListFiles("./data", ".", All = True), Workers = 16, CachePath = "./data_hashes.pkl")
+
+    :param List FilePaths: Paths of the files you want to calculate file hashes.
+    :param HashFactory: Algorithm of hash calculation. By default, it's MD5.
+    :param Int Workers: Number of threads. Use None for the default number of concurrent.futures.ThreadPoolExecutor.
+    :param String CachePath: Path of the pickle file to memoize hashes. Use None to disable the cache.
+    :param Int MmapThreshold: Files larger than this number of bytes are hashed through mmap.
+    :return: Hashes: A dict of file path -> hex representation of file hash
+    :rtype: Dict[String, String]
+    '''
+    FilePaths = list(FilePaths)
+    HashName = HashFactory().name
+    Cache = {} #(Absolute path, Name of hash algorithm) -> ((Size, Modification time, Inode), Hash)
+    if CachePath is not None and os.path.isfile(CachePath):
+        Cache = ImportFromPkl(CachePath)
+
+    def Hash(FilePath):
+        Key = (os.path.abspath(FilePath), HashName)
+        StatInfo = os.stat(FilePath)
+        Stamp = (StatInfo.st_size, StatInfo.st_mtime_ns, StatInfo.st_ino)
+        Cached = Cache.get(Key)
+        if Cached is not None and Cached[0] == Stamp:
+            return Key, None, Cached[1]
+        if time.time_ns() - StatInfo.st_mtime_ns < DirectoryIndex.RecentNanoseconds:
+            Stamp = None #File may still be changed in the same timestamp tick, so do not memoize it
+        return Key, Stamp, _HashFile(FilePath, HashFactory, MmapThreshold)
+
+    Hashes = {}
+    Changed = False
+    with concurrent.futures.ThreadPoolExecutor(max_workers = Workers) as Executor:
+        for FilePath, (Key, Stamp, FileHash) in zip(FilePaths, Executor.map(Hash, FilePaths)):
+            Hashes[FilePath] = FileHash
+            if Stamp is not None:
+                Cache[Key] = (Stamp, FileHash)
+                Changed = True
+    if CachePath is not None and Changed:
+        _ExportToPklAtomically(CachePath, Cache)
+    return Hashes
+
+def FindDuplicateFiles(Paths, HashFactory = hashlib.md5, Workers = None, CachePath = None, BlockSize = 2 ** 16, HardLink = False):
+    '''
+    Find files with the same content. Files are grouped by size first, then by a hash of their first and last blocks, and only files still colliding are hashed in full with GetFilesHashes.
+    Empty files are ignored, and paths of the same file (e.g. already hard linked) are only counted once.
+
+    Example::
+
+        >>> FindDuplicateFiles(["./download", "./data/1.zip"])
+        [['/home/user/data/1.zip', '/home/user/download/1 (copy).zip']]
+
+    :param String/Iterable Paths: Path/Paths of files and/or directories. All files under directories (including sub-directories) are checked.
+    :param HashFactory: Algorithm of hash calculation. By default, it's MD5.
+    :param Int Workers: Number of threads. Use None for the default number of concurrent.futures.ThreadPoolExecutor.
+    :param String CachePath: Path of the pickle file to memoize full hashes, see GetFilesHashes. Use None to disable the cache.
+    :param Int BlockSize: Number of bytes read from the beginning and the end of a file for the partial hash.
+    :param Boolean HardLink: Whether to replace the duplicates in each group with hard links to the first file of the group. Files on different devices are not linked.
+    :return: Duplicates: The list of groups of paths with the same content. Each group is sorted.
+    :rtype: List[List[String]]
+    '''
+    if isinstance(Paths, (str, os.PathLike)):
+        Paths = [Paths]
+    FilesBySize = {}
+    StatInfos = {}
+    SeenFiles = set()
+    for Path in Paths:
+        FilePaths = IterFiles(Path, ".", All = True) if os.path.isdir(Path) else [os.path.abspath(Path)]
+        for FilePath in FilePaths:
+            StatInfo = os.stat(FilePath)
+            if StatInfo.st_size == 0 or (StatInfo.st_dev, StatInfo.st_ino) in SeenFiles:
+                continue
+            SeenFiles.add((StatInfo.st_dev, StatInfo.st_ino))
+            StatInfos[FilePath] = StatInfo
+            FilesBySize.setdefault(StatInfo.st_size, []).append(FilePath)
+    Candidates = [FilePath for Group in FilesBySize.values() if len(Group) > 1 for FilePath in Group]
+
+    def PartialHash(FilePath):
+        h = HashFactory()
+        with open(FilePath, 'rb') as f:
+            h.update(f.read(BlockSize))
+            if StatInfos[FilePath].st_size > BlockSize:
+                f.seek(max(BlockSize, StatInfos[FilePath].st_size - BlockSize))
+                h.update(f.read(BlockSize))
+        return h.hexdigest()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers = Workers) as Executor:
+        PartialHashes = dict(zip(Candidates, Executor.map(PartialHash, Candidates)))
+    FilesByPartialHash = {}
+    for FilePath in Candidates:
+        FilesByPartialHash.setdefault((StatInfos[FilePath].st_size, PartialHashes[FilePath]), []).append(FilePath)
+
+    FilesByHash = {}
+    Colliding = []
+    for (Size, FileHash), Group in FilesByPartialHash.items():
+        if len(Group) < 2:
+            continue
+        if Size <= 2 * BlockSize: #The partial hash already covers the whole file
+            FilesByHash[(Size, FileHash)] = Group
+        else:
+            Colliding.extend(Group)
+    for FilePath, FileHash in GetFilesHashes(Colliding, HashFactory, Workers, CachePath).items():
+        FilesByHash.setdefault((StatInfos[FilePath].st_size, FileHash), []).append(FilePath)
+    Duplicates = sorted(sorted(Group) for Group in FilesByHash.values() if len(Group) > 1)
+
+    if HardLink:
+        for Group in Duplicates:
+            for FilePath in Group[1:]:
+                if StatInfos[FilePath].st_dev != StatInfos[Group[0]].st_dev:
+                    continue
+                TempPath = "%s.%d.tmp" % (FilePath, os.getpid())
+                os.link(Group[0], TempPath)
+                os.replace(TempPath, FilePath)
+    return Duplicates
+
+def _HashFile(FilePath, HashFactory, MmapThreshold):
+    '''
+    Calculate the file hash with a single update call. hashlib releases the GIL while hashing large data, so this runs in parallel on threads.
+    '''
+    h = HashFactory()
+    with open(FilePath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size > MmapThreshold:
+            with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as Map:
+                h.update(Map)
+        else:
+            h.update(f.read())
+    return h.hexdigest()
+
 
 if DependencyFlag:
     def ExportToJsonNodeLinkData(Path,GraphContent):
@@ -370,7 +1538,7 @@ if DependencyFlag:
         :param String Path: Path to store the json file
         :param nxGraph GraphContent: some graph you want to export
         '''    
-        with open(Path,"wb") as f:
+        with open(Path, "w", encoding = "utf-8") as f:
             Content=json_graph.node_link_data(GraphContent)
             json.dump(Content, f, indent=4)
 
@@ -399,50 +1567,630 @@ if DependencyFlag:
 
             return GraphContent
 
+    _GraphMagic = b"\x93CMGRF\x01\x00" #Magic string and format version of compact graph files
+
+    class CompactGraph(object):
+        '''
+        A graph stored as arrays: nodes relabelled to integer ids 0..N-1, a CSR adjacency of the neighbours of each node (in both directions for undirected graphs), typed edge weights and optional node and edge attribute columns.
+        It can be converted to a scipy sparse adjacency matrix without building Python objects per edge, or back to a networkx graph.
+
+        Example::
+
+            >>> ExportToCompactGraph("./graph.cmg", GraphContent, EdgeAttributes = ["timestamp"])
+            >>> Graph = ImportFromCompactGraph("./graph.cmg")
+            >>> Adjacency = Graph.ToSparseMatrix()
+            >>> GraphContent = Graph.ToNetworkx()
+
+        :param list Nodes: Labels of the nodes in the order of ids.
+        :param numpy.array Indptr: Row pointers of the CSR adjacency with N + 1 elements.
+        :param numpy.array Indices: Ids of the neighbours, sorted for each node.
+        :param numpy.array Weights: Edge weights in the order of Indices. Use None for unweighted graphs.
+        :param dict NodeAttributes: Attribute name to numpy.array in the order of ids.
+        :param dict EdgeAttributes: Attribute name to numpy.array in the order of Indices.
+        :param bool Directed: Whether the graph is directed.
+        :param bool Multigraph: Whether the graph can have parallel edges.
+        :param String Weight: Name of the edge attribute for Weights in networkx.
+        '''
+        def __init__(self, Nodes, Indptr, Indices, Weights = None, NodeAttributes = None, EdgeAttributes = None, Directed = False, Multigraph = False, Weight = "weight"):
+            self.Nodes = Nodes
+            self.Indptr = Indptr
+            self.Indices = Indices
+            self.Weights = Weights
+            self.NodeAttributes = NodeAttributes or {}
+            self.EdgeAttributes = EdgeAttributes or {}
+            self.Directed = Directed
+            self.Multigraph = Multigraph
+            self.Weight = Weight
+
+        @staticmethod
+        def FromNetworkx(GraphContent, Weight = "weight", NodeAttributes = (), EdgeAttributes = ()):
+            '''
+            Convert a networkx graph. Nodes are numbered in the order of GraphContent.nodes.
+
+            :param nxGraph GraphContent: The graph to be converted.
+            :param String Weight: Name of the edge attribute stored as Weights. Edges without it have weight 1. Use None to ignore weights.
+            :param list NodeAttributes: Names of node attributes to be kept. Each node must have them as numbers or strings.
+            :param list EdgeAttributes: Names of edge attributes to be kept. Each edge must have them as numbers or strings.
+            :return: Graph: The converted graph
+            :rtype: CompactGraph
+            '''
+            Nodes = list(GraphContent)
+            Ids = {Node: Id for Id, Node in enumerate(Nodes)}
+            Names = ([] if Weight is None else [Weight]) + list(EdgeAttributes)
+            Sources, Targets, Columns = [], [], [[] for Name in Names]
+            for Source, Target, Data in GraphContent.edges(data = True):
+                Sources.append(Ids[Source])
+                Targets.append(Ids[Target])
+                for Name, Column in zip(Names, Columns):
+                    Column.append(Data.get(Name, 1 if Name == Weight else None))
+            Sources = np.array(Sources, dtype = np.int64)
+            Targets = np.array(Targets, dtype = np.int64)
+            Columns = [_AttributeColumn(Name, Column) for Name, Column in zip(Names, Columns)]
+            if not GraphContent.is_directed(): #Store the reverse of each edge except self loops
+                Reverse = Sources != Targets
+                Sources, Targets = np.concatenate([Sources, Targets[Reverse]]), np.concatenate([Targets, Sources[Reverse]])
+                Columns = [np.concatenate([Column, Column[Reverse]]) for Column in Columns]
+            Order = np.lexsort((Targets, Sources))
+            IndexType = np.int32 if max(len(Order), len(Nodes)) < 2 ** 31 else np.int64
+            Indptr = np.zeros(len(Nodes) + 1, dtype = IndexType)
+            np.cumsum(np.bincount(Sources, minlength = len(Nodes)), out = Indptr[1:])
+            Columns = [Column[Order] for Column in Columns]
+            return CompactGraph(Nodes, Indptr, Targets[Order].astype(IndexType),
+                                Weights = None if Weight is None else Columns.pop(0),
+                                NodeAttributes = {Name: _AttributeColumn(Name, [GraphContent.nodes[Node].get(Name) for Node in Nodes]) for Name in NodeAttributes},
+                                EdgeAttributes = dict(zip(EdgeAttributes, Columns)),
+                                Directed = GraphContent.is_directed(), Multigraph = GraphContent.is_multigraph(), Weight = Weight or "weight")
+
+        def ToSparseMatrix(self):
+            '''
+            Get the adjacency matrix on the arrays of the graph without copying them. Parallel edges are summed, in a copy.
+
+            :return: SparseMatrix: N x N adjacency matrix with the weights, or ones for unweighted graphs
+            :rtype: scipy csr_matrix
+            '''
+            Data = self.Weights if self.Weights is not None else np.ones(len(self.Indices))
+            SparseMatrix = _CsrMatrixFromArrays((len(self.Nodes), len(self.Nodes)), self.Indptr, self.Indices, Data, HasSortedIndices = True)
+            if self.Multigraph: #sum_duplicates works in place
+                SparseMatrix = SparseMatrix.copy()
+                SparseMatrix.sum_duplicates()
+            return SparseMatrix
+
+        def ToNetworkx(self):
+            '''
+            Convert to a networkx graph with the original node labels and the kept attributes.
+
+            :return: GraphContent: The converted graph
+            :rtype: nxGraph
+            '''
+            GraphContent = {(False, False): nx.Graph, (True, False): nx.DiGraph, (False, True): nx.MultiGraph, (True, True): nx.MultiDiGraph}[(self.Directed, self.Multigraph)]()
+            Nodes = self.Nodes.tolist() if isinstance(self.Nodes, np.ndarray) else list(self.Nodes)
+            if self.NodeAttributes:
+                Names = list(self.NodeAttributes)
+                GraphContent.add_nodes_from(zip(Nodes, [dict(zip(Names, Values)) for Values in zip(*[self.NodeAttributes[Name].tolist() for Name in Names])]))
+            else:
+                GraphContent.add_nodes_from(Nodes)
+            Sources = np.repeat(np.arange(len(Nodes)), np.diff(self.Indptr))
+            Targets = np.asarray(self.Indices)
+            Keep = slice(None) if self.Directed else Sources <= Targets #Each undirected edge once
+            Names = ([] if self.Weights is None else [self.Weight]) + list(self.EdgeAttributes)
+            Columns = ([] if self.Weights is None else [self.Weights]) + list(self.EdgeAttributes.values())
+            Edges = [[Nodes[Source] for Source in Sources[Keep].tolist()], [Nodes[Target] for Target in Targets[Keep].tolist()]]
+            if Names:
+                Edges.append([dict(zip(Names, Values)) for Values in zip(*[Column[Keep].tolist() for Column in Columns])])
+            GraphContent.add_edges_from(zip(*Edges))
+            return GraphContent
+
+    def _AttributeColumn(Name, Values):
+        '''
+        Convert attribute values to a typed numpy array. Raise ValueError if they are not all numbers or all strings.
+        '''
+        Column = np.asarray(Values)
+        if Column.dtype == object or Column.ndim != 1:
+            raise ValueError(Name, "Attribute values must be numbers or strings!")
+        return Column
+
+    def ExportToCompactGraph(Path, GraphContent, Weight = "weight", NodeAttributes = (), EdgeAttributes = ()):
+        '''
+        Export a graph to a compact binary file, which stores the arrays of CompactGraph and can be memory-mapped by ImportFromCompactGraph.
+        Node labels are stored as an integer array if they are all integers, or pickled otherwise.
+
+        :param String Path: The stored file location.
+        :param nxGraph/CompactGraph GraphContent: The graph you want to store.
+        :param String Weight: For networkx graphs, name of the edge attribute stored as weights. Use None to ignore weights.
+        :param list NodeAttributes: For networkx graphs, names of node attributes to be stored.
+        :param list EdgeAttributes: For networkx graphs, names of edge attributes to be stored.
+        '''
+        if not isinstance(GraphContent, CompactGraph):
+            GraphContent = CompactGraph.FromNetworkx(GraphContent, Weight, NodeAttributes, EdgeAttributes)
+        Arrays = collections.OrderedDict([("indptr", GraphContent.Indptr), ("indices", GraphContent.Indices)])
+        Nodes = GraphContent.Nodes
+        if isinstance(Nodes, np.ndarray) or all(type(Node) is int for Node in Nodes):
+            Arrays["nodes"] = np.asarray(Nodes, dtype = np.int64)
+            NodeFormat = "int"
+        else:
+            Arrays["nodes"] = np.frombuffer(pickle.dumps(list(Nodes), protocol = pickle.HIGHEST_PROTOCOL), dtype = np.uint8)
+            NodeFormat = "pickle"
+        if GraphContent.Weights is not None:
+            Arrays["weights"] = GraphContent.Weights
+        for Name, Column in GraphContent.NodeAttributes.items():
+            Arrays["node:" + Name] = Column
+        for Name, Column in GraphContent.EdgeAttributes.items():
+            Arrays["edge:" + Name] = Column
+        Header = {"directed": GraphContent.Directed, "multigraph": GraphContent.Multigraph, "weight": GraphContent.Weight, "nodes": NodeFormat,
+                  "node_attributes": list(GraphContent.NodeAttributes), "edge_attributes": list(GraphContent.EdgeAttributes)}
+        _ExportArrays(Path, _GraphMagic, Header, Arrays)
+
+    def ImportFromCompactGraph(Path, MmapMode = "c"):
+        '''
+        Import a graph from a file written by ExportToCompactGraph.
+
+        :param String Path: The stored file location.
+        :param String MmapMode: Memory-map the arrays with mode "r", "r+" or "c" (copy-on-write) as in np.memmap. Use None to read them into memory.
+        :return: Graph: Graph in the file. Use Graph.ToNetworkx() or Graph.ToSparseMatrix() to convert it.
+        :rtype: CompactGraph
+        '''
+        Header, Arrays = _ImportArrays(Path, _GraphMagic, MmapMode)
+        if Header["nodes"] == "int":
+            Nodes = np.asarray(Arrays["nodes"])
+        else:
+            Nodes = pickle.loads(Arrays["nodes"].tobytes())
+        return CompactGraph(Nodes, Arrays["indptr"], Arrays["indices"], Weights = Arrays.get("weights"),
+                            NodeAttributes = {Name: Arrays["node:" + Name] for Name in Header["node_attributes"]},
+                            EdgeAttributes = {Name: Arrays["edge:" + Name] for Name in Header["edge_attributes"]},
+                            Directed = Header["directed"], Multigraph = Header["multigraph"], Weight = Header["weight"])
+
     def ExportNpArray(Path, NpArray, Format = "%f"):
         '''
         Export a Numpy array to a file.
+        The format is selected by the extension of Path: .npy for numpy binary format (can be memory-mapped by ImportNpArray), .npz for compressed numpy format, and text for others.
     
         :param String Path: The stored file location.
         :param numpy.array NpArray: The Numpy array you want to store.
-        :param String Format: How to print each element, e.g. %i, %10.5f
+        :param String Format: How to print each element in text format, e.g. %i, %10.5f
         '''
+        Extension = os.path.splitext(Path)[1].lower()
+        if Extension == ".npy":
+            np.save(Path, NpArray)
+        elif Extension == ".npz":
+            np.savez_compressed(Path, NpArray)
+        else:
+            np.savetxt(Path, NpArray, fmt = Format)
 
-        np.savetxt(Path, NpArray, fmt = Format)
-
-    def ImportNpArray(Path, DataType, ndmin = 0):
+    def ImportNpArray(Path, DataType = None, ndmin = 0, MmapMode = None):
         '''
         Import a Numpy array from a file.
+        The format is selected by the extension of Path as in ExportNpArray. Text files are parsed by np.loadtxt, which is implemented in C since numpy 1.23.
     
         :param String Path: The stored file location.
-        :param data-type DataType: How to match each element, e.g. int, float
+        :param data-type DataType: How to match each element, e.g. int, float. Use None to keep the data type of .npy/.npz files, or float for text files.
         :param int ndmin: How many dimensions of array at least you will have.
+        :param String MmapMode: Memory-map a .npy file instead of reading it, with mode "r", "r+" or "c" (copy-on-write) as in np.load. Use None to read it into memory.
         :return: NpArray: NpArray in the file
         :rtype: NpArray
         '''
-        NpArray = np.loadtxt(Path, dtype = DataType, ndmin = ndmin)
-        return NpArray
+        Extension = os.path.splitext(Path)[1].lower()
+        if Extension in [".npy", ".npz"]:
+            if Extension == ".npy":
+                NpArray = np.load(Path, mmap_mode = MmapMode)
+            else:
+                with np.load(Path) as Data:
+                    NpArray = Data[Data.files[0]]
+            if DataType is not None and NpArray.dtype != DataType:
+                NpArray = NpArray.astype(DataType)
+            if NpArray.ndim < ndmin:
+                NpArray = NpArray.reshape((1,) * (ndmin - NpArray.ndim) + NpArray.shape)
+            return NpArray
+        return np.loadtxt(Path, dtype = float if DataType is None else DataType, ndmin = ndmin)
+
+    class NpArrayWriter(object):
+        '''
+        Write a Numpy array into a .npy file block by block of rows, e.g. when the rows are produced in batches and the whole array does not fit in memory.
+        The shape in the file header is updated when the writer is closed.
+
+        Example::
+
+            >>> with NpArrayWriter("./features.npy") as Writer:
+            ...     for Batch in Batches:
+            ...         Writer.Append(ComputeFeatures(Batch))
+            >>> Features = ImportNpArray("./features.npy", MmapMode = "r")
+
+        :param String Path: The stored file location.
+        :param data-type DataType: Data type of the array. Use None to use the data type of the first block.
+        '''
+        def __init__(self, Path, DataType = None):
+            self.Path = Path
+            self.DataType = None if DataType is None else np.dtype(DataType)
+            self.RowShape = None
+            self.Rows = 0
+            self.HeaderLength = None
+            self.File = open(Path, "wb")
+
+        def Append(self, NpArray):
+            '''
+            Append rows to the file.
+
+            :param numpy.array NpArray: Rows to be appended. All blocks must have the same shape except the first dimension.
+            '''
+            NpArray = np.asarray(NpArray, dtype = self.DataType)
+            if self.RowShape is None:
+                self.DataType = NpArray.dtype
+                self.RowShape = NpArray.shape[1:]
+                self.HeaderLength = len(_NpyHeader(self.DataType, (2 ** 63 - 1,) + self.RowShape)) #Enough for any number of rows
+                self.File.write(_NpyHeader(self.DataType, (0,) + self.RowShape, self.HeaderLength))
+            elif NpArray.shape[1:] != self.RowShape:
+                raise ValueError(NpArray.shape, "Shape of rows is not " + str(self.RowShape))
+            np.ascontiguousarray(NpArray).tofile(self.File)
+            self.Rows += NpArray.shape[0]
+
+        def Close(self):
+            '''
+            Write the final shape into the header and close the file.
+            '''
+            if self.File.closed:
+                return
+            if self.RowShape is None: #Nothing appended
+                self.File.write(_NpyHeader(self.DataType or np.dtype(float), (0,)))
+            else:
+                self.File.seek(0)
+                self.File.write(_NpyHeader(self.DataType, (self.Rows,) + self.RowShape, self.HeaderLength))
+            self.File.close()
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            self.Close()
+
+    def _NpyHeader(DataType, Shape, Length = None):
+        '''
+        Get the header of a .npy file (format version 1.0), padded with spaces to Length bytes (or to a multiple of 64 bytes by default).
+        '''
+        Header = repr({"descr": np.lib.format.dtype_to_descr(DataType), "fortran_order": False, "shape": tuple(Shape)}).encode("latin1")
+        if Length is None:
+            Length = 10 + len(Header) + 1
+            Length += -Length % 64
+        Header += b" " * (Length - 10 - len(Header) - 1) + b"\n"
+        return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(Header)) + Header
+
+    _CsrMagic = b"\x93CMCSR\x01\x00" #Magic string and format version of binary CSR files
+    _ArrayAlignment = 4096 #Arrays in binary files start at page boundaries so that they can be memory-mapped
 
     def ExportSparseMatrix(Path, SparseMatrix):
         '''
-        Export a scipy sparse matrix to a file using matrix market format.
+        Export a scipy sparse matrix to a file.
+        If the extension of Path is .csr, the matrix is stored in a binary CSR format, i.e., a small header followed by the raw indptr, indices and data arrays, which can be memory-mapped by ImportSparseMatrix without parsing or copying.
+        Otherwise matrix market format is used.
 
         Please refer to http://math.nist.gov/MatrixMarket/formats.html for more information about this format.
     
         :param String Path: The stored file location.
         :param scipy sparse matrix SparseMatrix: The scipy sparse matrix you want to store.
         '''
+        if os.path.splitext(Path)[1].lower() == ".csr":
+            _ExportCsrMatrix(Path, SparseMatrix)
+            return
         with open(Path, "wb+") as File:
             scipy.io.mmwrite(File, SparseMatrix)
 
-    def ImportSparseMatrix(Path):
+    def ImportSparseMatrix(Path, MmapMode = "c", ChunkBytes = 2 ** 24, Workers = 1):
         '''
-        Import a scipy sparse matrix from a file using matrix market format.
+        Import a scipy sparse matrix from a file in binary CSR format or matrix market format. The format is detected from the content of the file.
+        Matrix market files in coordinate format are parsed ChunkBytes of text at a time and assembled into CSR directly, so that the peak memory is close to the size of the result. Use IterSparseMatrixBlocks for matrices larger than memory.
+
+        Example::
+
+            >>> ExportSparseMatrix("./matrix.csr", SparseMatrix)
+            >>> SparseMatrix = ImportSparseMatrix("./matrix.csr", MmapMode = "r")
     
         :param String Path: The stored file location.
+        :param String MmapMode: For binary CSR files, memory-map the arrays with mode "r", "r+" or "c" (copy-on-write) as in np.memmap. Use None to read them into memory.
+        :param int ChunkBytes: For matrix market files, number of bytes of text parsed at a time.
+        :param int Workers: For matrix market files, number of processes parsing the text. Use 1 to parse in the current process.
         :return: SparseMatrix: (converted) scipy csr_matrix in the file
         :rtype: Scipy Sparse Matrix
         '''
-        SparseMatrix = scipy.io.mmread(Path)
-        SparseMatrix = SparseMatrix.tocsr()
-        return SparseMatrix
\ No newline at end of file
+        with open(Path, "rb") as File:
+            Magic = File.read(len(_CsrMagic))
+        if Magic == _CsrMagic:
+            return _ImportCsrMatrix(Path, MmapMode)
+        Header = _ReadMatrixMarketHeader(Path)
+        if Header["Format"] == "coordinate":
+            return _ImportMatrixMarket(Path, Header, ChunkBytes, Workers)
+        SparseMatrix = scipy.io.mmread(Path) #Array format
+        SparseMatrix = scipy.sparse.csr_matrix(SparseMatrix)
+        return SparseMatrix
+
+    def _ExportArrays(Path, Magic, Header, Arrays):
+        '''
+        Write named arrays into a binary file: magic string, header length (uint32), JSON header, then the arrays aligned to _ArrayAlignment bytes so that they can be memory-mapped.
+        The data type, offset and length of each array are added to Header["arrays"].
+        '''
+        Header["arrays"] = {}
+        Offset = 0
+        for Name, Array in Arrays.items():
+            Header["arrays"][Name] = {"dtype": np.lib.format.dtype_to_descr(Array.dtype), "offset": Offset, "length": len(Array)}
+            Offset += Array.nbytes + -Array.nbytes % _ArrayAlignment
+        HeaderBytes = json.dumps(Header).encode("utf-8")
+        Start = len(Magic) + 4 + len(HeaderBytes)
+        Start += -Start % _ArrayAlignment
+        with open(Path, "wb") as File:
+            File.write(Magic + struct.pack("<I", len(HeaderBytes)) + HeaderBytes)
+            for Name, Array in Arrays.items():
+                File.seek(Start + Header["arrays"][Name]["offset"])
+                np.ascontiguousarray(Array).tofile(File)
+            File.truncate(Start + Offset)
+
+    def _ImportArrays(Path, Magic, MmapMode):
+        '''
+        Read the header and the named arrays written by _ExportArrays, memory-mapping the arrays if MmapMode is not None.
+        '''
+        with open(Path, "rb") as File:
+            if File.read(len(Magic)) != Magic:
+                raise ValueError(Path, "Unknown file format!")
+            HeaderLength, = struct.unpack("<I", File.read(4))
+            Header = json.loads(File.read(HeaderLength).decode("utf-8"))
+            Start = len(Magic) + 4 + HeaderLength
+            Start += -Start % _ArrayAlignment
+            Arrays = {}
+            for Name, Array in Header["arrays"].items():
+                DataType = np.lib.format.descr_to_dtype(Array["dtype"])
+                if Array["length"] == 0: #np.memmap can not map empty arrays
+                    Arrays[Name] = np.zeros(0, dtype = DataType)
+                elif MmapMode is None:
+                    File.seek(Start + Array["offset"])
+                    Arrays[Name] = np.fromfile(File, dtype = DataType, count = Array["length"])
+                else:
+                    Arrays[Name] = np.memmap(Path, dtype = DataType, mode = MmapMode, offset = Start + Array["offset"], shape = (Array["length"],))
+        return Header, Arrays
+
+    def _ExportCsrMatrix(Path, SparseMatrix):
+        '''
+        Write a sparse matrix in binary CSR format, i.e., the shape in the header and the indptr, indices and data arrays.
+        '''
+        SparseMatrix = scipy.sparse.csr_matrix(SparseMatrix)
+        #Use the smallest index type so that the indices need no conversion on import
+        IndexType = np.int32 if max(SparseMatrix.nnz, SparseMatrix.shape[1]) < 2 ** 31 else np.int64
+        Arrays = collections.OrderedDict([("indptr", SparseMatrix.indptr.astype(IndexType, copy = False)),
+                                          ("indices", SparseMatrix.indices.astype(IndexType, copy = False)),
+                                          ("data", SparseMatrix.data)])
+        Header = {"shape": list(SparseMatrix.shape), "has_sorted_indices": bool(SparseMatrix.has_sorted_indices)}
+        _ExportArrays(Path, _CsrMagic, Header, Arrays)
+
+    def _ImportCsrMatrix(Path, MmapMode):
+        '''
+        Read a sparse matrix in binary CSR format, memory-mapping the arrays if MmapMode is not None.
+        '''
+        Header, Arrays = _ImportArrays(Path, _CsrMagic, MmapMode)
+        return _CsrMatrixFromArrays(Header["shape"], Arrays["indptr"], Arrays["indices"], Arrays["data"], Header["has_sorted_indices"])
+
+    def _CsrMatrixFromArrays(Shape, Indptr, Indices, Data, HasSortedIndices = False):
+        '''
+        Build a csr_matrix on the given arrays without copying them.
+        '''
+        #Assign the arrays directly because the constructor of csr_matrix may scan or convert them
+        SparseMatrix = scipy.sparse.csr_matrix(tuple(Shape), dtype = Data.dtype)
+        SparseMatrix.indptr = Indptr
+        SparseMatrix.indices = Indices
+        SparseMatrix.data = Data
+        SparseMatrix.has_sorted_indices = HasSortedIndices
+        return SparseMatrix
+
+    _MatrixMarketDataTypes = {"real": "float64", "double": "float64", "integer": "int64", "complex": "complex128", "pattern": "float64"}
+
+    def IterSparseMatrixBlocks(Path, BlockRows = 2 ** 16, ChunkBytes = 2 ** 24, Workers = 1):
+        '''
+        Iterate over a sparse matrix in a file block by block of rows, so that matrices larger than memory can be processed slice by slice.
+        Binary CSR files are memory-mapped and sliced. Matrix market files in coordinate format are parsed ChunkBytes of text at a time, and the entries are partitioned into a temporary file for each block, so that at most one block is kept in memory. Matrix market files in array (dense) format are read as a whole.
+
+        Example::
+
+            >>> for Block in IterSparseMatrixBlocks("./matrix.mtx", BlockRows = 10000, Workers = 4):
+            ...     Results.append(Block.dot(Vector))
+
+        :param String Path: The stored file location.
+        :param int BlockRows: Number of rows in each block. The last block may have fewer rows.
+        :param int ChunkBytes: Number of bytes of text parsed at a time.
+        :param int Workers: Number of processes parsing the text. Use 1 to parse in the current process.
+        :return: Generator of scipy csr_matrix, each containing BlockRows rows of the matrix
+        :rtype: Generator
+        '''
+        with open(Path, "rb") as File:
+            Magic = File.read(len(_CsrMagic))
+        if Magic == _CsrMagic:
+            SparseMatrix = _ImportCsrMatrix(Path, "r")
+        else:
+            Header = _ReadMatrixMarketHeader(Path)
+            if Header["Format"] == "coordinate":
+                for Block in _IterMatrixMarketBlocks(Path, Header, BlockRows, ChunkBytes, Workers):
+                    yield Block
+                return
+            SparseMatrix = scipy.sparse.csr_matrix(scipy.io.mmread(Path))
+        for Start in range(0, SparseMatrix.shape[0], BlockRows):
+            yield SparseMatrix[Start:Start + BlockRows]
+
+    def _ReadMatrixMarketHeader(Path):
+        '''
+        Read the banner and the size line of a matrix market file.
+
+        :return: Header: Format, Field, Symmetry, Shape, Entries and Offset (byte offset of the first entry) of the file
+        :rtype: dict
+        '''
+        with open(Path, "rb") as File:
+            Banner = File.readline().decode("ascii").lower().split()
+            if len(Banner) != 5 or Banner[0] != "%%matrixmarket" or Banner[1] != "matrix":
+                raise ValueError(Path, "Not a matrix market file!")
+            Line = File.readline()
+            while Line.startswith(b"%") or not Line.strip():
+                if not Line:
+                    raise ValueError(Path, "Size line is missing!")
+                Line = File.readline()
+            Size = [int(Number) for Number in Line.split()]
+            return {"Format": Banner[2], "Field": Banner[3], "Symmetry": Banner[4], "Shape": tuple(Size[:2]),
+                    "Entries": Size[2] if len(Size) > 2 else Size[0] * Size[1], "Offset": File.tell()}
+
+    def _MatrixMarketChunks(Path, Offset, ChunkBytes):
+        '''
+        Split the entries of a matrix market file into byte ranges of about ChunkBytes, each ending at a line break.
+        '''
+        Size = os.path.getsize(Path)
+        with open(Path, "rb") as File:
+            Start = Offset
+            while Start < Size:
+                File.seek(min(Start + ChunkBytes - 1, Size))
+                File.readline()
+                End = File.tell()
+                yield Start, End
+                Start = End
+
+    def _ParseMatrixMarketChunk(Path, Start, End, Field, Symmetry):
+        '''
+        Parse the entries in a byte range of a matrix market coordinate file into 0-based row indices, column indices and values, adding the mirrored entries of symmetric matrices.
+        The range is parsed by scipy.io.mmread with a generated header, or by np.loadtxt if it contains comments or blank lines.
+
+        :return: (Rows, Columns, Values, Entries), where Entries is the number of entries in the range before mirroring
+        '''
+        with open(Path, "rb") as File:
+            File.seek(Start)
+            Text = File.read(End - Start)
+        Lines = Text.count(b"\n") + (not Text.endswith(b"\n"))
+        try:
+            Header = "%%%%MatrixMarket matrix coordinate %s general\n%d %d %d\n" % (Field, 2 ** 31 - 1, 2 ** 31 - 1, Lines)
+            Entries = scipy.io.mmread(io.BytesIO(Header.encode("ascii") + Text))
+            Rows, Columns, Values = Entries.row.astype(np.int64), Entries.col.astype(np.int64), Entries.data
+        except ValueError:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore") #np.loadtxt warns about ranges with only comments or blank lines
+                Numbers = np.loadtxt(Text.decode("ascii").splitlines(), dtype = np.int64 if Field in ["integer", "pattern"] else np.float64, comments = "%", ndmin = 2)
+            if Numbers.size == 0:
+                Numbers = Numbers.reshape(0, 4)
+            Rows = Numbers[:, 0].astype(np.int64) - 1
+            Columns = Numbers[:, 1].astype(np.int64) - 1
+            if Field == "pattern":
+                Values = np.ones(len(Rows))
+            elif Field == "complex":
+                Values = Numbers[:, 2] + 1j * Numbers[:, 3]
+            else:
+                Values = Numbers[:, 2]
+        Entries = len(Rows)
+        if Symmetry != "general":
+            Mirror = Rows != Columns
+            MirroredValues = Values[Mirror]
+            if Symmetry == "skew-symmetric":
+                MirroredValues = -MirroredValues
+            elif Symmetry == "hermitian":
+                MirroredValues = MirroredValues.conj()
+            Rows, Columns, Values = np.concatenate([Rows, Columns[Mirror]]), np.concatenate([Columns, Rows[Mirror]]), np.concatenate([Values, MirroredValues])
+        return Rows, Columns, Values, Entries
+
+    def _IterMatrixMarketEntries(Path, Header, ChunkBytes, Workers):
+        '''
+        Parse the entries of a matrix market coordinate file chunk by chunk in order, on a process pool if Workers > 1. At most 2 * Workers parsed chunks are waiting at any time.
+        The number of entries is checked against the size line chunk by chunk, so a chunk is never yielded once the file has more entries than its header tells.
+        '''
+        Count = 0
+        for RowIndices, ColumnIndices, Values, Entries in _ParseMatrixMarketChunks(Path, Header, ChunkBytes, Workers):
+            Count += Entries
+            if Count > Header["Entries"]:
+                raise ValueError(Path, "File has more entries than the %d in its size line!" % Header["Entries"])
+            yield RowIndices, ColumnIndices, Values
+        if Count < Header["Entries"]:
+            raise ValueError(Path, "File has %d entries instead of the %d in its size line!" % (Count, Header["Entries"]))
+
+    def _ParseMatrixMarketChunks(Path, Header, ChunkBytes, Workers):
+        '''
+        Parse the chunks of a matrix market coordinate file in order by _ParseMatrixMarketChunk.
+        '''
+        Chunks = _MatrixMarketChunks(Path, Header["Offset"], ChunkBytes)
+        if Workers == 1:
+            for Start, End in Chunks:
+                yield _ParseMatrixMarketChunk(Path, Start, End, Header["Field"], Header["Symmetry"])
+            return
+        with concurrent.futures.ProcessPoolExecutor(max_workers = Workers) as Executor:
+            Pending = collections.deque()
+            for Start, End in Chunks:
+                Pending.append(Executor.submit(_ParseMatrixMarketChunk, Path, Start, End, Header["Field"], Header["Symmetry"]))
+                if len(Pending) > 2 * Workers:
+                    yield Pending.popleft().result()
+            while Pending:
+                yield Pending.popleft().result()
+
+    def _IterMatrixMarketBlocks(Path, Header, BlockRows, ChunkBytes, Workers):
+        '''
+        Parse a matrix market coordinate file once, partitioning the entries into a temporary file for each block of BlockRows rows, then read the blocks back one by one as csr_matrix.
+        '''
+        Rows, Columns = Header["Shape"]
+        Blocks = -(-Rows // BlockRows)
+        IndexType = np.int32 if max(BlockRows, Columns) < 2 ** 31 else np.int64
+        Record = np.dtype([("Row", IndexType), ("Column", IndexType), ("Value", _MatrixMarketDataTypes[Header["Field"]])])
+        with tempfile.TemporaryDirectory() as Directory:
+            for RowIndices, ColumnIndices, Values in _IterMatrixMarketEntries(Path, Header, ChunkBytes, Workers):
+                Order = np.argsort(RowIndices // BlockRows, kind = "stable")
+                Entries = np.empty(len(Order), dtype = Record)
+                Entries["Row"] = RowIndices[Order]
+                Entries["Column"] = ColumnIndices[Order]
+                Entries["Value"] = Values[Order]
+                BlockIndices = Entries["Row"] // BlockRows
+                Entries["Row"] %= BlockRows
+                Boundaries = np.flatnonzero(np.diff(BlockIndices)) + 1
+                for Start, End in zip(np.concatenate([[0], Boundaries]), np.concatenate([Boundaries, [len(Entries)]])):
+                    if Start < End:
+                        with open(os.path.join(Directory, str(BlockIndices[Start])), "ab") as File:
+                            Entries[Start:End].tofile(File)
+            for Block in range(Blocks):
+                BlockPath = os.path.join(Directory, str(Block))
+                if os.path.exists(BlockPath):
+                    Entries = np.fromfile(BlockPath, dtype = Record)
+                    os.remove(BlockPath)
+                else:
+                    Entries = np.zeros(0, dtype = Record)
+                Shape = (min(BlockRows, Rows - Block * BlockRows), Columns)
+                yield scipy.sparse.coo_matrix((Entries["Value"], (Entries["Row"], Entries["Column"])), shape = Shape).tocsr()
+
+    def _ImportMatrixMarket(Path, Header, ChunkBytes, Workers):
+        '''
+        Read a matrix market coordinate file into a csr_matrix, using about as much memory as the result.
+        If the entries are sorted by row, e.g. written from a CSR matrix, they are copied into the CSR arrays while parsing. Otherwise the matrix is assembled from the blocks of _IterMatrixMarketBlocks.
+        '''
+        Rows, Columns = Header["Shape"]
+        General = Header["Symmetry"] == "general"
+        Entries = Header["Entries"] if General else 2 * Header["Entries"] #Upper bound of the number of stored entries
+        IndexType = np.int32 if max(Entries, Columns) < 2 ** 31 else np.int64
+        Indptr = np.zeros(Rows + 1, dtype = IndexType)
+        Indices = np.empty(Entries, dtype = IndexType)
+        Data = np.empty(Entries, dtype = _MatrixMarketDataTypes[Header["Field"]])
+        Filled = 0
+        Sorted = General
+        if General:
+            LastRow = 0
+            Chunks = _IterMatrixMarketEntries(Path, Header, ChunkBytes, Workers)
+            for RowIndices, ColumnIndices, Values in Chunks:
+                if len(RowIndices) == 0:
+                    continue
+                if RowIndices[0] < LastRow or np.any(RowIndices[1:] < RowIndices[:-1]):
+                    Sorted = False
+                    break
+                Counts = np.bincount(RowIndices - RowIndices[0])
+                Indptr[RowIndices[0] + 1:RowIndices[0] + 1 + len(Counts)] += Counts.astype(IndexType)
+                Indices[Filled:Filled + len(RowIndices)] = ColumnIndices
+                Data[Filled:Filled + len(RowIndices)] = Values
+                LastRow = RowIndices[-1]
+                Filled += len(RowIndices)
+            Chunks.close()
+            if Sorted:
+                np.cumsum(Indptr, out = Indptr)
+        if not Sorted: #Parse again and partition the entries by rows
+            Filled = 0
+            Indptr[:] = 0
+            BlockRows = max(1, Rows * ChunkBytes // max(1, os.path.getsize(Path) - Header["Offset"]))
+            for Index, Block in enumerate(_IterMatrixMarketBlocks(Path, Header, BlockRows, ChunkBytes, Workers)):
+                Start = Index * BlockRows
+                Indptr[Start + 1:Start + 1 + Block.shape[0]] = Block.indptr[1:] + Filled
+                Indices[Filled:Filled + Block.nnz] = Block.indices
+                Data[Filled:Filled + Block.nnz] = Block.data
+                Filled += Block.nnz
+        #Shrink the buffers in place instead of keeping slices of them, which would keep the whole buffers alive. No views of them exist here.
+        Indices.resize(Filled, refcheck = False)
+        Data.resize(Filled, refcheck = False)
+        SparseMatrix = _CsrMatrixFromArrays((Rows, Columns), Indptr, Indices, Data)
+        SparseMatrix.sum_duplicates()
+        return SparseMatrix
@@ -3,23 +3,14 @@
 
 __author__ = "Wang Hewen"
 
-ScipyDependencyFlag = False #Check if dependencies are satisfied. If not, some advanced functions will not be defined.
-TorchDependencyFlag = False
-
-try:
-    import scipy.sparse
-    import numpy as np
-    ScipyDependencyFlag = True
-except Exception:
-    ScipyDependencyFlag = False
-
-try:
-    import scipy.sparse
-    import torch
-    import numpy as np
-    TorchDependencyFlag = True
-except Exception:
-    TorchDependencyFlag = False
+from .Utilities import IsModuleAvailable, LazyModule
+
+#Dependencies are imported on first use. If they are not installed, some advanced functions will not be defined.
+ScipyDependencyFlag = IsModuleAvailable("scipy", "numpy")
+TorchDependencyFlag = IsModuleAvailable("scipy", "torch", "numpy")
+scipy = LazyModule("scipy", globals(), Submodules = ["sparse"])
+np = LazyModule("numpy", globals(), "np")
+torch = LazyModule("torch", globals())
 
 if ScipyDependencyFlag:
     def PrecisionAtTopK(YTrue, YScore, K=10):
@@ -4,6 +4,8 @@ __author__ = "Wang Hewen"
 import datetime
 import time
 import shutil
+import importlib
+import importlib.util
 
 global CurrentTime
 global StartTime
@@ -115,3 +117,62 @@ def GetHardDiskUsage(Print = True):
         print("Free: %d GB" % (free // (2 ** 30)))
 
     return total, used, free
+
+def IsModuleAvailable(*Names):
+    '''
+    Check whether modules are installed, without importing them.
+    A module which is installed but broken (e.g. a missing shared library) still counts as available, and LazyModule raises an ImportError naming it on first use.
+
+    Example::
+
+        >>> IsModuleAvailable("numpy", "scipy")
+        True
+
+    :param String Names: Names of top level modules, e.g. "numpy".
+    :return: Result: True if all modules are installed.
+    :rtype: Boolean
+    '''
+    return all(importlib.util.find_spec(Name) is not None for Name in Names)
+
+class LazyModule(object):
+    '''
+    A placeholder of a module which imports the module on first attribute access, so that heavy dependencies do not slow down importing modules that use only some of their functions.
+    Once imported, the placeholder replaces itself with the module in Globals, so later accesses cost nothing.
+    If the module fails to import, e.g. because its installation is broken, ImportError is raised at that first access with the name of the module.
+
+    Example::
+
+        >>> np = LazyModule("numpy", globals(), "np")
+        >>> np.zeros(3) #numpy is imported here
+        array([0., 0., 0.])
+
+    :param String Name: Absolute name of the module, e.g. "networkx.readwrite.json_graph".
+    :param dict Globals: Global namespace where the placeholder is stored. Use None to keep the placeholder.
+    :param String Alias: Name of the placeholder in Globals. Use None for the last component of Name.
+    :param list Submodules: Submodules imported together with the module, e.g. ["io", "sparse"] for "scipy".
+    '''
+    def __init__(self, Name, Globals = None, Alias = None, Submodules = ()):
+        self._Name = Name
+        self._Globals = Globals
+        self._Alias = Name.rsplit(".", 1)[-1] if Alias is None else Alias
+        self._Submodules = Submodules
+        self._Module = None
+
+    def _Load(self):
+        if self._Module is None:
+            try:
+                Module = importlib.import_module(self._Name)
+                for Submodule in self._Submodules:
+                    importlib.import_module(self._Name + "." + Submodule)
+            except Exception as Error: #Not only ImportError, e.g. a broken installation may raise AttributeError, which would be mistaken for a missing attribute of the placeholder
+                raise ImportError("Failed to import module %s on first use: %s: %s" % (self._Name, type(Error).__name__, Error), name = self._Name) from Error
+            if self._Globals is not None and self._Globals.get(self._Alias) is self:
+                self._Globals[self._Alias] = Module
+            self._Module = Module
+        return self._Module
+
+    def __getattr__(self, Attribute):
+        return getattr(self._Load(), Attribute)
+
+    def __repr__(self):
+        return "<LazyModule %r%s>" % (self._Name, "" if self._Module is None else " (imported)")
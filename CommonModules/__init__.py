@@ -1,7 +1,22 @@
 # -*- coding: utf-8 -*-
-""" Some common modules for this project. You can import all other modules by import this module."""
+""" Some common modules for this project. You can import all other modules by import this module.
+The modules are imported on first access, e.g. CommonModules.IO is imported when it is used for the first time, so that importing this module is fast."""
 
 __author__ = "Wang Hewen"
 
+import importlib
+
 __all__ = ["DataStructure", "DataStructureOperations", "IO", "Log", "Utilities", "Science"]
-from . import *
+
+def __getattr__(Name):
+    '''
+    Import a module on first access (PEP 562).
+    '''
+    if Name in __all__:
+        Module = importlib.import_module("." + Name, __name__)
+        globals()[Name] = Module
+        return Module
+    raise AttributeError("module %r has no attribute %r" % (__name__, Name))
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,50 @@
+# -*- coding:utf-8 -*-
+"""Compare the throughput of CompressFiles/DecompressFiles for zip (serial and parallel) and streaming tar formats on a synthetic folder (or on an existing one given by --root)."""
+__author__ = "Wang Hewen"
+import argparse
+import os
+import tempfile
+import time
+
+import CommonModules as CM
+
+def MakeFolder(Root, Files, Size):
+    os.makedirs(Root)
+    Text = b"".join(b"%d,%f,feature_%d\n" % (i, i / 7, i % 97) for i in range(Size // 20 + 1))[:Size]
+    for i in range(Files):
+        with open(os.path.join(Root, "%d.%s" % (i, "csv" if i % 2 == 0 else "bin")), "wb") as f:
+            f.write(Text if i % 2 == 0 else os.urandom(Size))
+
+def FolderSize(Root):
+    return sum(os.path.getsize(Path) for Path in CM.IO.ListFiles(Root, ".", All = True))
+
+def main():
+    Parser = argparse.ArgumentParser(description = __doc__)
+    Parser.add_argument("--root", help = "Existing folder to compress. A synthetic folder of half text and half random files is generated if omitted.")
+    Parser.add_argument("--files", type = int, default = 16)
+    Parser.add_argument("--size", type = int, default = 8 * 2 ** 20, help = "Size of each synthetic file in bytes")
+    Parser.add_argument("--workers", type = int, default = 4)
+    Args = Parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as TempDirectory:
+        Root = Args.root
+        if Root is None:
+            Root = os.path.join(TempDirectory, "data")
+            MakeFolder(Root, Args.files, Args.size)
+        TotalSize = FolderSize(Root) / 2 ** 20
+        Cases = [("zip", 1), ("zip", Args.workers), ("tar", 1), ("tar.gz", 1), ("tar.bz2", 1), ("tar.xz", 1)]
+        for Format, Workers in Cases:
+            CompressedFilePath = os.path.join(TempDirectory, "output." + Format)
+            Start = time.perf_counter()
+            CM.IO.CompressFiles([Root], CompressedFilePath, Format = Format, Workers = Workers)
+            CompressTime = time.perf_counter() - Start
+            Start = time.perf_counter()
+            CM.IO.DecompressFiles([CompressedFilePath], os.path.join(TempDirectory, "output"), Format = Format, Workers = Workers)
+            DecompressTime = time.perf_counter() - Start
+            CM.IO.RemoveDirectory(os.path.join(TempDirectory, "output"))
+            print("%-8s Workers=%-2d ratio %.3f, compress %8.1f MB/s, decompress %8.1f MB/s" % (
+                Format, Workers, os.path.getsize(CompressedFilePath) / 2 ** 20 / TotalSize, TotalSize / CompressTime, TotalSize / DecompressTime))
+            os.remove(CompressedFilePath)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# -*- coding:utf-8 -*-
+"""Compare file size and speed of ExportToPkl/ImportFromPkl and ExportToJson/ImportFromJson with each compressor selected by file extension."""
+__author__ = "Wang Hewen"
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import CommonModules as CM
+
+def MakeContent(Records):
+    Random = random.Random(0)
+    return [{"id": i, "label": Random.choice(["train", "valid", "test"]), "score": Random.random(),
+             "tokens": [Random.randrange(5000) for _ in range(20)]} for i in range(Records)]
+
+def main():
+    Parser = argparse.ArgumentParser(description = __doc__)
+    Parser.add_argument("--records", type = int, default = 100000)
+    Parser.add_argument("--levels", type = int, nargs = "+", default = [1, 6])
+    Args = Parser.parse_args()
+
+    Content = MakeContent(Args.records)
+    Extensions = [".gz", ".bz2", ".xz"] + [".lz4"] * CM.IO.Lz4DependencyFlag + [".zst"] * CM.IO.ZstdDependencyFlag
+    with tempfile.TemporaryDirectory() as TempDirectory:
+        for Format, Export, Import in [("pkl", CM.IO.ExportToPkl, CM.IO.ImportFromPkl), ("json", CM.IO.ExportToJson, CM.IO.ImportFromJson)]:
+            Cases = [("", None)] + [(Extension, Level) for Extension in Extensions for Level in Args.levels]
+            for Extension, Level in Cases:
+                Path = os.path.join(TempDirectory, "content." + Format + Extension)
+                Start = time.perf_counter()
+                Export(Path, Content, CompressLevel = Level)
+                ExportTime = time.perf_counter() - Start
+                Start = time.perf_counter()
+                Import(Path)
+                ImportTime = time.perf_counter() - Start
+                print("%-10s level %-4s size %8.2f MB, export %6.3f sec, import %6.3f sec" % (
+                    Format + Extension, "-" if Level is None else Level, os.path.getsize(Path) / 2 ** 20, ExportTime, ImportTime))
+                os.remove(Path)
+
+if __name__ == "__main__":
+    main()
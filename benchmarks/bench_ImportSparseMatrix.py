@@ -0,0 +1,54 @@
+# -*- coding:utf-8 -*-
+"""Compare speed and peak traced memory of importing a sparse matrix with scipy.io.mmread, the chunked matrix market reader of ImportSparseMatrix and the binary CSR format."""
+__author__ = "Wang Hewen"
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import scipy.io
+import scipy.sparse
+
+import CommonModules as CM
+
+def Measure(Function):
+    tracemalloc.start()
+    Start = time.perf_counter()
+    Result = Function()
+    Elapsed = time.perf_counter() - Start
+    Peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return Result, Elapsed, Peak
+
+def main():
+    Parser = argparse.ArgumentParser(description = __doc__)
+    Parser.add_argument("--rows", type = int, default = 200000)
+    Parser.add_argument("--columns", type = int, default = 100000)
+    Parser.add_argument("--nnz", type = int, default = 2000000)
+    Parser.add_argument("--workers", type = int, default = 1)
+    Args = Parser.parse_args()
+
+    SparseMatrix = scipy.sparse.random(Args.rows, Args.columns, density = Args.nnz / Args.rows / Args.columns, format = "csr", random_state = np.random.default_rng(0))
+    Size = (SparseMatrix.data.nbytes + SparseMatrix.indices.nbytes + SparseMatrix.indptr.nbytes) / 2 ** 20
+    print("CSR arrays %.2f MB" % Size)
+    with tempfile.TemporaryDirectory() as TempDirectory:
+        MtxPath = os.path.join(TempDirectory, "matrix.mtx")
+        CsrPath = os.path.join(TempDirectory, "matrix.csr")
+        CM.IO.ExportSparseMatrix(MtxPath, SparseMatrix)
+        CM.IO.ExportSparseMatrix(CsrPath, SparseMatrix)
+        ColumnPath = os.path.join(TempDirectory, "matrix_csc.mtx")
+        CM.IO.ExportSparseMatrix(ColumnPath, SparseMatrix.tocsc())
+        Cases = [("mmread + tocsr", lambda: scipy.io.mmread(MtxPath).tocsr()),
+                 ("ImportSparseMatrix .mtx", lambda: CM.IO.ImportSparseMatrix(MtxPath, Workers = Args.workers)),
+                 ("ImportSparseMatrix .mtx (column order)", lambda: CM.IO.ImportSparseMatrix(ColumnPath, Workers = Args.workers)),
+                 ("ImportSparseMatrix .csr", lambda: CM.IO.ImportSparseMatrix(CsrPath, MmapMode = None)),
+                 ("ImportSparseMatrix .csr mmap", lambda: CM.IO.ImportSparseMatrix(CsrPath))]
+        for Name, Function in Cases:
+            Result, Elapsed, Peak = Measure(Function)
+            assert (Result != SparseMatrix).nnz == 0
+            print("%-40s %7.3f sec, peak %8.2f MB" % (Name, Elapsed, Peak / 2 ** 20))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# -*- coding:utf-8 -*-
+"""Measure the time of importing CommonModules and using each module in a fresh interpreter, and the heavy dependencies it imports.
+Exit with status 1 if importing the package and using IO.ListFiles is slower than --limit seconds, so that it can guard the import time in scripts."""
+__author__ = "Wang Hewen"
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+HeavyModules = ["numpy", "scipy", "networkx", "torch", "urllib.request"]
+
+Cases = [("import CommonModules", "import CommonModules as CM"),
+         ("IO.ListFiles", "import CommonModules as CM; CM.IO.ListFiles('.', '.py')"),
+         ("Log", "import CommonModules as CM; CM.Log"),
+         ("DataStructureOperations", "import CommonModules as CM; CM.DataStructureOperations"),
+         ("IO.ImportSparseMatrix", "import CommonModules as CM; CM.IO.scipy.sparse"),
+         ("from CommonModules import *", "from CommonModules import *")]
+
+def Measure(Code, Repeats):
+    Script = "import time, sys; Start = time.perf_counter(); %s; print(time.perf_counter() - Start); print(' '.join(Name for Name in %r if Name in sys.modules))" % (Code, HeavyModules)
+    Environment = dict(os.environ, PYTHONPATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    Times = []
+    for _ in range(Repeats):
+        Output = subprocess.run([sys.executable, "-c", Script], check = True, capture_output = True, text = True, env = Environment).stdout.splitlines()
+        Times.append(float(Output[0]))
+    return statistics.median(Times), Output[1] if len(Output) > 1 else ""
+
+def main():
+    Parser = argparse.ArgumentParser(description = __doc__)
+    Parser.add_argument("--repeats", type = int, default = 5)
+    Parser.add_argument("--limit", type = float, default = 0.2, help = "Maximum seconds of importing the package and using IO.ListFiles.")
+    Args = Parser.parse_args()
+
+    Results = {}
+    for Name, Code in Cases:
+        Results[Name], Imported = Measure(Code, Args.repeats)
+        print("%-30s %7.1f ms, heavy modules imported: %s" % (Name, Results[Name] * 1000, Imported or "none"))
+    if Results["IO.ListFiles"] > Args.limit:
+        print("IO.ListFiles takes longer than %.3f sec to import." % Args.limit)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# -*- coding:utf-8 -*-
+"""Compare the serial and the parallel directory walker of ListFiles on a synthetic deep/wide tree (or on an existing directory given by --root)."""
+__author__ = "Wang Hewen"
+import argparse
+import os
+import tempfile
+import time
+
+import CommonModules as CM
+
+def MakeTree(Root, Depth, Width, Files):
+    Folders = [Root]
+    for Level in range(Depth):
+        Folders = [os.path.join(Folder, "d%d" % i) for Folder in Folders for i in range(Width)]
+        for Folder in Folders:
+            os.makedirs(Folder)
+            for i in range(Files):
+                open(os.path.join(Folder, "f%d.pkl" % i), "w").close()
+
+def Timeit(Function, Repeat):
+    Best = float("inf")
+    for _ in range(Repeat):
+        Start = time.perf_counter()
+        Result = Function()
+        Best = min(Best, time.perf_counter() - Start)
+    return Best, Result
+
+def main():
+    Parser = argparse.ArgumentParser(description = __doc__)
+    Parser.add_argument("--root", help = "Existing directory to walk, e.g. on NFS. A synthetic tree is generated if omitted.")
+    Parser.add_argument("--depth", type = int, default = 4)
+    Parser.add_argument("--width", type = int, default = 8)
+    Parser.add_argument("--files", type = int, default = 5)
+    Parser.add_argument("--workers", type = int, nargs = "+", default = [4, 16])
+    Parser.add_argument("--repeat", type = int, default = 3)
+    Args = Parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as TempDirectory:
+        Root = Args.root
+        if Root is None:
+            Root = TempDirectory
+            MakeTree(Root, Args.depth, Args.width, Args.files)
+        SerialTime, Expected = Timeit(lambda: CM.IO.ListFiles(Root, ".", All = True), Args.repeat)
+        print("Workers=1: %d files in %.3f sec" % (len(Expected), SerialTime))
+        for Workers in Args.workers:
+            ParallelTime, Result = Timeit(lambda: CM.IO.ListFiles(Root, ".", All = True, Workers = Workers), Args.repeat)
+            assert Result == Expected
+            print("Workers=%d: %d files in %.3f sec (%.2fx)" % (Workers, len(Result), ParallelTime, SerialTime / ParallelTime))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+# -*- coding:utf-8 -*-
+"""Compare stacking rows one by one with CombineMatricesRowWise and with MatrixRowAccumulator, for dense and sparse rows."""
+__author__ = "Wang Hewen"
+import argparse
+import time
+
+import numpy as np
+import scipy.sparse
+
+import CommonModules as CM
+
+def main():
+    Parser = argparse.ArgumentParser(description = __doc__)
+    Parser.add_argument("--rows", type = int, default = 5000, help = "Rows stacked by both methods.")
+    Parser.add_argument("--accumulator-rows", type = int, default = 1000000, help = "Rows stacked by MatrixRowAccumulator only.")
+    Parser.add_argument("--columns", type = int, default = 100)
+    Args = Parser.parse_args()
+
+    Random = np.random.default_rng(0)
+    DenseRow = Random.random((1, Args.columns))
+    SparseRow = scipy.sparse.random(1, Args.columns, density = 0.05, format = "csr", random_state = Random)
+    for Name, Row, Sparse in [("dense", DenseRow, False), ("sparse", SparseRow, True)]:
+        Start = time.perf_counter()
+        Result = np.array([])
+        for _ in range(Args.rows):
+            Result = CM.DataStructureOperations.CombineMatricesRowWise(Result, Row, Sparse = Sparse)
+        print("%-6s CombineMatricesRowWise  %8d rows %8.3f sec" % (Name, Args.rows, time.perf_counter() - Start))
+        for Rows in [Args.rows, Args.accumulator_rows]:
+            Start = time.perf_counter()
+            Accumulator = CM.DataStructureOperations.MatrixRowAccumulator(Sparse = Sparse)
+            for _ in range(Rows):
+                Accumulator.Append(Row)
+            Result = Accumulator.Finalize()
+            print("%-6s MatrixRowAccumulator    %8d rows %8.3f sec" % (Name, Result.shape[0], time.perf_counter() - Start))
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,9 @@ setup(
     license='MIT',
     install_requires=["wget"],
 	extras_require = {
-        'Advance DataStructureOperations':  ['scipy', 'numpy'],
-		'Advance DataStructure IO':  ['networkx', 'numpy', 'scipy', 'torch']
+        'Advance DataStructureOperations':  ['scipy', 'numpy>=1.23'],
+		'Advance DataStructure IO':  ['networkx', 'numpy>=1.23', 'scipy', 'torch'],
+		'Compression IO':  ['lz4', 'zstandard'],
+		'Fast JSON IO':  ['orjson']
     }
 )
\ No newline at end of file
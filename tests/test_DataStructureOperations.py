@@ -0,0 +1,205 @@
+import unittest
+import types
+
+import CommonModules as CM
+if CM.DataStructureOperations.ScipyDependencyFlag:
+    import numpy as np
+    import scipy.sparse
+if CM.DataStructureOperations.TorchDependencyFlag:
+    import torch
+
+class TruthFlatten(unittest.TestCase):
+
+    def test_flatten_list(self):
+        self.assertEqual(CM.DataStructureOperations.FlattenList([['foo', 'baz'], ['gg']]), ['foo', 'baz', 'gg'])
+        self.assertEqual(CM.DataStructureOperations.FlattenList([[['foo', 'baz'], ['gg']]]), ['foo', 'baz', 'gg'])
+        self.assertEqual(CM.DataStructureOperations.FlattenList([['foo', ['baz']], 'gg', 1, [[]]]), ['foo', 'baz', 'gg', 1])
+        self.assertEqual(CM.DataStructureOperations.FlattenList([[1, [2]], [3]], MaxDepth = 1), [1, [2], 3])
+        self.assertEqual(CM.DataStructureOperations.FlattenList([]), [])
+
+    def test_iter_flatten(self):
+        Nested = [(1, 2), [3, (4, [5])], "67"]
+        self.assertEqual(list(CM.DataStructureOperations.IterFlatten(Nested)), [(1, 2), 3, (4, [5]), "67"])
+        self.assertEqual(list(CM.DataStructureOperations.IterFlatten(Nested, Types = (list, tuple))), [1, 2, 3, 4, 5, "67"])
+        self.assertEqual(list(CM.DataStructureOperations.IterFlatten(Nested, Types = (list, tuple), MaxDepth = 2)), [1, 2, 3, 4, [5], "67"])
+        self.assertEqual(list(CM.DataStructureOperations.IterFlatten([(Number for Number in range(2)), [2]], Types = (list, types.GeneratorType))), [0, 1, 2])
+
+    def test_deep(self):
+        Nested = 0
+        for Number in range(1, 10000): #Deeper than the recursion limit
+            Nested = [Nested, Number]
+        self.assertEqual(CM.DataStructureOperations.FlattenList(Nested), list(range(10000)))
+
+@unittest.skipUnless(CM.DataStructureOperations.ScipyDependencyFlag, "numpy and scipy are required")
+class TruthMatrixRowAccumulator(unittest.TestCase):
+
+    def setUp(self):
+        self.SparseMatrix = scipy.sparse.random(100, 20, density = 0.2, format = "csr", random_state = 0)
+
+    def test_dense(self):
+        Accumulator = CM.DataStructureOperations.MatrixRowAccumulator(InitialCapacity = 1)
+        Matrix = self.SparseMatrix.toarray()
+        for Row in Matrix[:50]:
+            Accumulator.Append(Row)
+        Accumulator.Append(Matrix[50:90])
+        Accumulator.Append(self.SparseMatrix[90:])
+        self.assertEqual(len(Accumulator), 100)
+        self.assertTrue(np.array_equal(Accumulator.Finalize(), Matrix))
+        with self.assertRaises(ValueError):
+            Accumulator.Append(np.zeros(3))
+
+    def test_sparse(self):
+        Accumulator = CM.DataStructureOperations.MatrixRowAccumulator(Sparse = True, InitialCapacity = 1)
+        for Start in range(0, 90, 9):
+            Accumulator.Append(self.SparseMatrix[Start:Start + 9])
+        Accumulator.Append(self.SparseMatrix[90:].toarray())
+        Result = Accumulator.Finalize()
+        self.assertEqual(Result.format, "csr")
+        self.assertEqual((Result != self.SparseMatrix).nnz, 0)
+
+    def test_data_type(self):
+        Accumulator = CM.DataStructureOperations.MatrixRowAccumulator(Sparse = True)
+        self.assertEqual(Accumulator.Finalize().shape, (0, 0))
+        Accumulator.Append([1, 0, 2])
+        Accumulator.Append([0.5, 0, 0])
+        self.assertEqual(Accumulator.Finalize().dtype, np.float64)
+        Accumulator = CM.DataStructureOperations.MatrixRowAccumulator(Columns = 3, DataType = np.float32)
+        Accumulator.Append([1, 0, 2])
+        self.assertEqual(Accumulator.Finalize().dtype, np.float32)
+
+@unittest.skipUnless(CM.DataStructureOperations.ScipyDependencyFlag, "numpy and scipy are required")
+class TruthDeleteSparseMatrixVectors(unittest.TestCase):
+
+    def setUp(self):
+        self.SparseMatrix = scipy.sparse.random(30, 20, density = 0.3, format = "csr", random_state = 0)
+        self.Matrix = self.SparseMatrix.toarray()
+
+    def test_delete_rows(self):
+        Mask = np.zeros(30, dtype = bool)
+        Mask[[0, 5, 29]] = True
+        Expected = np.delete(self.Matrix, [0, 5, 29], axis = 0)
+        for Rows in [[0, 5, -1], Mask]:
+            self.assertTrue(np.array_equal(CM.DataStructureOperations.DeleteCsrMatrixRows(self.SparseMatrix, Rows).toarray(), Expected))
+            self.assertTrue(np.array_equal(CM.DataStructureOperations.DeleteLilMatrixRows(self.SparseMatrix.tolil(), Rows).toarray(), Expected))
+        self.assertEqual(self.SparseMatrix.shape, (30, 20))
+        SparseMatrix = self.SparseMatrix.copy()
+        Result = CM.DataStructureOperations.DeleteCsrMatrixRows(SparseMatrix, [0, 5, 29], InPlace = True)
+        self.assertIs(Result, SparseMatrix)
+        self.assertTrue(np.array_equal(Result.toarray(), Expected))
+        with self.assertRaises(ValueError):
+            CM.DataStructureOperations.DeleteCsrMatrixRows(self.SparseMatrix.tocsc(), [0])
+
+    def test_delete_columns(self):
+        Expected = np.delete(self.Matrix, [1, 2, 19], axis = 1)
+        for InPlace in [False, True]:
+            Result = CM.DataStructureOperations.DeleteCsrMatrixColumns(self.SparseMatrix.copy(), [1, 2, 19], InPlace = InPlace)
+            self.assertTrue(np.array_equal(Result.toarray(), Expected))
+            Result.check_format(full_check = True)
+            Result = CM.DataStructureOperations.DeleteCscMatrixColumns(self.SparseMatrix.tocsc(), [1, 2, 19], InPlace = InPlace)
+            self.assertEqual(Result.format, "csc")
+            self.assertTrue(np.array_equal(Result.toarray(), Expected))
+
+    def test_chunks(self):
+        Keep = np.arange(30) % 4 != 0
+        for Major in [True, False]:
+            Expected = CM.DataStructureOperations._DeleteCompressedMatrixVectors(self.SparseMatrix.copy(), Keep[:30 if Major else 20], Major, False)
+            Result = CM.DataStructureOperations._DeleteCompressedMatrixVectors(self.SparseMatrix.copy(), Keep[:30 if Major else 20], Major, True, ChunkSize = 7)
+            self.assertTrue(np.array_equal(Result.toarray(), Expected.toarray()))
+
+@unittest.skipUnless(CM.DataStructureOperations.ScipyDependencyFlag, "numpy and scipy are required")
+class TruthIfTwoSparseMatrixEqual(unittest.TestCase):
+
+    def setUp(self):
+        self.SparseMatrix = scipy.sparse.random(50, 40, density = 0.2, format = "csr", random_state = 0)
+
+    def test_equal(self):
+        for Other in [self.SparseMatrix.copy(), self.SparseMatrix.tocsc(), self.SparseMatrix.tocoo()]:
+            self.assertTrue(CM.DataStructureOperations.IfTwoSparseMatrixEqual(self.SparseMatrix, Other, ChunkSize = 7))
+        Duplicated = scipy.sparse.csr_matrix((np.array([2, 0.5, 0.5, 3]), np.array([2, 0, 0, 1]), np.array([0, 3, 4])), shape = (2, 3))
+        self.assertTrue(CM.DataStructureOperations.IfTwoSparseMatrixEqual(scipy.sparse.csr_matrix([[1, 0, 2], [0, 3, 0]], dtype = float), Duplicated))
+        self.assertFalse(Duplicated.has_canonical_format) #Inputs are not modified
+
+    def test_not_equal(self):
+        Other = self.SparseMatrix.copy()
+        Other.data[-1] += 1e-12
+        for Other in [Other, self.SparseMatrix[:49], self.SparseMatrix.astype(np.float32), self.SparseMatrix * 2]:
+            self.assertFalse(CM.DataStructureOperations.IfTwoSparseMatrixEqual(self.SparseMatrix, Other, ChunkSize = 7))
+        Other = self.SparseMatrix.copy()
+        Other.data[0] = 0 #Explicit zero
+        Eliminated = Other.copy()
+        Eliminated.eliminate_zeros()
+        self.assertFalse(CM.DataStructureOperations.IfTwoSparseMatrixEqual(Other, Eliminated))
+
+    def test_tolerance(self):
+        Other = self.SparseMatrix.copy()
+        Other.data[-1] += 1e-12
+        self.assertTrue(CM.DataStructureOperations.IfTwoSparseMatrixEqual(self.SparseMatrix, Other, Tolerance = 1e-9))
+        self.assertTrue(CM.DataStructureOperations.IfTwoSparseMatrixEqual(self.SparseMatrix, Other.astype(np.float32), RelativeTolerance = 1e-6))
+        Other = self.SparseMatrix.tolil()
+        Other[0, 0] = Other[0, 0] + 1e-12
+        Other[0, 1] = Other[0, 1] + 1e-12
+        self.assertTrue(CM.DataStructureOperations.IfTwoSparseMatrixEqual(self.SparseMatrix, Other, Tolerance = 1e-9))
+        self.assertFalse(CM.DataStructureOperations.IfTwoSparseMatrixEqual(self.SparseMatrix, Other, Tolerance = 1e-14))
+
+@unittest.skipUnless(CM.DataStructureOperations.TorchDependencyFlag, "torch is required")
+class TruthSparseTensorConversion(unittest.TestCase):
+
+    def setUp(self):
+        self.SparseMatrix = scipy.sparse.random(30, 20, density = 0.1, format = "csr", random_state = np.random.default_rng(0))
+
+    def test_coo(self):
+        for DataType in [np.float64, np.float32, np.int32]:
+            SparseMatrix = self.SparseMatrix.astype(DataType)
+            SparseTensor = CM.DataStructureOperations.ConvertSparseMatrixToSparseTensor(SparseMatrix)
+            self.assertEqual(SparseTensor.layout, torch.sparse_coo)
+            self.assertTrue(SparseTensor.is_coalesced())
+            self.assertEqual(SparseTensor.values().numpy().dtype, DataType)
+            self.assertEqual(SparseTensor.values().data_ptr(), SparseMatrix.data.ctypes.data) #Shared, not copied
+            self.assertTrue(np.array_equal(SparseTensor.to_dense().numpy(), SparseMatrix.toarray()))
+            self.assertTrue(CM.DataStructureOperations.IfTwoSparseMatrixEqual(CM.DataStructureOperations.ConvertSparseTensorToSparseMatrix(SparseTensor), SparseMatrix))
+        SparseTensor = CM.DataStructureOperations.ConvertSparseMatrixToSparseTensor(self.SparseMatrix.tocsc())
+        self.assertTrue(np.array_equal(SparseTensor.to_dense().numpy(), self.SparseMatrix.toarray()))
+        Duplicated = scipy.sparse.coo_matrix(([1.0, 2.0, 3.0], ([1, 0, 1], [2, 1, 2])), shape = (2, 3))
+        SparseTensor = CM.DataStructureOperations.ConvertSparseMatrixToSparseTensor(Duplicated)
+        self.assertTrue(SparseTensor.is_coalesced())
+        self.assertEqual(SparseTensor.indices().tolist(), [[0, 1], [1, 2]])
+        self.assertEqual(SparseTensor.values().tolist(), [2.0, 4.0])
+        self.assertEqual(Duplicated.nnz, 3) #Input is not modified
+        SparseTensor = CM.DataStructureOperations.ConvertSparseMatrixToSparseTensor(Duplicated, TensorType = torch.sparse.FloatTensor)
+        self.assertEqual(SparseTensor.dtype, torch.float32)
+        self.assertTrue(np.array_equal(SparseTensor.to_dense().numpy(), Duplicated.toarray()))
+
+    def test_float16(self):
+        SparseTensor = torch.sparse_coo_tensor(torch.tensor([[0, 1], [1, 0]]), torch.tensor([1.5, 2], dtype = torch.float16), (2, 2))
+        SparseMatrix = CM.DataStructureOperations.ConvertSparseTensorToSparseMatrix(SparseTensor)
+        self.assertEqual(SparseMatrix.dtype, np.float32)
+        self.assertTrue(np.array_equal(SparseMatrix.toarray(), [[0, 1.5], [2, 0]]))
+
+    def test_csr(self):
+        SparseTensor = CM.DataStructureOperations.ConvertSparseMatrixToSparseTensor(self.SparseMatrix, Layout = "csr")
+        self.assertEqual(SparseTensor.layout, torch.sparse_csr)
+        self.assertEqual(SparseTensor.values().data_ptr(), self.SparseMatrix.data.ctypes.data) #Shared, not copied
+        SparseMatrix = CM.DataStructureOperations.ConvertSparseTensorToSparseMatrix(SparseTensor)
+        self.assertEqual(SparseMatrix.format, "csr")
+        self.assertTrue(CM.DataStructureOperations.IfTwoSparseMatrixEqual(SparseMatrix, self.SparseMatrix))
+        SparseTensor = CM.DataStructureOperations.ConvertSparseMatrixToSparseTensor(self.SparseMatrix.toarray(), Layout = "csr") #Dense input, as for COO layout
+        self.assertTrue(np.array_equal(SparseTensor.to_dense().numpy(), self.SparseMatrix.toarray()))
+        CscMatrix = self.SparseMatrix.tocsc()
+        SparseTensor = torch.sparse_csc_tensor(torch.from_numpy(CscMatrix.indptr), torch.from_numpy(CscMatrix.indices), torch.from_numpy(CscMatrix.data), size = CscMatrix.shape)
+        SparseMatrix = CM.DataStructureOperations.ConvertSparseTensorToSparseMatrix(SparseTensor)
+        self.assertEqual(SparseMatrix.format, "csc")
+        self.assertTrue(CM.DataStructureOperations.IfTwoSparseMatrixEqual(SparseMatrix, self.SparseMatrix))
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            CM.DataStructureOperations.ConvertSparseMatrixToSparseTensor(self.SparseMatrix, Layout = "bsr")
+        with self.assertRaises(ValueError):
+            CM.DataStructureOperations.ConvertSparseTensorToSparseMatrix(torch.zeros(3, 3))
+
+    def test_slice(self):
+        SparseTensor = CM.DataStructureOperations.ConvertSparseMatrixToSparseTensor(self.SparseMatrix)
+        Sliced = CM.DataStructureOperations.SparseTensorSlice(SparseTensor, list(range(5, 10)), list(range(0, 20, 2)))
+        self.assertTrue(np.array_equal(Sliced.to_dense().numpy(), self.SparseMatrix[5:10, 0:20:2].toarray()))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,26 @@
 import unittest
 import os
+import tempfile
+import hashlib
+import io
+import gzip
+import pickle
+import json
+import math
+import sys
+import subprocess
+import pathlib
+import threading
+import http.server
+import zipfile
+import unittest.mock
 
 import CommonModules as CM
+if CM.IO.DependencyFlag:
+    import networkx as nx
+    import numpy as np
+    import scipy.io
+    import scipy.sparse
 
 class TruthDownloadFile(unittest.TestCase):
 
@@ -23,5 +42,721 @@ class TruthDownloadFile(unittest.TestCase):
             self.fail('Did not see FileExistsError')
         os.remove("./1.pdf")
 
+class RangeRequestHandler(http.server.BaseHTTPRequestHandler):
+    '''
+    A stand-in of a download server, which serves Content for any path and supports single range requests.
+    '''
+    Content = b""
+    Ranges = []
+    IgnoreRanges = False
+
+    def do_HEAD(self):
+        self.Ranges.append("HEAD")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.Content)))
+        if not self.IgnoreRanges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_GET(self):
+        Range = self.headers.get("Range")
+        self.Ranges.append(Range)
+        if Range is not None and not self.Content:
+            self.send_response(416)
+            self.send_header("Content-Range", "bytes */0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if Range is None or self.IgnoreRanges:
+            Start, End = 0, len(self.Content) - 1
+            self.send_response(200)
+        else:
+            Start, End = Range[len("bytes="):].split("-")
+            Start, End = int(Start), int(End) if End else len(self.Content) - 1
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (Start, End, len(self.Content)))
+        self.send_header("Content-Length", str(End - Start + 1))
+        self.end_headers()
+        self.wfile.write(self.Content[Start:End + 1])
+
+    def log_message(self, *args):
+        pass
+
+class TruthDownloadFileLocal(unittest.TestCase):
+
+    def setUp(self):
+        RangeRequestHandler.Content = os.urandom(100000)
+        RangeRequestHandler.Ranges = []
+        RangeRequestHandler.IgnoreRanges = False
+        self.Checksum = hashlib.md5(RangeRequestHandler.Content).hexdigest()
+        self.Server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+        threading.Thread(target = self.Server.serve_forever, daemon = True).start()
+        self.URL = "http://127.0.0.1:%d/data.bin" % self.Server.server_address[1]
+        self.TempDirectory = tempfile.TemporaryDirectory()
+        self.Root = self.TempDirectory.name
+
+    def tearDown(self):
+        self.Server.shutdown()
+        self.Server.server_close()
+        self.TempDirectory.cleanup()
+
+    def _Read(self, Path):
+        with open(Path, "rb") as f:
+            return f.read()
+
+    def test_download_file(self):
+        FileName = CM.IO.DownloadFile(self.URL, Destination = self.Root, ExpectedBytes = 100000, Checksum = self.Checksum)
+        self.assertEqual(FileName, os.path.join(self.Root, "data.bin"))
+        self.assertEqual(self._Read(FileName), RangeRequestHandler.Content)
+        self.assertEqual(RangeRequestHandler.Ranges, ["HEAD", None])
+        with self.assertRaises(FileExistsError):
+            CM.IO.DownloadFile(self.URL, Destination = self.Root, Checksum = "0" * 32)
+
+    def test_download_file_progress(self):
+        for IgnoreRanges, Connections in [(False, 1), (False, 3), (True, 3)]:
+            RangeRequestHandler.IgnoreRanges = IgnoreRanges
+            Progress = []
+            FileName = CM.IO.DownloadFile(self.URL, Destination = os.path.join(self.Root, "%d%d.bin" % (IgnoreRanges, Connections)), Checksum = self.Checksum, Connections = Connections, BlockSize = 16384,
+                                          ProgressCallback = lambda Downloaded, Total: Progress.append((Downloaded, Total)))
+            self.assertEqual(self._Read(FileName), RangeRequestHandler.Content)
+            self.assertEqual(Progress[-1], (100000, 100000))
+            self.assertEqual(Progress, sorted(Progress))
+
+    def test_download_empty_file(self):
+        RangeRequestHandler.Content = b""
+        FileName = CM.IO.DownloadFile(self.URL, Destination = os.path.join(self.Root, "empty.bin"), Checksum = hashlib.md5().hexdigest())
+        self.assertEqual(self._Read(FileName), b"")
+
+    def test_download_file_resume(self):
+        with open(os.path.join(self.Root, "data.bin.part"), "wb") as f:
+            f.write(RangeRequestHandler.Content[:30000])
+        FileName = CM.IO.DownloadFile(self.URL, Destination = self.Root, Checksum = self.Checksum)
+        self.assertEqual(RangeRequestHandler.Ranges, ["HEAD", "bytes=30000-"])
+        self.assertEqual(self._Read(FileName), RangeRequestHandler.Content)
+        self.assertFalse(os.path.exists(FileName + ".part"))
+
+        with open(os.path.join(self.Root, "1.bin.part"), "wb") as f: #Left by a single connection, so it has no progress of ranges
+            f.write(RangeRequestHandler.Content[:30000])
+        RangeRequestHandler.Ranges = []
+        FileName = CM.IO.DownloadFile(self.URL, Destination = os.path.join(self.Root, "1.bin"), Checksum = self.Checksum, Connections = 3, BlockSize = 16384)
+        self.assertEqual(RangeRequestHandler.Ranges, ["HEAD", "bytes=30000-"])
+        self.assertEqual(self._Read(FileName), RangeRequestHandler.Content)
+
+    def test_download_file_connections(self):
+        FileName = CM.IO.DownloadFile(self.URL, Destination = os.path.join(self.Root, "1.bin"), Checksum = self.Checksum, Connections = 3, BlockSize = 16384)
+        self.assertEqual(self._Read(FileName), RangeRequestHandler.Content)
+        self.assertEqual(len(RangeRequestHandler.Ranges), 1 + 7)
+
+        with open(os.path.join(self.Root, "2.bin.part"), "wb") as f: #Resume a download with only the second range finished
+            f.write(b"\0" * 16384 + RangeRequestHandler.Content[16384:32768])
+        with open(os.path.join(self.Root, "2.bin.part.json"), "w") as f:
+            json.dump({"TotalBytes": 100000, "BlockSize": 16384, "Finished": [1]}, f)
+        RangeRequestHandler.Ranges = []
+        FileName = CM.IO.DownloadFile(self.URL, Destination = os.path.join(self.Root, "2.bin"), Checksum = self.Checksum, BlockSize = 16384)
+        self.assertEqual(self._Read(FileName), RangeRequestHandler.Content)
+        self.assertEqual(len(RangeRequestHandler.Ranges), 1 + 6)
+        self.assertFalse(os.path.exists(FileName + ".part.json"))
+
+class TruthListFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.TempDirectory = tempfile.TemporaryDirectory()
+        self.Root = self.TempDirectory.name
+        for Folder in ["a", "a-b", "a/b", "a/b/c", "a.b", "z"]:
+            os.makedirs(os.path.join(self.Root, Folder), exist_ok = True)
+        for File in ["1.pkl", "a.json", "a/2.pkl", "a/b/3.txt", "a-b/4.pkl", "a.b/5.json", "a/b/c/6.pkl"]:
+            with open(os.path.join(self.Root, File), "w") as f:
+                f.write(File)
+
+    def tearDown(self):
+        self.TempDirectory.cleanup()
+
+    def _Walk(self, Extension):
+        ListOfFiles = []
+        for root, dirs, files in os.walk(self.Root):
+            if Extension == "":
+                ListOfFiles.append(os.path.abspath(root))
+            else:
+                for filename in files:
+                    if os.path.splitext(filename)[1] == Extension or Extension == ".":
+                        ListOfFiles.append(os.path.abspath(os.path.join(root, filename)))
+        if Extension == "":
+            ListOfFiles = ListOfFiles[1:]
+        return sorted(ListOfFiles)
+
+    def test_list_all_files(self):
+        for Extension in [".pkl", ".json", ".", ""]:
+            self.assertEqual(CM.IO.ListFiles(self.Root, Extension, All = True), self._Walk(Extension))
+        self.assertEqual(CM.IO.ListFiles(self.Root, "pkl", All = True), self._Walk(".pkl"))
+
+    def test_list_files(self):
+        self.assertEqual(CM.IO.ListFiles(self.Root, ".pkl"), [os.path.join(self.Root, "1.pkl")])
+        self.assertEqual(CM.IO.ListFiles(self.Root, ""), sorted(os.path.join(self.Root, Folder) for Folder in ["a", "a-b", "a.b", "z"]))
+        self.assertEqual(CM.IO.ListFiles([os.path.join(self.Root, "z"), os.path.join(self.Root, "a")], "."), [os.path.join(self.Root, "a", "2.pkl")])
+        self.assertEqual(CM.IO.ListFiles("", "."), [])
+
+    def test_iter_files(self):
+        Iterator = CM.IO.IterFiles(self.Root, ".pkl", All = True)
+        self.assertEqual(sorted(Iterator), self._Walk(".pkl"))
+        self.assertEqual(list(CM.IO.IterFiles(self.Root, ".", All = True, Sort = True)), self._Walk("."))
+        with self.assertRaises(ValueError):
+            CM.IO.IterFiles(os.path.join(self.Root, "1.pkl"), ".")
+
+    def test_list_files_workers(self):
+        for Extension in [".pkl", ".", ""]:
+            self.assertEqual(CM.IO.ListFiles(self.Root, Extension, All = True, Workers = 4), self._Walk(Extension))
+        Directories = [os.path.join(self.Root, "z"), os.path.join(self.Root, "a")]
+        self.assertEqual(CM.IO.ListFiles(Directories, ".", All = True, Workers = 4), CM.IO.ListFiles(Directories, ".", All = True))
+        self.assertEqual(CM.IO.ListFiles(self.Root, ".", Workers = 4), CM.IO.ListFiles(self.Root, "."))
+
+    def test_iter_files_workers_lookahead(self):
+        for Index in range(100):
+            os.makedirs(os.path.join(self.Root, "many", "%03d" % Index))
+        Scanned = []
+        ScanDirectory = CM.IO._ScanDirectory
+        def CountingScan(Directory, *args):
+            Scanned.append(Directory)
+            return ScanDirectory(Directory, *args)
+        with unittest.mock.patch.object(CM.IO, "_ScanDirectory", CountingScan):
+            Iterator = CM.IO.IterFiles(self.Root, ".", All = True, Sort = True, Workers = 2)
+            self.assertEqual(next(Iterator), os.path.join(self.Root, "1.pkl"))
+            self.assertLessEqual(len(Scanned), 2 * 4 + 2)
+            self.assertEqual(list(Iterator), self._Walk(".")[1:])
+        self.assertEqual(len(Scanned), len(set(Scanned)))
+
+    def test_list_files_multiple_extensions(self):
+        Expected = sorted(self._Walk(".pkl") + self._Walk(".json"))
+        self.assertEqual(CM.IO.ListFiles(self.Root, [".pkl", "json"], All = True), Expected)
+        self.assertEqual(CM.IO.ListFiles(self.Root, {".pkl", "[0-9].json"}, All = True, Workers = 2), [Path for Path in Expected if not Path.endswith("a.json")])
+        self.assertEqual(CM.IO.ListFiles(self.Root, ["*.txt", "6.*"], All = True), [os.path.join(self.Root, "a/b/3.txt"), os.path.join(self.Root, "a/b/c/6.pkl")])
+        self.assertEqual(CM.IO.ListFiles(self.Root, ".", All = True, Filter = lambda Entry: Entry.stat().st_size > 10), [os.path.join(self.Root, "a/b/c/6.pkl")])
+        self.assertEqual(CM.IO.ListFiles(self.Root, "", Filter = lambda Entry: "." in Entry.name), [os.path.join(self.Root, "a.b")])
+        with self.assertRaises(ValueError):
+            CM.IO.ListFiles(self.Root, ["", ".pkl"])
+        with self.assertRaises(ValueError):
+            CM.IO.ListFiles(self.Root, [])
+
+    def test_directory_index(self):
+        OldTime = 10 ** 18 #Make folders look unmodified for a long time so they are not scanned again
+        for Folder in CM.IO.ListFiles(self.Root, "", All = True) + [self.Root]:
+            os.utime(Folder, ns = (OldTime, OldTime))
+        IndexDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(IndexDirectory.cleanup)
+        IndexPath = os.path.join(IndexDirectory.name, "index.pkl")
+        Index = CM.IO.DirectoryIndex(self.Root, IndexPath = IndexPath)
+        for Extension in [".pkl", ".", ""]:
+            self.assertEqual(Index.ListFiles(Extension), self._Walk(Extension))
+        self.assertEqual(Index.ListFiles(".pkl", Prefix = "a"), [os.path.join(self.Root, Path) for Path in ["a-b/4.pkl", "a/2.pkl", "a/b/c/6.pkl"]])
+        self.assertEqual(Index.ListFiles(".", MinSize = 11), [os.path.join(self.Root, "a/b/c/6.pkl")])
+
+        with open(os.path.join(self.Root, "a", "b", "7.pkl"), "w") as f:
+            f.write("7")
+        Index = CM.IO.DirectoryIndex(self.Root, IndexPath = IndexPath)
+        self.assertEqual(Index.ListFiles(".pkl"), self._Walk(".pkl"))
+        os.utime(os.path.join(self.Root, "a", "b"), ns = (OldTime, OldTime))
+        self.assertEqual(Index.Refresh(), 1) #Folders modified during last refresh are always scanned again
+        self.assertEqual(Index.Refresh(), 0)
+
+class TruthGetFilesHashes(unittest.TestCase):
+
+    def setUp(self):
+        self.TempDirectory = tempfile.TemporaryDirectory()
+        self.Root = self.TempDirectory.name
+        self.Paths = []
+        for i, Size in enumerate([0, 10, 3 * 2 ** 20]):
+            Path = os.path.join(self.Root, "%d.bin" % i)
+            with open(Path, "wb") as f:
+                f.write(os.urandom(Size))
+            os.utime(Path, ns = (10 ** 18, 10 ** 18))
+            self.Paths.append(Path)
+
+    def tearDown(self):
+        self.TempDirectory.cleanup()
+
+    def test_get_files_hashes(self):
+        Expected = {Path: CM.IO.GetFileHash(Path) for Path in self.Paths}
+        self.assertEqual(CM.IO.GetFilesHashes(self.Paths, Workers = 2), Expected)
+        self.assertEqual(CM.IO.GetFilesHashes(iter(self.Paths), hashlib.sha256)[self.Paths[1]], CM.IO.GetFileHash(self.Paths[1], hashlib.sha256))
+
+    def test_get_files_hashes_cache(self):
+        CachePath = os.path.join(self.Root, "cache", "hashes.pkl")
+        Expected = CM.IO.GetFilesHashes(self.Paths, CachePath = CachePath)
+        with open(self.Paths[1], "wb") as f: #Same size and modification time, so the cached hash is used
+            f.write(b"0" * 10)
+        os.utime(self.Paths[1], ns = (10 ** 18, 10 ** 18))
+        self.assertEqual(CM.IO.GetFilesHashes(self.Paths, CachePath = CachePath), Expected)
+        os.utime(self.Paths[1], ns = (10 ** 18, 10 ** 18 + 1))
+        self.assertEqual(CM.IO.GetFilesHashes(self.Paths, CachePath = CachePath)[self.Paths[1]], CM.IO.GetFileHash(self.Paths[1]))
+
+    def test_find_duplicate_files(self):
+        Large = os.urandom(3 * 2 ** 16)
+        Contents = {"a/1": Large, "a/2": b"small", "b/1": Large, "b/2": Large[:-1] + b"x", "b/3": b"small", "c": b"small", "d": b"", "e": b""}
+        for Name, Content in Contents.items():
+            os.makedirs(os.path.dirname(os.path.join(self.Root, Name)), exist_ok = True)
+            with open(os.path.join(self.Root, Name), "wb") as f:
+                f.write(Content)
+        Join = lambda *Names: [os.path.join(self.Root, Name) for Name in Names]
+        Expected = [Join("a/1", "b/1"), Join("a/2", "b/3", "c")]
+        self.assertEqual(CM.IO.FindDuplicateFiles(Join("a", "b", "c", "d", "e"), BlockSize = 2 ** 16), Expected)
+        self.assertEqual(CM.IO.FindDuplicateFiles(tuple(Join("a", "c"))), [Join("a/2", "c")])
+        self.assertEqual(CM.IO.FindDuplicateFiles(Join("a", "b", "c"), HardLink = True), Expected)
+        self.assertEqual(os.stat(Join("a/1")[0]).st_ino, os.stat(Join("b/1")[0]).st_ino)
+        self.assertEqual(CM.IO.FindDuplicateFiles(Join("a", "b")), [])
+        self.assertEqual(CM.IO.FindDuplicateFiles(pathlib.Path(self.Root, "b")), [])
+
+class TruthCompressFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.TempDirectory = tempfile.TemporaryDirectory()
+        self.Root = self.TempDirectory.name
+        self.Contents = {"data/1.txt": b"text " * 100000, "data/sub/2.bin": os.urandom(100000), "data/sub/3.gz": b"0" * 5000, "data/empty.txt": b""}
+        for Name, Content in self.Contents.items():
+            os.makedirs(os.path.dirname(os.path.join(self.Root, Name)), exist_ok = True)
+            with open(os.path.join(self.Root, Name), "wb") as f:
+                f.write(Content)
+        os.makedirs(os.path.join(self.Root, "data", "empty"))
+
+    def tearDown(self):
+        self.TempDirectory.cleanup()
+
+    def _Check(self, CompressedFilePath):
+        with zipfile.ZipFile(CompressedFilePath) as CompressedFile:
+            self.assertIsNone(CompressedFile.testzip())
+            for Name, Content in self.Contents.items():
+                self.assertEqual(CompressedFile.read(Name), Content)
+            self.assertIn("data/empty/", CompressedFile.namelist())
+            self.assertEqual(CompressedFile.getinfo("data/1.txt").compress_type, zipfile.ZIP_DEFLATED)
+            self.assertEqual(CompressedFile.getinfo("data/sub/2.bin").compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(CompressedFile.getinfo("data/sub/3.gz").compress_type, zipfile.ZIP_STORED)
+
+    def test_compress_files(self):
+        CompressedFilePath = os.path.join(self.Root, "1.zip")
+        CM.IO.CompressFiles([os.path.join(self.Root, "data")], CompressedFilePath, CompressLevel = 1)
+        self._Check(CompressedFilePath)
+
+    def test_compress_files_parallel(self):
+        CompressedFilePath = os.path.join(self.Root, "2.zip")
+        CM.IO.CompressFiles([os.path.join(self.Root, "data")], CompressedFilePath, Workers = 2)
+        self._Check(CompressedFilePath)
+        with unittest.mock.patch.object(zipfile, "ZIP64_LIMIT", 1000): #Make every member a ZIP64 one
+            CM.IO.CompressFiles([os.path.join(self.Root, "data")], CompressedFilePath, Workers = 2)
+            self._Check(CompressedFilePath)
+        SerialFilePath = os.path.join(self.Root, "1.zip")
+        CM.IO.CompressFiles([os.path.join(self.Root, "data")], SerialFilePath, CompressLevel = 1)
+        CM.IO.CompressFiles([os.path.join(self.Root, "data")], CompressedFilePath, CompressLevel = 1, Workers = 2)
+        with zipfile.ZipFile(SerialFilePath) as SerialFile, zipfile.ZipFile(CompressedFilePath) as CompressedFile: #Same members as zipfile writes
+            for SerialInfo, Info in zip(SerialFile.infolist(), CompressedFile.infolist()):
+                self.assertEqual((Info.filename, Info.date_time, Info.external_attr, Info.CRC, Info.compress_size), (SerialInfo.filename, SerialInfo.date_time, SerialInfo.external_attr, SerialInfo.CRC, SerialInfo.compress_size))
+        with open(os.path.join(self.Root, "data", "é.txt"), "wb") as f:
+            f.write(b"utf-8 name")
+        CM.IO.CompressFiles([os.path.join(self.Root, "data", "é.txt")], CompressedFilePath, Workers = 2)
+        with zipfile.ZipFile(CompressedFilePath) as CompressedFile:
+            self.assertEqual(CompressedFile.read("é.txt"), b"utf-8 name")
+
+    def test_decompress_files(self):
+        CompressedFilePaths = [os.path.join(self.Root, "1.zip"), os.path.join(self.Root, "2.zip")]
+        CM.IO.CompressFiles([os.path.join(self.Root, "data")], CompressedFilePaths[0])
+        CM.IO.CompressFiles([os.path.join(self.Root, "data", "sub")], CompressedFilePaths[1])
+        for Workers in [1, 3]:
+            TargetFolder = os.path.join(self.Root, "output%d" % Workers)
+            CM.IO.DecompressFiles(CompressedFilePaths, TargetFolder, Workers = Workers)
+            for Name, Content in self.Contents.items():
+                with open(os.path.join(TargetFolder, Name), "rb") as f:
+                    self.assertEqual(f.read(), Content)
+            self.assertTrue(os.path.isfile(os.path.join(TargetFolder, "sub", "2.bin")))
+            self.assertTrue(os.path.isdir(os.path.join(TargetFolder, "data", "empty")))
+        TargetFolder = os.path.join(self.Root, "output")
+        CM.IO.DecompressFiles(CompressedFilePaths, TargetFolder, Members = ["*.txt", "sub/*"], Workers = 2)
+        self.assertEqual(CM.IO.ListFiles(TargetFolder, ".", All = True), [os.path.join(TargetFolder, Name) for Name in ["data/1.txt", "data/empty.txt", "sub/2.bin", "sub/3.gz"]])
+
+    def test_iter_compressed_files(self):
+        CompressedFilePath = os.path.join(self.Root, "1.zip")
+        CM.IO.CompressFiles([os.path.join(self.Root, "data")], CompressedFilePath)
+        Contents = {Name: File.read() for Name, File in CM.IO.IterCompressedFiles(CompressedFilePath)}
+        self.assertEqual(Contents, self.Contents)
+        self.assertEqual([Name for Name, File in CM.IO.IterCompressedFiles(CompressedFilePath, "*/sub/*")], ["data/sub/2.bin", "data/sub/3.gz"])
+
+    def test_tar_files(self):
+        for Format in ["tar", "tar.gz", "tar.bz2", "tar.xz"]:
+            CompressedFilePath = os.path.join(self.Root, "1." + Format)
+            CM.IO.CompressFiles([os.path.join(self.Root, "data")], CompressedFilePath, Format = Format, CompressLevel = 1)
+            TargetFolder = os.path.join(self.Root, Format)
+            CM.IO.DecompressFiles([CompressedFilePath], TargetFolder, Format = Format)
+            for Name, Content in self.Contents.items():
+                with open(os.path.join(TargetFolder, Name), "rb") as f:
+                    self.assertEqual(f.read(), Content)
+            self.assertTrue(os.path.isdir(os.path.join(TargetFolder, "data", "empty")))
+            Contents = {Name: File.read() for Name, File in CM.IO.IterCompressedFiles(CompressedFilePath, Format = Format)}
+            self.assertEqual(Contents, self.Contents)
+
+    def test_tar_file_objects(self):
+        Stream = io.BytesIO()
+        CM.IO.CompressFiles([os.path.join(self.Root, "data")], Stream, Format = "tar.gz")
+        Stream.seek(0)
+        TargetFolder = os.path.join(self.Root, "output")
+        CM.IO.DecompressFiles([Stream], TargetFolder, Format = "tar.gz", Members = "*.txt")
+        self.assertEqual(CM.IO.ListFiles(TargetFolder, ".", All = True), [os.path.join(TargetFolder, Name) for Name in ["data/1.txt", "data/empty.txt"]])
+
+class TruthCompressedFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.TempDirectory = tempfile.TemporaryDirectory()
+        self.Root = self.TempDirectory.name
+        self.Content = {"Name": "测试", "Values": list(range(10000))}
+        self.Extensions = [".gz", ".bz2", ".xz"] + [".lz4"] * CM.IO.Lz4DependencyFlag + [".zst"] * CM.IO.ZstdDependencyFlag
+
+    def tearDown(self):
+        self.TempDirectory.cleanup()
+
+    def test_json(self):
+        for Extension in self.Extensions:
+            Path = os.path.join(self.Root, "1.json" + Extension)
+            CM.IO.ExportToJson(Path, self.Content, CompressLevel = 1)
+            self.assertLess(os.path.getsize(Path), 60000)
+            self.assertEqual(CM.IO.ImportFromJson(Path), self.Content)
+
+    def test_json_engines(self):
+        Engines = ["json"] + ["orjson"] * CM.IO.OrjsonDependencyFlag + ["ujson"] * CM.IO.UjsonDependencyFlag
+        Content = {"Name": "测试", "Set": {3}, 1: [1.5, None, True]}
+        Expected = {"Name": "测试", "Set": [3], "1": [1.5, None, True]}
+        if CM.IO.DependencyFlag:
+            Content["Array"] = np.arange(6).reshape(2, 3)
+            Content["Number"] = np.float32(0.5)
+            Expected["Array"] = [[0, 1, 2], [3, 4, 5]]
+            Expected["Number"] = 0.5
+        Path = os.path.join(self.Root, "1.json")
+        for Engine in Engines:
+            CM.IO.ExportToJson(Path, Content, Engine = Engine)
+            Size = os.path.getsize(Path)
+            for ImportEngine in Engines:
+                self.assertEqual(CM.IO.ImportFromJson(Path, Engine = ImportEngine), Expected)
+            CM.IO.ExportToJson(Path, Content, Compact = True, Engine = Engine)
+            self.assertLess(os.path.getsize(Path), Size)
+            self.assertEqual(CM.IO.ImportFromJson(Path, Engine = Engine), Expected)
+            CM.IO.ExportToJsonLines(Path, [Content, Content], Engine = Engine)
+            self.assertEqual(list(CM.IO.IterJsonLines(Path, Engine = Engine)), [Expected, Expected])
+        with self.assertRaises(ValueError):
+            CM.IO.ExportToJson(Path, Content, Engine = "simplejson")
+
+    def test_json_compatibility(self):
+        Path = os.path.join(self.Root, "1.json")
+        Content = {"a": float("nan"), "b": 2 ** 70, "c": [float("inf"), -float("inf")]}
+        with open(Path, "w", encoding = "utf8") as f: #Written like previous versions
+            json.dump(Content, f, indent = 4)
+        Old = open(Path, encoding = "utf8").read()
+        for Engine in [None] + ["orjson"] * CM.IO.OrjsonDependencyFlag:
+            Result = CM.IO.ImportFromJson(Path, Engine = Engine)
+            self.assertTrue(math.isnan(Result["a"]))
+            self.assertEqual(Result["c"], Content["c"])
+        self.assertEqual(CM.IO.ImportFromJson(Path)["b"], 2 ** 70)
+        CM.IO.ExportToJson(Path, Content)
+        self.assertEqual(open(Path, encoding = "utf8").read(), Old)
+        if CM.IO.OrjsonDependencyFlag:
+            CM.IO.ExportToJson(Path, {"b": 2 ** 70}, Engine = "orjson")
+            self.assertEqual(CM.IO.ImportFromJson(Path), {"b": 2 ** 70})
+
+    def test_json_lines(self):
+        Records = [{"id": i, "Name": "测试"} for i in range(2500)]
+        for Extension in [""] + self.Extensions:
+            Path = os.path.join(self.Root, "1.jsonl" + Extension)
+            self.assertEqual(CM.IO.ExportToJsonLines(Path, iter(Records), BatchSize = 1000), 2500)
+            self.assertEqual(list(CM.IO.IterJsonLines(Path)), Records)
+            self.assertEqual([len(Batch) for Batch in CM.IO.IterJsonLines(Path, BatchSize = 1000)], [1000, 1000, 500])
+        CM.IO.ExportToJsonLines(Path, [[1, 2], "3"], Append = True)
+        self.assertEqual(list(CM.IO.IterJsonLines(Path))[-3:], [Records[-1], [1, 2], "3"])
+
+    def test_pkl(self):
+        for Extension in self.Extensions:
+            Path = os.path.join(self.Root, "1.pkl" + Extension)
+            CM.IO.ExportToPkl(Path, self.Content)
+            self.assertLess(os.path.getsize(Path), 60000)
+            self.assertEqual(CM.IO.ImportFromPkl(Path), self.Content)
+        with gzip.open(os.path.join(self.Root, "1.pkl.gz"), "rb") as f:
+            self.assertEqual(pickle.load(f), self.Content)
+
+class TruthDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.TempDirectory = tempfile.TemporaryDirectory()
+        self.Root = self.TempDirectory.name
+        self.Calls = []
+
+    def tearDown(self):
+        self.TempDirectory.cleanup()
+
+    def _Function(self, Cache):
+        @Cache
+        def Repeat(Text, Times = 1000):
+            self.Calls.append((Text, Times))
+            return Text * Times
+        return Repeat
+
+    def test_disk_cache(self):
+        Repeat = self._Function(CM.IO.DiskCache(self.Root))
+        self.assertEqual(Repeat("a"), "a" * 1000)
+        self.assertEqual(Repeat("a"), "a" * 1000)
+        self.assertEqual(Repeat("a", Times = 2), "aa")
+        self.assertEqual(self.Calls, [("a", 1000), ("a", 2)])
+        Repeat = self._Function(CM.IO.DiskCache(self.Root)) #Another process using the same folder
+        Repeat("a")
+        self.assertEqual(len(self.Calls), 2)
+        Repeat = self._Function(CM.IO.DiskCache(self.Root, Version = 2))
+        Repeat("a")
+        self.assertEqual(len(self.Calls), 3)
+        CM.IO.DiskCache(self.Root).Clear()
+        self.assertEqual(CM.IO.ListFiles(self.Root, "."), [])
+
+    def test_disk_cache_key(self):
+        Code = "import CommonModules as CM; print(CM.IO._DumpCanonically(({'b', 'a', 'c', 1}, {'y': 1, 'x': frozenset('pq')})).hex())"
+        Keys = set()
+        for Seed in ["1", "2", "3"]:
+            Keys.add(subprocess.run([sys.executable, "-c", Code], env = dict(os.environ, PYTHONHASHSEED = Seed), capture_output = True, text = True, check = True).stdout)
+        self.assertEqual(len(Keys), 1)
+        self.assertEqual(CM.IO._DumpCanonically({"x": 1, "y": [2]}), CM.IO._DumpCanonically({"y": [2], "x": 1}))
+        self.assertNotEqual(CM.IO._DumpCanonically({"x": 1}), CM.IO._DumpCanonically([("x", 1)]))
+        self.assertNotEqual(CM.IO._DumpCanonically({1, 2}), CM.IO._DumpCanonically(frozenset([1, 2])))
+        Functions = []
+        for Constant in ["1000", "2000"]:
+            Namespace = {}
+            exec("def Repeat(Text):\n    return Text * %s" % Constant, Namespace) #No source available
+            Functions.append(CM.IO.DiskCache(self.Root)(Namespace["Repeat"]))
+        self.assertEqual(len(Functions[0]("a")), 1000)
+        self.assertEqual(len(Functions[1]("a")), 2000)
+
+    def test_disk_cache_eviction(self):
+        Cache = CM.IO.DiskCache(self.Root, MaxBytes = 2500)
+        Repeat = self._Function(Cache)
+        Repeat("a")
+        Repeat("b")
+        Paths = CM.IO.ListFiles(self.Root, ".pkl")
+        for i, Path in enumerate(sorted(Paths, key = os.path.getmtime)):
+            os.utime(Path, ns = (10 ** 18 + i, 10 ** 18 + i))
+        Repeat("a") #Now "b" is the least recently used one
+        Repeat("c")
+        self.assertEqual(len(CM.IO.ListFiles(self.Root, ".pkl")), 2)
+        Repeat("a")
+        Repeat("b")
+        self.assertEqual(self.Calls, [("a", 1000), ("b", 1000), ("c", 1000), ("b", 1000)])
+
+@unittest.skipUnless(CM.IO.DependencyFlag, "numpy and scipy are required")
+class TruthPkl(unittest.TestCase):
+
+    def setUp(self):
+        self.TempDirectory = tempfile.TemporaryDirectory()
+        self.Root = self.TempDirectory.name
+
+    def tearDown(self):
+        self.TempDirectory.cleanup()
+
+    def test_pkl_out_of_band(self):
+        Path = os.path.join(self.Root, "1.pkl")
+        Content = {"Array": np.arange(100000, dtype = np.float32).reshape(1000, 100), "Small": np.arange(3),
+                   "Matrix": scipy.sparse.random(1000, 1000, density = 0.05, format = "csr", random_state = 0), "Name": "test"}
+        CM.IO.ExportToPkl(Path, Content, OutOfBand = True)
+        self.assertLess(os.path.getsize(Path), 10000)
+        for Mmap in [True, False]:
+            Result = CM.IO.ImportFromPkl(Path, Mmap = Mmap)
+            self.assertTrue(np.array_equal(Result["Array"], Content["Array"]))
+            if Mmap:
+                self.assertEqual(Result["Array"].ctypes.data % 4096, 0)
+            self.assertTrue(np.array_equal(Result["Small"], Content["Small"]))
+            self.assertEqual((Result["Matrix"] != Content["Matrix"]).nnz, 0)
+            self.assertEqual(Result["Name"], "test")
+        Result["Array"][0, 0] = -1 #Copy-on-write, the file is not changed
+        self.assertEqual(CM.IO.ImportFromPkl(Path)["Array"][0, 0], 0)
+
+        CM.IO.ExportToPkl(Path, Content)
+        self.assertFalse(os.path.exists(Path + ".buffers"))
+        self.assertTrue(np.array_equal(CM.IO.ImportFromPkl(Path)["Array"], Content["Array"]))
+
+    def test_pkl_out_of_band_interrupted(self):
+        Path = os.path.join(self.Root, "1.pkl.gz")
+        CM.IO.ExportToPkl(Path, {"Array": np.arange(100000)}, OutOfBand = True)
+        with unittest.mock.patch.object(CM.IO, "_ExportBuffers", side_effect = KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                CM.IO.ExportToPkl(Path, {"Array": np.ones(100000)}, OutOfBand = True)
+        self.assertEqual(sorted(os.listdir(self.Root)), ["1.pkl.gz", "1.pkl.gz.buffers"])
+        self.assertTrue(np.array_equal(CM.IO.ImportFromPkl(Path)["Array"], np.arange(100000)))
+        CM.IO.ExportToPkl(Path, {"Array": np.ones(100000)}, OutOfBand = True)
+        with gzip.open(Path, "rb") as f: #Compressed by the extension although written into a temporary file first
+            f.read()
+        self.assertTrue(CM.IO._GetTemporaryPath(os.path.join(self.Root, "1.pkl")).endswith(".tmp"))
+        self.assertTrue(np.array_equal(CM.IO.ImportFromPkl(Path)["Array"], np.ones(100000)))
+
+        Replace = os.replace
+        def ReplaceBuffersOnly(Source, Target):
+            if not Target.endswith(".buffers"):
+                raise KeyboardInterrupt
+            Replace(Source, Target)
+        with unittest.mock.patch.object(os, "replace", side_effect = ReplaceBuffersOnly): #Died between replacing the two files
+            with self.assertRaises(KeyboardInterrupt):
+                CM.IO.ExportToPkl(Path, {"Array": np.zeros(50000)}, OutOfBand = True)
+        with self.assertRaises(ValueError):
+            CM.IO.ImportFromPkl(Path)
+        os.remove(Path + ".buffers")
+        with self.assertRaises(ValueError):
+            CM.IO.ImportFromPkl(Path)
+
+@unittest.skipUnless(CM.IO.DependencyFlag, "numpy and scipy are required")
+class TruthNpArray(unittest.TestCase):
+
+    def setUp(self):
+        self.TempDirectory = tempfile.TemporaryDirectory()
+        self.Root = self.TempDirectory.name
+        self.NpArray = np.arange(12, dtype = np.float32).reshape(4, 3) / 4
+
+    def tearDown(self):
+        self.TempDirectory.cleanup()
+
+    def test_binary(self):
+        for Extension in [".npy", ".npz"]:
+            Path = os.path.join(self.Root, "1" + Extension)
+            CM.IO.ExportNpArray(Path, self.NpArray)
+            NpArray = CM.IO.ImportNpArray(Path)
+            self.assertEqual(NpArray.dtype, np.float32)
+            self.assertTrue(np.array_equal(NpArray, self.NpArray))
+            self.assertEqual(CM.IO.ImportNpArray(Path, float, ndmin = 3).shape, (1, 4, 3))
+        NpArray = CM.IO.ImportNpArray(os.path.join(self.Root, "1.npy"), MmapMode = "r")
+        self.assertIsInstance(NpArray, np.memmap)
+
+    def test_text(self):
+        Path = os.path.join(self.Root, "1.txt")
+        CM.IO.ExportNpArray(Path, self.NpArray)
+        self.assertTrue(np.array_equal(CM.IO.ImportNpArray(Path, float), self.NpArray))
+        for Shape, ndmin in [((1, 3), 0), ((4, 1), 0), ((1, 1), 1), ((1, 3), 2), ((4, 1), 2)]:
+            NpArray = self.NpArray[:Shape[0], :Shape[1]]
+            CM.IO.ExportNpArray(Path, NpArray)
+            self.assertEqual(CM.IO.ImportNpArray(Path, float, ndmin = ndmin).shape, np.loadtxt(Path, ndmin = ndmin).shape)
+        with open(Path, "w") as f: #Comments are left to np.loadtxt
+            f.write("# comment\n1 2\n3 4\n")
+        self.assertTrue(np.array_equal(CM.IO.ImportNpArray(Path, int), [[1, 2], [3, 4]]))
+
+    def test_writer(self):
+        Path = os.path.join(self.Root, "1.npy")
+        with CM.IO.NpArrayWriter(Path) as Writer:
+            for i in range(0, 4, 2):
+                Writer.Append(self.NpArray[i:i + 2])
+        self.assertTrue(np.array_equal(np.load(Path), self.NpArray))
+        with CM.IO.NpArrayWriter(Path, DataType = np.int64) as Writer:
+            for i in range(1000):
+                Writer.Append([[i, i]])
+            with self.assertRaises(ValueError):
+                Writer.Append([[1, 2, 3]])
+        self.assertTrue(np.array_equal(CM.IO.ImportNpArray(Path, MmapMode = "r"), np.repeat(np.arange(1000)[:, None], 2, axis = 1)))
+        with CM.IO.NpArrayWriter(Path) as Writer:
+            pass
+        self.assertEqual(np.load(Path).shape, (0,))
+
+@unittest.skipUnless(CM.IO.DependencyFlag, "numpy and scipy are required")
+class TruthSparseMatrix(unittest.TestCase):
+
+    def setUp(self):
+        self.TempDirectory = tempfile.TemporaryDirectory()
+        self.Root = self.TempDirectory.name
+        self.SparseMatrix = scipy.sparse.random(50, 30, density = 0.1, format = "csr", dtype = np.float32, random_state = 0)
+
+    def tearDown(self):
+        self.TempDirectory.cleanup()
+
+    def test_binary(self):
+        Path = os.path.join(self.Root, "1.csr")
+        CM.IO.ExportSparseMatrix(Path, self.SparseMatrix.tocoo())
+        for MmapMode in ["r", "c", None]:
+            SparseMatrix = CM.IO.ImportSparseMatrix(Path, MmapMode = MmapMode)
+            self.assertEqual(SparseMatrix.format, "csr")
+            self.assertEqual(SparseMatrix.dtype, np.float32)
+            self.assertEqual((SparseMatrix != self.SparseMatrix).nnz, 0)
+            self.assertEqual(isinstance(SparseMatrix.data, np.memmap), MmapMode is not None)
+        CM.IO.ExportSparseMatrix(Path, scipy.sparse.csr_matrix((3, 4)))
+        self.assertEqual(CM.IO.ImportSparseMatrix(Path).shape, (3, 4))
+
+    def test_matrix_market(self):
+        Path = os.path.join(self.Root, "1.mtx")
+        CM.IO.ExportSparseMatrix(Path, self.SparseMatrix)
+        self.assertTrue(np.allclose(CM.IO.ImportSparseMatrix(Path).toarray(), self.SparseMatrix.toarray()))
+
+    def test_matrix_market_chunked(self):
+        Path = os.path.join(self.Root, "1.mtx")
+        Square = self.SparseMatrix[:30].astype(np.float64)
+        for SparseMatrix, Symmetry in [(Square.tocsc(), "general"), (Square + Square.T, "symmetric"), (Square - Square.T, "skew-symmetric")]:
+            scipy.io.mmwrite(Path, SparseMatrix, symmetry = Symmetry)
+            for Workers in [1, 2]:
+                Result = CM.IO.ImportSparseMatrix(Path, ChunkBytes = 100, Workers = Workers)
+                self.assertEqual(Result.format, "csr")
+                self.assertEqual(abs(Result - SparseMatrix).max(), 0)
+        with open(Path, "w") as f: #Duplicate entries are summed
+            f.write("%%MatrixMarket matrix coordinate integer general\n% comment\n2 3 3\n2 3 1\n\n1 1 2\n2 3 4\n")
+        Result = CM.IO.ImportSparseMatrix(Path, ChunkBytes = 8)
+        self.assertEqual(Result.dtype, np.int64)
+        self.assertEqual(Result.toarray().tolist(), [[2, 0, 0], [0, 0, 5]])
+        for Symmetry, Entries in [("general", "2 3 1\n1 1 2\n2 3 4\n1 2 5\n"), ("general", "1 1 2\n2 3 4\n"), ("symmetric", "1 1 2\n2 1 4\n3 1 5\n3 2 6\n")]: #Entries not matching the size line
+            with open(Path, "w") as f:
+                f.write("%%%%MatrixMarket matrix coordinate integer %s\n3 3 3\n%s" % (Symmetry, Entries))
+            for Workers in [1, 2]:
+                with self.assertRaises(ValueError):
+                    CM.IO.ImportSparseMatrix(Path, ChunkBytes = 8, Workers = Workers)
+        with open(Path, "w") as f:
+            f.write("%%MatrixMarket matrix coordinate integer symmetric\n3 3 3\n1 1 2\n2 1 4\n3 2 6\n")
+        Result = CM.IO.ImportSparseMatrix(Path, ChunkBytes = 8)
+        self.assertEqual(Result.toarray().tolist(), [[2, 4, 0], [4, 0, 6], [0, 6, 0]])
+        for Array in [Result.indices, Result.data]: #Not views of the buffers for twice the entries
+            self.assertEqual((Array if Array.base is None else Array.base).size, Result.nnz)
+
+    def test_iter_blocks(self):
+        for Extension in [".mtx", ".csr"]:
+            Path = os.path.join(self.Root, "1" + Extension)
+            CM.IO.ExportSparseMatrix(Path, self.SparseMatrix.tocsc())
+            Blocks = list(CM.IO.IterSparseMatrixBlocks(Path, BlockRows = 16, ChunkBytes = 100))
+            self.assertEqual([Block.shape for Block in Blocks], [(16, 30), (16, 30), (16, 30), (2, 30)])
+            self.assertTrue(np.allclose(scipy.sparse.vstack(Blocks).toarray(), self.SparseMatrix.toarray()))
+
+@unittest.skipUnless(CM.IO.DependencyFlag, "numpy, scipy and networkx are required")
+class TruthCompactGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.TempDirectory = tempfile.TemporaryDirectory()
+        self.Root = self.TempDirectory.name
+        self.Graph = nx.karate_club_graph()
+        self.Graph.add_edge(0, 0, weight = 2)
+        for Node in self.Graph:
+            self.Graph.nodes[Node]["rank"] = Node * 2
+
+    def tearDown(self):
+        self.TempDirectory.cleanup()
+
+    def test_json_node_link_data(self):
+        Path = os.path.join(self.Root, "1.json")
+        CM.IO.ExportToJsonNodeLinkData(Path, self.Graph)
+        self.assertEqual(sorted(CM.IO.ImportFromJsonNodeLinkData(Path).edges(data = True)), sorted(self.Graph.edges(data = True)))
+
+    def test_undirected(self):
+        Path = os.path.join(self.Root, "1.cmg")
+        CM.IO.ExportToCompactGraph(Path, self.Graph, NodeAttributes = ["club", "rank"])
+        Graph = CM.IO.ImportFromCompactGraph(Path)
+        self.assertEqual(Graph.ToSparseMatrix().toarray().tolist(), nx.to_numpy_array(self.Graph).tolist())
+        Result = Graph.ToNetworkx()
+        self.assertIsInstance(Result, nx.Graph)
+        self.assertEqual(dict(Result.nodes(data = True)), dict(self.Graph.nodes(data = True)))
+        self.assertEqual(sorted(Result.edges(data = "weight")), sorted(self.Graph.edges(data = "weight")))
+
+    def test_directed(self):
+        Path = os.path.join(self.Root, "1.cmg")
+        Graph = nx.relabel_nodes(nx.DiGraph(self.Graph.edges()), str)
+        for Index, (Source, Target) in enumerate(Graph.edges()):
+            Graph[Source][Target]["time"] = Index
+        CM.IO.ExportToCompactGraph(Path, Graph, Weight = None, EdgeAttributes = ["time"])
+        Result = CM.IO.ImportFromCompactGraph(Path, MmapMode = None).ToNetworkx()
+        self.assertIsInstance(Result, nx.DiGraph)
+        self.assertEqual(list(Result), list(Graph))
+        self.assertEqual(sorted(Result.edges(data = "time")), sorted(Graph.edges(data = "time")))
+        with self.assertRaises(ValueError):
+            CM.IO.ExportToCompactGraph(Path, Graph, EdgeAttributes = ["missing"])
+
+    def test_multigraph(self):
+        Graph = nx.MultiGraph([(1, 2), (1, 2), (2, 3)])
+        Compact = CM.IO.CompactGraph.FromNetworkx(Graph)
+        self.assertEqual(Compact.ToSparseMatrix().toarray().tolist(), [[0, 2, 0], [2, 0, 1], [0, 1, 0]])
+        self.assertEqual(sorted(Compact.ToNetworkx().edges()), [(1, 2), (1, 2), (2, 3)])
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main() 
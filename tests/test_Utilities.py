@@ -0,0 +1,49 @@
+import unittest
+import os
+import subprocess
+import sys
+import tempfile
+
+import CommonModules as CM
+
+class TruthLazyModule(unittest.TestCase):
+
+    def test_lazy_module(self):
+        Globals = {}
+        Globals["Module"] = CM.Utilities.LazyModule("xml.dom", Globals, "Module", Submodules = ["minidom"])
+        self.assertIsInstance(Globals["Module"], CM.Utilities.LazyModule)
+        Document = Globals["Module"].minidom.parseString("<a/>")
+        self.assertEqual(Document.documentElement.tagName, "a")
+        self.assertEqual(Globals["Module"], sys.modules["xml.dom"]) #The placeholder is replaced by the module
+        with self.assertRaises(ImportError):
+            CM.Utilities.LazyModule("NotExistingModule").Attribute
+
+    def test_broken_module(self):
+        with tempfile.TemporaryDirectory() as Root:
+            for Name, Error in [("BrokenImportModule", "ImportError('libfoo.so: cannot open shared object file')"), ("BrokenAttributeModule", "AttributeError('version')")]:
+                with open(os.path.join(Root, Name + ".py"), "w") as f:
+                    f.write("raise " + Error)
+            sys.path.insert(0, Root)
+            try:
+                for Name in ["BrokenImportModule", "BrokenAttributeModule"]:
+                    self.assertTrue(CM.Utilities.IsModuleAvailable(Name))
+                    with self.assertRaisesRegex(ImportError, Name):
+                        CM.Utilities.LazyModule(Name).Attribute
+            finally:
+                sys.path.remove(Root)
+
+    def test_is_module_available(self):
+        self.assertTrue(CM.Utilities.IsModuleAvailable("os", "json"))
+        self.assertFalse(CM.Utilities.IsModuleAvailable("os", "NotExistingModule"))
+
+    def test_lazy_package(self):
+        Script = "import sys; import CommonModules as CM; CM.IO.ListFiles('.', '.py'); CM.Log; print(sorted(Name for Name in ['numpy', 'scipy', 'networkx', 'torch'] if Name in sys.modules))"
+        Environment = dict(os.environ, PYTHONPATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        Output = subprocess.run([sys.executable, "-c", Script], check = True, capture_output = True, text = True, env = Environment).stdout
+        self.assertEqual(Output.strip(), "[]")
+        self.assertIn("IO", dir(CM))
+        with self.assertRaises(AttributeError):
+            CM.NotExistingModule
+
+if __name__ == '__main__':
+    unittest.main()